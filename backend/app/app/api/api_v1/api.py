@@ -1,11 +1,13 @@
 from fastapi import APIRouter
 
-from app.api.api_v1.endpoints import items, login, users, utils, voices, notes
+from app.api.api_v1.endpoints import items, login, users, utils, voices, voice_uploads, notes, queue
 
 api_router = APIRouter()
 api_router.include_router(login.router, tags=["login"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
-#api_router.include_router(utils.router, prefix="/utils", tags=["utils"])
+api_router.include_router(utils.router, prefix="/utils", tags=["utils"])
 #api_router.include_router(items.router, prefix="/items", tags=["items"])
+api_router.include_router(voice_uploads.router, prefix="/voices/uploads", tags=["voices"])
 api_router.include_router(voices.router, prefix="/voices", tags=["voices"])
 api_router.include_router(notes.router, prefix="/notes", tags=["notes"])
+api_router.include_router(queue.router, prefix="/queue", tags=["queue"])
@@ -1,14 +1,17 @@
 from datetime import timedelta
-from typing import Any
+from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, Body, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app import crud, models, schemas
 from app.api import deps
+from app.api.unit_of_work import UnitOfWorkRoute
 from app.core import security
 from app.core.config import settings
+from app.core.principal_cache import Principal
 from app.core.security import get_password_hash
 from app.utils import (
     generate_password_reset_token,
@@ -16,30 +19,88 @@ from app.utils import (
     verify_password_reset_token,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+
+def token_response(
+    db: Session, user: models.User, refresh_token: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    A short lived access token carrying the role and flags of the user,
+    with the refresh token to renew it, of a new session unless given.
+    """
+    principal = Principal.from_user(user)
+    if refresh_token is None:
+        refresh_token = crud.refresh_token.issue(db, user_id=user.id)
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return {
+        "access_token": security.create_access_token(
+            principal.id,
+            expires_delta=access_token_expires,
+            claims=security.principal_claims(principal),
+        ),
+        "token_type": "bearer",
+        "expires_in": int(access_token_expires.total_seconds()),
+        "refresh_token": refresh_token,
+    }
 
 
 @router.post("/login/access-token", response_model=schemas.Token)
-def login_access_token(
+async def login_access_token(
     db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
+    and a refresh token to renew it
     """
-    user = crud.user.authenticate(
-        db, email=form_data.username, password=form_data.password
-    )
+    # crud.user.authenticate, awaiting bcrypt rather than blocking a thread on it
+    user = await run_in_threadpool(crud.user.get_by_email, db, email=form_data.username)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    elif not crud.user.is_active(user):
+    valid, new_hash = await security.password_hasher.verify_and_update_async(
+        form_data.password, user.hashed_password
+    )
+    if not valid:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    return await run_in_threadpool(complete_login, db, user, new_hash)
+
+
+def complete_login(db: Session, user: models.User, new_hash: Optional[str]) -> Dict[str, Any]:
+    if new_hash:
+        crud.user.set_password_hash(db, user=user, hashed_password=new_hash)
+    if not crud.user.is_active(user):
         raise HTTPException(status_code=400, detail="Inactive user")
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    return {
-        "access_token": security.create_access_token(
-            user.id, expires_delta=access_token_expires
-        ),
-        "token_type": "bearer",
-    }
+    return token_response(db, user)
+
+
+@router.post("/login/refresh-token", response_model=schemas.Token)
+def refresh_access_token(
+    body: schemas.RefreshRequest, db: Session = Depends(deps.get_db)
+) -> Any:
+    """
+    Exchange a refresh token for a new access token and refresh token, the
+    one given can not be used again
+    """
+    rotated = crud.refresh_token.rotate(db, token=body.refresh_token)
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    user_id, refresh_token = rotated
+    user = crud.user.get(db, id=user_id)
+    if not user or not crud.user.is_active(user):
+        crud.refresh_token.revoke(db, token=refresh_token)
+        db.commit()
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return token_response(db, user, refresh_token)
+
+
+@router.post("/logout", response_model=schemas.Msg)
+def logout(body: schemas.RefreshRequest, db: Session = Depends(deps.get_db)) -> Any:
+    """
+    Revoke the session of the refresh token, its access token stays valid
+    until it expires
+    """
+    crud.refresh_token.revoke(db, token=body.refresh_token)
+    return {"msg": "Logged out"}
 
 
 @router.post("/login/test-token", response_model=schemas.User)
@@ -92,5 +153,5 @@ def reset_password(
     hashed_password = get_password_hash(new_password)
     user.hashed_password = hashed_password
     db.add(user)
-    db.commit()
+    crud.refresh_token.revoke_user(db, user_id=user.id)
     return {"msg": "Password updated successfully"}
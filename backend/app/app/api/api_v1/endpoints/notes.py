@@ -1,158 +1,165 @@
 from typing import Any, List, Optional
-from itertools import chain
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from datetime import datetime
 from app import crud, models, schemas
 from app.api import deps
+from app.api.unit_of_work import UnitOfWorkRoute
+from app.core.access_graph import access_graph
+from app.core.export import MEDIA_TYPES, ExportFormat, export_table
+from app.core.pagination import Page
+from app.core.principal_cache import Principal
+from app.db.session import SessionLocal
 
-from app.models.doctor_manager import DoctorManager
-from app.models.assistant_manager import AssistantManager
-from app.models.doctor_patient import DoctorPatient
-from app.models.voice import Voice
+from app.models.note import Note
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 @router.get("/", response_model=List[schemas.Note])
-def read_notes(
-    db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user),
+async def read_notes(
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
+    validated: Optional[bool]=None,
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
-    Retrieve notes.
-    Only super users can retrieve all notes
+    Retrieve the notes of the current user: an assistant's own, those of a
+    manager's assistants, those on a doctor's voices, all for a super user.
     """
-    if crud.user.is_superuser(current_user):
-        notes = crud.note.get_all(db)
-    else:
-        raise HTTPException(status_code=401, detail="Not enough permissions")
+    notes, next_cursor = await crud.note_async.get_multi_visible(db, user=current_user, page=page, validated=validated)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return notes
 
- #to change after having the relationship crud
+@router.get("/export")
+def export_notes(
+    db: Session = Depends(deps.get_db),
+    format: ExportFormat = ExportFormat.ndjson,
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Stream every note as NDJSON or CSV, for audits. Only super user can use it
+    """
+    return StreamingResponse(
+        export_table(db, Note.__table__, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"content-disposition": f'attachment; filename="notes.{format.value}"'},
+    )
+
+def check_note_access(*, note: Note, current_user: Principal) -> bool:
+    """
+    Raise unless current_user may read the note: its assistant, its last
+    modifier, the managers of the assistant, the doctor of the voice or a
+    super user.
+    Returns whether the user may also validate it (a manager or super user).
+    The caller loads the access graph.
+    """
+    if current_user.is_superuser or access_graph.manages_assistant(current_user.id, note.assistant_id):
+        return True
+    doctor_id = note.voice.doctor_id if note.voice else None
+    if current_user.id in (note.assistant_id, note.modifier_id, doctor_id):
+        return False
+    raise HTTPException(status_code=400, detail="Not enough permissions")
+
+
 @router.get("/{note_id}", response_model=schemas.Note)
-def read_note_by_id(
+async def read_note_by_id(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     note_id : int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
     Retrieve note by id.
     Only super user, th assistant of this note, is manaer or the doctor can retrieve it
     """
-     #to change after having the relationship crud
-    note = crud.note.get_by_note_id(db, id=note_id)
-    if note:
-        manager_idx = db.query(AssistantManager).filter(AssistantManager.assistant_id == note.assistant_id).\
-                                    with_entities(AssistantManager.manager_id).all()
-        manager_idx = list(chain(*manager_idx))
-        doctor_idx = db.query(Voice).filter(Voice.id == note.assistant_id).\
-                                    with_entities(Voice.doctor_id).all()
-        doctor_idx = list(chain(*doctor_idx))
-
-        if current_user.id == note.assistant_id or current_user.id == note.modifier_id or current_user.is_superuser:
-            return note
-        elif current_user.id in manager_idx:
-            return note
-        elif current_user.id in doctor_idx:
-            return note
-        else:
-            raise HTTPException(status_code=400, detail="Not enough permissions")
-    else:
+    note = await crud.note_async.get_by_note_id(db, id=note_id)
+    if not note:
         raise HTTPException(status_code=404, detail="No note found with given note id")
+    await access_graph.ensure_loaded_async(SessionLocal)
+    check_note_access(note=note, current_user=current_user)
     return note
 
 @router.post("/", response_model=schemas.Note)
-def create_note(
+async def create_note(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     note_in: schemas.NoteCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
     Create new note.
     Only assistants and super user can create notes
+    A voice has one note, the first request creates it and the others get a
+    409 with the id of that note.
     """
     if current_user.role != 'assistant' and not current_user.is_superuser:
         raise HTTPException(
             status_code=401,
             detail="You have not the right to create note.",
         )
-    
-    voice = crud.voice.get_by_voice_id(db, id=note_in.voice_id)
-    if not voice:
-        raise HTTPException(
-            status_code=404,
-            detail="The given voice id is not found",
-        )
-    
-    if voice.note_created:
+
+    claim = await crud.note_async.claim(db, obj_in=note_in, date_creation=datetime.now().replace(microsecond=0))
+    if claim.note is not None:
+        return claim.note
+    if claim.existing_id is not None:
         raise HTTPException(
-            status_code=505,
-            detail="Note already created for this voice",
+            status_code=409,
+            detail={"msg": "Note already created for this voice", "note_id": claim.existing_id},
         )
-    
-    note = crud.note.create_with_assistant(db=db, obj_in=note_in, date_creation=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    crud.voice.update(db=db, db_obj=voice, obj_in=dict({'note_created':True}))
-    return note
+    raise HTTPException(
+        status_code=404,
+        detail="The given voice id is not found",
+    )
 
 @router.put("/{note_id}", response_model=schemas.Note)
-def update_note(
+async def update_note(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     note_in: schemas.NoteUpdate,
     note_id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
     Modify note
     Assistant doctor or manager related to this note
     """
     
-    note = crud.note.get_by_note_id(db, id=note_id)
-    
-    if note:
-        manager_idx = db.query(AssistantManager).filter(AssistantManager.assistant_id == note.assistant_id).\
-                                    with_entities(AssistantManager.manager_id).all()
-        manager_idx = list(chain(*manager_idx))
-        doctor_idx = db.query(Voice).filter(Voice.id == note.assistant_id).\
-                                    with_entities(Voice.doctor_id).all()
-        doctor_idx = list(chain(*doctor_idx))
-
-        if current_user.id in manager_idx or current_user.is_superuser:
-            note_in.modifier_id = current_user.id
-            note_in.date_modification = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            note = crud.note.update_note(db=db, db_obj = note, obj_in=note_in)
-        elif current_user.id == note.assistant_id or current_user.id == note.modifier_id \
-             or current_user.id in doctor_idx:
-            note_in.modifier_id = current_user.id
-            note_in.validated = False
-            note_in.date_modification = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            note = crud.note.update_note(db=db, db_obj = note, obj_in=note_in)
-            return note
-        else:
-            raise HTTPException(status_code=400, detail="Not enough permissions")
-    else:
+    note = await crud.note_async.get_by_note_id(db, id=note_id)
+    if not note:
         raise HTTPException(
             status_code=404,
             detail="No note fund with the given id.",
         )
-    
+
+    await access_graph.ensure_loaded_async(SessionLocal)
+    may_validate = check_note_access(note=note, current_user=current_user)
+    note_in.modifier_id = current_user.id
+    note_in.date_modification = datetime.now().replace(microsecond=0)
+    if not may_validate:
+        # any change by the assistant or the doctor is to be validated again
+        note_in.validated = False
+    note = await crud.note_async.update_note(db=db, db_obj = note, obj_in=note_in)
     return note
 
 #############################################
 
 @router.get("/doctor/{doctor_id}", response_model=List[schemas.Note])
-def read_doctor_notes(
+async def read_doctor_notes(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
     doctor_id: int,
     validated: Optional[bool]=None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
@@ -163,18 +170,22 @@ def read_doctor_notes(
         HTTPException(status_code=400, detail="Not enough permissions")
 
     if crud.user.is_superuser(current_user) or current_user.id  == doctor_id:
-        notes = crud.note.get_multi_by_doctor_id(db, doctor_id=doctor_id, validated=validated)
+        notes, next_cursor = await crud.note_async.get_multi_by_doctor_id(db, page=page, doctor_id=doctor_id, validated=validated)
     else :
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return notes
 
 @router.get("/manager/{manager_id}", response_model=List[schemas.Note])
-def read_manager_notes(
+async def read_manager_notes(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
     manager_id: int,
     validated: Optional[bool]=None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
@@ -184,31 +195,36 @@ def read_manager_notes(
     if current_user.role != "manager" and not current_user.is_superuser:
         HTTPException(status_code=400, detail="Not enough permissions")
     if crud.user.is_superuser(current_user) or current_user.id  == manager_id:
-        notes = crud.note.get_multi_by_manager(db, manager_id=manager_id, validated=validated)
+        notes, next_cursor = await crud.note_async.get_multi_by_manager(db, page=page, manager_id=manager_id, validated=validated)
     else :
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return notes
 
 @router.get("/patient/{patient_id}", response_model=List[schemas.Note])
-def read_patient_voices(
+async def read_patient_voices(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
     patient_id: int,
     validated: Optional[bool]=None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
     Retrieve voices.
     Only the patient or his doctor can retrieve the patient voices (also super user)
     """
-    doctor_idx = db.query(DoctorPatient).filter(DoctorPatient.patient_id == patient_id).with_entities(DoctorPatient.doctor_id).all()
-    doctor_idx = list(chain(*doctor_idx))
-
-    if crud.user.is_superuser(current_user) or current_user.id  == patient_id or current_user.id in doctor_idx:
-        notes = crud.note.get_multi_by_patient(db, patient_id=patient_id, validated=validated)
+    await access_graph.ensure_loaded_async(SessionLocal)
+    if crud.user.is_superuser(current_user) or current_user.id  == patient_id \
+            or access_graph.is_doctor_of_patient(current_user.id, patient_id):
+        notes, next_cursor = await crud.note_async.get_multi_by_patient(db, page=page, patient_id=patient_id, validated=validated)
     else :
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return notes
 
 
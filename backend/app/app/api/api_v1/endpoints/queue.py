@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Any, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, schemas
+from app.api import deps
+from app.api.unit_of_work import UnitOfWorkRoute
+from app.core import scheduler
+from app.core.access_graph import access_graph
+from app.core.config import settings
+from app.core.principal_cache import Principal
+from app.db.session import SessionLocal
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+
+def check_can_work(current_user: Principal) -> None:
+    if current_user.role != 'assistant' and not current_user.is_superuser:
+        raise HTTPException(
+            status_code=401,
+            detail="You have not the right to work on voices.",
+        )
+
+
+@router.post("/claim", response_model=schemas.Voice)
+async def claim_voice(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Lease the next voice waiting for its note to the current assistant, in
+    queue order (the earliest start_by, from its urgency, age and length),
+    for QUEUE_LEASE_SECONDS. Voices still being processed wait, those whose
+    processing failed come with their original recording. Claiming again
+    while holding a lease returns the same voice with its lease extended.
+    The lease ends with the note of the voice, on release, or when it
+    expires and another assistant claims the voice.
+    204 when there is nothing to do.
+    """
+    check_can_work(current_user)
+    voice = await crud.voice_async.claim_next(db, user=current_user, lease=settings.QUEUE_LEASE_SECONDS)
+    if voice is None:
+        return Response(status_code=204)
+    return voice
+
+
+@router.post("/{voice_id}/renew", response_model=schemas.Voice)
+async def renew_voice_lease(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    voice_id: int,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Extend the lease of the current assistant on the voice by
+    QUEUE_LEASE_SECONDS. 409 when it lost the voice: another assistant
+    claimed it after the lease expired, or its note was created.
+    """
+    check_can_work(current_user)
+    voice = await crud.voice_async.renew_lease(
+        db, id=voice_id, user_id=current_user.id, lease=settings.QUEUE_LEASE_SECONDS
+    )
+    if voice is None:
+        raise HTTPException(status_code=409, detail="You do not hold this voice")
+    return voice
+
+
+@router.post("/{voice_id}/release", status_code=204)
+async def release_voice(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    voice_id: int,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Give the voice back to the queue before the lease expires.
+    """
+    check_can_work(current_user)
+    voice = await crud.voice_async.release_lease(db, id=voice_id, user_id=current_user.id)
+    if voice is None:
+        raise HTTPException(status_code=409, detail="You do not hold this voice")
+    return Response(status_code=204)
+
+
+async def check_team_access(*, manager_id: int, current_user: Principal) -> None:
+    """
+    Raise unless current_user is the manager, one of its assistants or a
+    super user.
+    """
+    if current_user.is_superuser or current_user.id == manager_id:
+        return
+    await access_graph.ensure_loaded_async(SessionLocal)
+    if not access_graph.manages_assistant(manager_id, current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+
+
+@router.get("/forecast/{manager_id}", response_model=List[schemas.VoiceForecast])
+async def read_team_forecast(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    manager_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    The pending voices of the doctors of the manager in queue order, with
+    the assistant expected to take each one and when its note should be
+    done given the current load of the team, see
+    app.core.scheduler.forecast. `late` when that is after its due time.
+    Voices of a doctor shared with other managers may be taken by their
+    teams first, they are counted for this one.
+    """
+    await check_team_access(manager_id=manager_id, current_user=current_user)
+    voices = await crud.voice_async.get_queue_by_manager(db, manager_id=manager_id, limit=limit)
+    assistant_ids = await crud.user_async.get_assistant_ids_by_manager(db, manager_id=manager_id)
+    forecasts = scheduler.forecast(voices, assistant_ids, now=datetime.now())
+    return [{**forecast._asdict(), "late": forecast.late} for forecast in forecasts]
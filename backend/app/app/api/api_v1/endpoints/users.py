@@ -7,10 +7,12 @@ from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.api.unit_of_work import UnitOfWorkRoute
 from app.core.config import settings
+from app.core.principal_cache import Principal
 from app.utils import send_new_account_email
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/", response_model=List[schemas.User])
@@ -18,7 +20,7 @@ def read_users(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Retrieve users.
@@ -32,7 +34,7 @@ def create_user(
     *,
     db: Session = Depends(deps.get_db),
     user_in: schemas.UserCreate,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: Principal = Depends(deps.get_current_principal),
 ) -> Any:
     """
     Create new user.
@@ -144,7 +146,7 @@ def update_user(
     db: Session = Depends(deps.get_db),
     user_id: int,
     user_in: schemas.UserUpdate,
-    current_user: models.User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Update a user.
@@ -163,7 +165,7 @@ def update_user(
 def create_doctor_manager(
     doctor_id: int,
     manager_id: int,
-    current_user: models.User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
     db: Session = Depends(deps.get_db),
 ) -> Any:
     """
@@ -189,7 +191,7 @@ def create_doctor_manager(
 def create_doctor_patient(
     doctor_id: int,
     patient_id: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: Principal = Depends(deps.get_current_principal),
     db: Session = Depends(deps.get_db),
 ) -> Any:
     """
@@ -227,7 +229,7 @@ def create_doctor_patient(
 def create_assistant_manager(
     assistant_id: int,
     manager_id: int,
-    current_user: models.User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
     db: Session = Depends(deps.get_db),
 ) -> Any:
     """
@@ -1,20 +1,24 @@
-from typing import Any
+from typing import Any, Dict
 
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app import models, schemas
 from app.api import deps
+from app.api.unit_of_work import UnitOfWorkRoute
 from app.core.celery_app import celery_app
+from app.core.principal_cache import Principal
+from app.core.security import password_hasher
+from app.db.session import async_pool_metrics, pool_metrics, replica_pool_metrics, replica_set
 from app.utils import send_test_email
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.post("/test-celery/", response_model=schemas.Msg, status_code=201)
 def test_celery(
     msg: schemas.Msg,
-    current_user: models.User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Test Celery worker.
@@ -26,10 +30,39 @@ def test_celery(
 @router.post("/test-email/", response_model=schemas.Msg, status_code=201)
 def test_email(
     email_to: EmailStr,
-    current_user: models.User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Test emails.
     """
     send_test_email(email_to=email_to)
     return {"msg": "Test email sent"}
+
+
+@router.get("/password-hashing/")
+def password_hashing_stats(
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Dict[str, Any]:
+    """
+    Password hashing pool: hashes running or queued, completed, rejected
+    with a 503 and replaced on login since the process started.
+    """
+    return password_hasher.stats()
+
+
+@router.get("/db-pool/")
+def db_pool_stats(
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Dict[str, Any]:
+    """
+    Database connection pools of this worker: connections in use and idle,
+    checkouts waiting or that had to wait for one, timeouts, and the
+    checkout wait and hold time histograms since the process started. The
+    replicas with their last measured lag.
+    """
+    return {
+        "sync": pool_metrics.stats(),
+        "async": async_pool_metrics.stats(),
+        "replicas": replica_set.stats(),
+        "replica_pools": [metrics.stats() for metrics in replica_pool_metrics],
+    }
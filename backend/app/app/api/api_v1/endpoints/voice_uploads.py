@@ -0,0 +1,203 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, models, schemas
+from app.api import deps
+from app.api.unit_of_work import UnitOfWorkRoute
+from app.api.api_v1.endpoints.voices import check_voice_creation, queue_voice_processing
+from app.core.access_graph import access_graph
+from app.core.audio_metadata import AudioProbe
+from app.core.blobstore import blobstore
+from app.core.config import settings
+from app.core.ingest import append_stream, hash_file
+from app.core.principal_cache import Principal
+from app.db.session import SessionLocal
+from app.models.voice_upload import VoiceUpload
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+OFFSET_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+def upload_path(upload_id: str) -> str:
+    return os.path.join(settings.VOICE_UPLOAD_DIR, upload_id)
+
+
+def get_own_upload(db: Session, upload_id: str, current_user: Principal) -> VoiceUpload:
+    upload = crud.voice_upload.get(db, id=upload_id)
+    if not upload or (upload.owner_id != current_user.id and not current_user.is_superuser):
+        raise HTTPException(status_code=404, detail="No upload found with the given id")
+    return upload
+
+
+async def get_own_upload_async(db: AsyncSession, upload_id: str, current_user: Principal) -> VoiceUpload:
+    upload = await crud.voice_upload_async.get(db, id=upload_id)
+    if not upload or (upload.owner_id != current_user.id and not current_user.is_superuser):
+        raise HTTPException(status_code=404, detail="No upload found with the given id")
+    return upload
+
+
+@contextmanager
+def upload_lock(upload_id: str) -> Iterator[None]:
+    """
+    One writer per upload, a retried request must not interleave with the one
+    it replaces.
+    """
+    try:
+        fd = os.open(upload_path(upload_id), os.O_RDONLY)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="No upload found with the given id")
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(status_code=423, detail="Upload is being written by another request")
+        yield
+    finally:
+        os.close(fd)
+
+
+def offset_headers(upload: VoiceUpload) -> dict:
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post("/", response_model=schemas.VoiceUpload, status_code=201)
+def create_upload(
+    *,
+    db: Session = Depends(deps.get_db),
+    upload_in: schemas.VoiceUploadCreate,
+    response: Response,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Start a resumable voice upload.
+    The same rules as for creating a voice apply, they are checked before any
+    byte is sent.
+    """
+    access_graph.ensure_loaded(db)
+    check_voice_creation(db, current_user=current_user, doctor_id=upload_in.doctor_id, patient_id=upload_in.patient_id)
+    if upload_in.filename:
+        upload_in.filename = os.path.basename(upload_in.filename)
+    upload = crud.voice_upload.create_with_owner(db, obj_in=upload_in, owner_id=current_user.id)
+    os.makedirs(settings.VOICE_UPLOAD_DIR, exist_ok=True)
+    open(upload_path(upload.id), "wb").close()
+    response.headers["Location"] = f"{settings.API_V1_STR}/voices/uploads/{upload.id}"
+    return upload
+
+
+@router.head("/{upload_id}")
+def read_upload_offset(
+    *,
+    db: Session = Depends(deps.get_db),
+    upload_id: str,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Current offset of the upload, the client resumes sending from there.
+    """
+    upload = get_own_upload(db, upload_id, current_user)
+    return Response(status_code=200, headers=offset_headers(upload))
+
+
+@router.patch("/{upload_id}", status_code=204)
+async def append_upload_chunk(
+    *,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_async_db),
+    upload_id: str,
+    upload_offset: int = Header(...),
+    content_type: str = Header(...),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Append the request body to the upload at Upload-Offset.
+    The offset has to match the current one, a client that lost track of it
+    asks again with a HEAD request.
+    """
+    if content_type != OFFSET_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be {OFFSET_CONTENT_TYPE}")
+    upload = await get_own_upload_async(db, upload_id, current_user)
+    path = upload_path(upload.id)
+    with upload_lock(upload.id):
+        await db.refresh(upload)
+        if upload_offset != upload.offset:
+            raise HTTPException(status_code=409, detail="Upload-Offset does not match the current offset", headers=offset_headers(upload))
+        written, overflow = await append_stream(request, path, upload.offset, upload.length - upload.offset)
+        upload = await crud.voice_upload_async.update(db, db_obj=upload, obj_in={"offset": upload.offset + written})
+        # the next chunk may come in as soon as the lock is released
+        await db.commit()
+    if overflow:
+        raise HTTPException(status_code=413, detail="Upload exceeds its declared length", headers=offset_headers(upload))
+    return Response(status_code=204, headers=offset_headers(upload))
+
+
+@router.post("/{upload_id}/finalize", response_model=schemas.Voice)
+async def finalize_upload(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    upload_id: str,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Turn a complete upload into a voice.
+    """
+    upload = await get_own_upload_async(db, upload_id, current_user)
+    with upload_lock(upload.id):
+        # a concurrent finalize removes the row before releasing the lock
+        db.expire_all()
+        upload = await get_own_upload_async(db, upload_id, current_user)
+        if upload.offset != upload.length:
+            raise HTTPException(status_code=409, detail="Upload is not complete", headers=offset_headers(upload))
+        # the relationship may have changed since the upload was started
+        await access_graph.ensure_loaded_async(SessionLocal)
+        await db.run_sync(check_voice_creation, current_user=current_user, doctor_id=upload.doctor_id, patient_id=upload.patient_id)
+        path = upload_path(upload.id)
+        probe = AudioProbe()
+        blob_id = await run_in_threadpool(hash_file, path, probe)
+        # rolled back with the voice if the request fails, see crud.blob.acquire
+        await db.run_sync(crud.blob.acquire, id=blob_id, size=upload.length)
+        await run_in_threadpool(blobstore.put_file, path, blob_id)
+        voice_in = schemas.VoiceCreate(
+            path=blob_id,
+            doctor_id=upload.doctor_id,
+            patient_id=upload.patient_id,
+            title=upload.title,
+            remarque=upload.remarque,
+            **probe.result()._asdict(),
+        )
+        voice = await crud.voice_async.create_with_doctor(db=db, obj_in=voice_in, date_creation=datetime.now().replace(microsecond=0))
+        await crud.voice_upload_async.remove(db, id=upload.id)
+        await db.run_sync(queue_voice_processing, voice=voice)
+        await db.commit()
+    return voice
+
+
+@router.delete("/{upload_id}", status_code=204)
+def delete_upload(
+    *,
+    db: Session = Depends(deps.get_db),
+    upload_id: str,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Abandon an upload and drop the bytes received so far.
+    """
+    upload = get_own_upload(db, upload_id, current_user)
+    crud.voice_upload.remove(db, id=upload.id)
+    try:
+        os.remove(upload_path(upload.id))
+    except FileNotFoundError:
+        pass
+    return Response(status_code=204)
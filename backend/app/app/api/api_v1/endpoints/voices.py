@@ -1,85 +1,249 @@
+import hashlib
 import os
-import aiofiles
 
 from typing import Any, List, Optional
-from itertools import chain
-from pathlib import Path
 
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi import File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import uuid
 
 from datetime import datetime
 from app import crud, models, schemas
 from app.api import deps
+from app.api.unit_of_work import UnitOfWorkRoute
+from app.core.access_graph import access_graph
+from app.core.audio_response import AudioFileResponse, accel_redirect_uri, etag_matches
+from app.core.blobstore import blobstore
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.export import MEDIA_TYPES, ExportFormat, export_table
+from app.core.ingest import IngestError, StreamingFormParser
+from app.core.pagination import Page
+from app.core.peaks import read_level
+from app.core.principal_cache import Principal
+from app.db.session import SessionLocal, after_commit
 
-from app.models.doctor_manager import DoctorManager
-from app.models.assistant_manager import AssistantManager
-from app.models.doctor_patient import DoctorPatient
+from app.models.voice import Voice
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/", response_model=List[schemas.Voice])
-def read_voices(
-    db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user),
+async def read_voices(
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
+    note_created: Optional[bool]=None,
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
-    Retrieve all voices. Only super user can use it
+    Retrieve the voices the current user may read, all of them for a super
+    user. The permission check is part of the query.
     """
-    if crud.user.is_superuser(current_user):
-        voices = crud.voice.get_all(db)
-    else:
-        HTTPException(status_code=400, detail="Not enough permissions")
+    voices, next_cursor = await crud.voice_async.get_multi_visible(db, user=current_user, page=page, note_created=note_created)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return voices
 
- #to change after having the relationship crud
+
+@router.get("/export")
+def export_voices(
+    db: Session = Depends(deps.get_db),
+    format: ExportFormat = ExportFormat.ndjson,
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Stream every voice as NDJSON or CSV, for audits. Only super user can use it
+    """
+    return StreamingResponse(
+        export_table(db, Voice.__table__, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"content-disposition": f'attachment; filename="voices.{format.value}"'},
+    )
+
+def check_voice_access(*, voice: Voice, current_user: Principal) -> None:
+    """
+    Raise unless current_user may read the voice: its doctor, its patient, the
+    managers of the doctor, the assistants of those managers or a super user.
+    The caller loads the access graph.
+    """
+    if not access_graph.can_access_voice(current_user, voice):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+
+
 @router.get("/{voice_id}", response_model=schemas.Voice)
-def read_voice_by_id(
+async def read_voice_by_id(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     voice_id : int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
     Retrieve voices. Only the doctor of the patient, the assistant owner of the voice or his manager can retrieve it
     """
-     #to change after having the relationship crud
-    voice = crud.voice.get_by_voice_id(db, id=voice_id)
-    if voice:
-        manager_idx = db.query(DoctorManager).filter(DoctorManager.doctor_id == voice.doctor_id).\
-                                        with_entities(DoctorManager.manager_id).all()
-        manager_idx = list(chain(*manager_idx))
-        assistant_idx = db.query(AssistantManager).filter(AssistantManager.manager_id in manager_idx).\
-                                        with_entities(AssistantManager.assistant_id).all()
-        assistant_idx = list(chain(*assistant_idx))
-
-        if current_user.id == voice.doctor_id:
-            return voice
-        elif current_user.id == voice.patient_id:
-            return voice
-        elif current_user.id in manager_idx:
-            return voice
-        elif current_user.id in assistant_idx:
-            return voice
-        else:
-            HTTPException(status_code=400, detail="Not enough permissions")
+    voice = await crud.voice_async.get_by_voice_id(db, id=voice_id)
+    if not voice:
+        raise HTTPException(status_code=404, detail="No voice found with given voice id")
+    await access_graph.ensure_loaded_async(SessionLocal)
+    check_voice_access(voice=voice, current_user=current_user)
     return voice
 
 
+@router.put("/{voice_id}/urgency", response_model=schemas.Voice)
+async def update_voice_urgency(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    voice_id : int,
+    urgency_in: schemas.VoiceUrgency,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Change the urgency of a voice waiting for its note, which moves it in
+    the work queue. Only its doctor and super users can change it
+    """
+    voice = await crud.voice_async.get_by_voice_id(db, id=voice_id)
+    if not voice:
+        raise HTTPException(status_code=404, detail="No voice found with given voice id")
+    if voice.doctor_id != current_user.id and not current_user.is_superuser:
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    if voice.note_created:
+        raise HTTPException(status_code=409, detail="The note of this voice is already created")
+    return await crud.voice_async.set_urgency(db, db_obj=voice, urgency=urgency_in.urgency.value)
+
 
-@router.get("/doctor/{doctor_id}", response_model=List[schemas.Voice])
-def read_doctor_voices(
+@router.api_route("/{voice_id}/audio", methods=["GET", "HEAD"])
+def read_voice_audio(
     *,
+    request: Request,
     db: Session = Depends(deps.get_db),
+    voice_id : int,
+    trimmed: bool = False,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Stream the recording of a voice, same access rules as reading the voice.
+    Supports HEAD, Range (single and multiple) and If-None-Match requests.
+    With trimmed, the copy without silences (when VOICE_VAD_TRIM is on).
+    """
+    voice = crud.voice.get_by_voice_id(db, id=voice_id)
+    if not voice:
+        raise HTTPException(status_code=404, detail="No voice found with given voice id")
+    access_graph.ensure_loaded(db)
+    check_voice_access(voice=voice, current_user=current_user)
+    # blobs are content addressed, their id is a strong validator
+    etag = None if os.path.isabs(voice.path) else f'"{voice.path}"'
+    if trimmed:
+        key = blobstore.derived_key(voice.path, "trimmed.ogg")
+        etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+    else:
+        key = blobstore.key(voice.path)
+    accel_redirect = None
+    path = blobstore.storage.local_path(key)
+    if settings.VOICE_ACCEL_REDIRECT_PREFIX and path is not None:
+        accel_redirect = accel_redirect_uri(settings.VOICE_ACCEL_REDIRECT_PREFIX, settings.VOICE_STORAGE_DIR, path)
+    try:
+        return AudioFileResponse(
+            blobstore.storage,
+            key,
+            request_headers=request.headers,
+            etag=etag,
+            accel_redirect=accel_redirect,
+            method=request.method,
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="The recording of this voice is missing")
+
+
+@router.get("/{voice_id}/peaks")
+def read_voice_peaks(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    voice_id : int,
+    samples_per_pixel: Optional[int] = None,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Waveform peaks of the recording in the audiowaveform .dat format (8 bit),
+    at the stored zoom level closest to samples_per_pixel, the coarsest one
+    by default. X-Peaks-Levels lists the available levels.
+    """
+    voice = crud.voice.get_by_voice_id(db, id=voice_id)
+    if not voice:
+        raise HTTPException(status_code=404, detail="No voice found with given voice id")
+    access_graph.ensure_loaded(db)
+    check_voice_access(voice=voice, current_user=current_user)
+    key = blobstore.derived_key(voice.path, "peaks.dat")
+    try:
+        content, level, levels = read_level(blobstore.storage, key, samples_per_pixel)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="The peaks of this voice are not computed yet")
+    headers = {
+        # peaks of a blob never change, a new recording means a new blob id
+        "etag": '"%s-%s"' % (hashlib.md5(key.encode()).hexdigest(), level),
+        "cache-control": "private, max-age=31536000",
+        "x-peaks-levels": ",".join(str(level) for level in levels),
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, headers["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/{voice_id}/segments", response_model=List[schemas.VoiceSegment])
+def read_voice_segments(
+    *,
+    db: Session = Depends(deps.get_db),
+    voice_id : int,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Speech segments of the recording, in seconds, empty until detected.
+    """
+    voice = crud.voice.get_by_voice_id(db, id=voice_id)
+    if not voice:
+        raise HTTPException(status_code=404, detail="No voice found with given voice id")
+    access_graph.ensure_loaded(db)
+    check_voice_access(voice=voice, current_user=current_user)
+    return crud.voice_segment.get_multi_by_voice(db, voice_id=voice.id)
+
+
+@router.get("/{voice_id}/transcript", response_model=schemas.Transcript)
+def read_voice_transcript(
+    *,
+    db: Session = Depends(deps.get_db),
+    voice_id : int,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Machine transcript of the recording, a draft for the note, with the
+    timing of every word.
+    """
+    voice = crud.voice.get_by_voice_id(db, id=voice_id)
+    if not voice:
+        raise HTTPException(status_code=404, detail="No voice found with given voice id")
+    access_graph.ensure_loaded(db)
+    check_voice_access(voice=voice, current_user=current_user)
+    transcript = crud.transcript.get_by_voice(db, voice_id=voice.id)
+    if not transcript:
+        raise HTTPException(status_code=404, detail="This voice has not been transcribed yet")
+    return transcript
+
+
+@router.get("/doctor/{doctor_id}", response_model=List[schemas.Voice])
+async def read_doctor_voices(
+    *,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
     doctor_id: int,
     note_created: Optional[bool]=None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
@@ -87,18 +251,22 @@ def read_doctor_voices(
     Only That dctor and a super user can use it
     """
     if (crud.user.is_superuser(current_user) or current_user.id  == doctor_id):
-        voices = crud.voice.get_multi_by_doctor_id(db, doctor_id=doctor_id, note_created=note_created)
+        voices, next_cursor = await crud.voice_async.get_multi_by_doctor_id(db, page=page, doctor_id=doctor_id, note_created=note_created)
     else :
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return voices
 
 @router.get("/manager/{manager_id}", response_model=List[schemas.Voice])
-def read_manager_voices(
+async def read_manager_voices(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
     manager_id: int,
     note_created: Optional[bool]=None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
@@ -106,19 +274,23 @@ def read_manager_voices(
     Only that manager and super user can use it
     """
     if (crud.user.is_superuser(current_user) or current_user.id  == manager_id):
-        voices = crud.voice.get_multi_by_manager(db, manager_id=manager_id, note_created=note_created)
+        voices, next_cursor = await crud.voice_async.get_multi_by_manager(db, page=page, manager_id=manager_id, note_created=note_created)
     else :
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return voices
 
 
 @router.get("/patient/{patient_id}", response_model=List[schemas.Voice])
-def read_patient_voices(
+async def read_patient_voices(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_db),
+    page: Page = Depends(deps.get_page),
     patient_id: int,
     note_created: Optional[bool]=None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
     
 ) -> Any:
     """
@@ -126,42 +298,33 @@ def read_patient_voices(
     if it's the patient session (or super user), it will retrieve all patient voices
     if it's the doctor session , it will retrieve the patient-doctors related voices
     """
-    #to change after having the relationship crud
-    doctor_idx = db.query(DoctorPatient).filter(DoctorPatient.patient_id == patient_id).\
-                                        with_entities(DoctorPatient.doctor_id).all()
-    doctor_idx = list(chain(*doctor_idx))
-
+    await access_graph.ensure_loaded_async(SessionLocal)
     if (crud.user.is_superuser(current_user) or current_user.id  == patient_id):
-        voices = crud.voice.get_multi_by_patient(db, patient_id=patient_id, note_created=note_created)
-    elif current_user.role == 'doctor' and current_user.id in doctor_idx:
-        voices = crud.voice.get_multi_by_patient(db, patient_id=patient_id, doctor_id=current_user.id, note_created=note_created)
+        voices, next_cursor = await crud.voice_async.get_multi_by_patient(db, page=page, patient_id=patient_id, note_created=note_created)
+    elif current_user.role == 'doctor' and access_graph.is_doctor_of_patient(current_user.id, patient_id):
+        voices, next_cursor = await crud.voice_async.get_multi_by_patient(db, page=page, patient_id=patient_id, doctor_id=current_user.id, note_created=note_created)
     else :
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return voices
 
-@router.post("/", response_model=schemas.Voice)
-async def create_voice(
-    *,
-    db: Session = Depends(deps.get_db),
-    doctor_id : int = Form(...),
-    patient_id : int = Form(...),
-    title: Optional[str] = Form(None),
-    remarque : Optional[str] = Form(None),
-    voice_file: UploadFile=File(...),
-    current_user: models.User = Depends(deps.get_current_active_user),
-) -> Any:
+
+def check_voice_creation(
+    db: Session, *, current_user: Principal, doctor_id: int, patient_id: int
+) -> None:
     """
-    Create new item.
-    Only doctors and super users can create voices
+    Raise if current_user may not record a voice of patient_id for doctor_id.
+    Only the doctor himself (or a super user) can, for one of his patients.
+    The caller loads the access graph.
     """
-    voice_in = schemas.VoiceCreate(path='', doctor_id=doctor_id, patient_id=patient_id, title=title, remarque=remarque)
-    if (current_user.role != 'doctor' or current_user.id != voice_in.doctor_id) and (not current_user.is_superuser):
+    if (current_user.role != 'doctor' or current_user.id != doctor_id) and (not current_user.is_superuser):
         raise HTTPException(
             status_code=401,
             detail="You have not the right the right to write a voice.",
         )
     #to change after having the relationship crud
-    patient = crud.user.get_by_id(db=db, id=voice_in.patient_id)
+    patient = crud.user.get_by_id(db=db, id=patient_id)
     if not patient:
         raise HTTPException(
             status_code=404,
@@ -172,29 +335,74 @@ async def create_voice(
             status_code=405,
             detail="The id of the given patient is not related to a patient",
         )
-    
-    doctor_idx = db.query(DoctorPatient).filter(DoctorPatient.patient_id == voice_in.patient_id).\
-                                        with_entities(DoctorPatient.doctor_id).all()
-    doctor_idx = list(chain(*doctor_idx))
 
-    if not voice_in.doctor_id in doctor_idx:
+    if not access_graph.is_doctor_of_patient(doctor_id, patient_id):
         raise HTTPException(
                 status_code=405,
                 detail="This patient is not related to doctor, please ask the admin to relate it to the doctor",
             )
-    
-    filename = str(uuid.uuid4())
-    storage_path = list(Path(os.path.abspath(__file__)).parents)[-2]
-    voice_save_path = os.path.abspath(os.path.join(storage_path, 'storage',filename+'_'+voice_file.filename))
-    print("voice_save_path", voice_save_path)
-    voice_in.path = voice_save_path
-    async with aiofiles.open(voice_save_path, 'wb') as out_file:
-        while True:
-            contents = await voice_file.read(1024)
-            if not contents:
-                break
-            await out_file.write(contents)
-    
-    voice = crud.voice.create_with_doctor(db=db, obj_in=voice_in, date_creation=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        
-    return voice
\ No newline at end of file
+
+
+def queue_voice_processing(db: Session, *, voice: Voice) -> None:
+    """
+    Hand a new voice to the worker pipeline (app.worker.process_voice) once
+    it is committed, the request does not wait for it.
+    """
+    if settings.VOICE_TRANSCODE_ENABLED:
+        voice_id = voice.id
+        after_commit(db, lambda: celery_app.send_task("app.worker.process_voice", args=[voice_id]))
+    else:
+        crud.voice.update(db, db_obj=voice, obj_in={"processing_status": "ready"})
+
+
+@router.post("/", response_model=schemas.Voice)
+async def create_voice(
+    *,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Create new item.
+    Only doctors and super users can create voices
+
+    Expects a multipart form with the fields doctor_id, patient_id, title,
+    remarque and the recording as voice_file. The recording is streamed
+    directly into the blob store, identical recordings are stored once.
+    """
+    try:
+        form = await StreamingFormParser(
+            request, blobstore.open_writer, file_field="voice_file", probe_audio=True
+        ).parse()
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        if form.file is None:
+            raise HTTPException(status_code=422, detail="voice_file is required")
+        try:
+            voice_in = schemas.VoiceCreate(**{**form.fields, 'path': '', **form.metadata._asdict()})  # type: ignore
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors())
+        await access_graph.ensure_loaded_async(SessionLocal)
+        # the sync checks through the async connection, see AsyncSession.run_sync
+        await db.run_sync(check_voice_creation, current_user=current_user, doctor_id=voice_in.doctor_id, patient_id=voice_in.patient_id)
+    except BaseException:
+        await form.abort()
+        raise
+
+    # Take the reference before placing the blob so that a concurrent release
+    # of the same content cannot remove it underneath us. If the request
+    # fails from here the reference is rolled back with the voice, and a
+    # file stored for it alone is deleted (crud.blob.acquire)
+    voice_in.path = await form.file.hexdigest()
+    await db.run_sync(crud.blob.acquire, id=voice_in.path, size=form.file.size)
+    try:
+        await blobstore.put(form.file)
+    except BaseException:
+        await form.abort()
+        raise
+
+    voice = await crud.voice_async.create_with_doctor(db=db, obj_in=voice_in, date_creation=datetime.now().replace(microsecond=0))
+    await db.run_sync(queue_voice_processing, voice=voice)
+
+    return voice
@@ -1,48 +1,127 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
+from app.api import unit_of_work
 from app.core import security
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.core.pagination import Page, decode_cursor
+from app.core.principal_cache import Principal, principal_cache
+from app.db.routing import reads_from_primary
+from app.db.session import (
+    AsyncSessionLocal,
+    SessionLocal,
+    async_replica_engines,
+    replica_engines,
+    replica_set,
+)
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator:
+def get_replica(request: Request) -> Optional[int]:
+    """
+    Index of the read replica the request reads from, None for the primary,
+    see app.db.routing.
+    """
+    if not replica_engines or reads_from_primary(request):
+        return None
+    return replica_set.choose()
+
+
+def get_db(request: Request, replica: Optional[int] = Depends(get_replica)) -> Generator:
+    """
+    The session of the request, committed by unit_of_work.UnitOfWorkRoute
+    once the endpoint returned.
+    """
     try:
-        db = SessionLocal()
+        db = SessionLocal() if replica is None else SessionLocal(bind=replica_engines[replica])
+        unit_of_work.register(request, db)
         yield db
     finally:
         db.close()
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
-) -> models.User:
+async def get_async_db(
+    request: Request, replica: Optional[int] = Depends(get_replica)
+) -> AsyncGenerator:
+    """
+    get_db for async endpoints, the queries do not block the event loop.
+    """
+    if replica is None or replica >= len(async_replica_engines):
+        db = AsyncSessionLocal()
+    else:
+        db = AsyncSessionLocal(bind=async_replica_engines[replica])
+    unit_of_work.register(request, db)
+    async with db:
+        yield db
+
+
+async def get_token_data(token: str = Depends(reusable_oauth2)) -> schemas.TokenPayload:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
-        token_data = schemas.TokenPayload(**payload)
+        return schemas.TokenPayload(**payload)
     except (jwt.JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
+
+
+def get_current_user(
+    db: Session = Depends(get_db), token_data: schemas.TokenPayload = Depends(get_token_data)
+) -> models.User:
     user = crud.user.get(db, id=token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    principal_cache.set(Principal.from_user(user))
     return user
 
 
+async def load_principal(db: AsyncSession, user_id: int) -> Principal:
+    # the session only connects on a cache miss
+    principal = await principal_cache.get_async(user_id)
+    if principal is None:
+        user = await crud.user_async.get(db, id=user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal = Principal.from_user(user)
+        await principal_cache.set_async(principal)
+    return principal
+
+
+async def get_current_principal(
+    db: AsyncSession = Depends(get_async_db),
+    token_data: schemas.TokenPayload = Depends(get_token_data),
+) -> Principal:
+    """
+    Id, role and flags of the authenticated user as they are now. The role
+    comes from the claims of the access token while its relationship
+    version (rv) is the current one of the user, a token issued before a
+    change to the care team, role or flags of the user gets the principal
+    as it is now instead, as do tokens issued before they carried claims.
+    The active and super user flags are always the current ones, a
+    deactivation or demotion applies to the next request.
+    The current principal comes from the principal cache, which the change
+    invalidates (everywhere with Redis, in the process that made it with
+    the local cache, the others within PRINCIPAL_CACHE_TTL).
+    """
+    current = await load_principal(db, token_data.sub)  # type: ignore
+    if token_data.su is None or (token_data.rv or 0) < current.relationship_version:
+        return current
+    return current._replace(role=token_data.role, relationship_version=token_data.rv or 0)
+
+
 def get_current_active_user(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
@@ -51,11 +130,35 @@ def get_current_active_user(
     return current_user
 
 
-def get_current_active_superuser(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
-    if not crud.user.is_superuser(current_user):
+async def get_current_active_principal(
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+async def get_current_active_superuser(
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
+    if not current_user.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+async def get_page(
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+) -> Page:
+    """
+    Page of a listing, the cursor is the X-Next-Cursor header of the
+    previous page.
+    """
+    if cursor is None:
+        return Page(limit=limit)
+    try:
+        return Page(limit=limit, after=decode_cursor(cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
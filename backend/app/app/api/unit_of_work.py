@@ -0,0 +1,49 @@
+from typing import Callable, List, Union
+
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def register(request: Request, db: Union[Session, AsyncSession]) -> None:
+    """
+    Have the session of deps.get_db or deps.get_async_db committed at the end
+    of the request.
+    """
+    sessions: List[Union[Session, AsyncSession]] = getattr(request.state, "sessions", [])
+    sessions.append(db)
+    request.state.sessions = sessions
+
+
+async def commit(request: Request) -> None:
+    for db in getattr(request.state, "sessions", []):
+        if isinstance(db, AsyncSession):
+            await db.commit()
+        else:
+            await run_in_threadpool(db.commit)
+
+
+class UnitOfWorkRoute(APIRoute):
+    """
+    A request is one transaction: the CRUD methods only flush, the sessions
+    of the request are committed once the endpoint returned and before the
+    response is sent, so a client never sees a write that is then lost.
+    An endpoint that raises, or answers with an error status, has its
+    changes rolled back when the session closes. Endpoints commit earlier
+    themselves only where a lock or another process has to see the change
+    before the request ends.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def unit_of_work_handler(request: Request) -> Response:
+            response: Response = await handler(request)
+            if response.status_code < 400:
+                await commit(request)
+            return response
+
+        return unit_of_work_handler
@@ -0,0 +1,79 @@
+import argparse
+import logging
+import os
+from multiprocessing import Pool
+from typing import Optional, Tuple
+
+from app.core.audio_metadata import AudioMetadata, probe_object
+from app.core.blobstore import blobstore
+from app.db.session import SessionLocal
+from app.models.voice import Voice
+from app.storage import get_storage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def init_process() -> None:
+    # storage clients (boto3) must not be shared across a fork
+    blobstore.storage = get_storage()
+
+
+def probe_voice(item: Tuple[int, str]) -> Tuple[int, Optional[AudioMetadata]]:
+    voice_id, path = item
+    try:
+        return voice_id, probe_object(blobstore.storage, blobstore.key(path))
+    except (OSError, ValueError) as e:
+        logger.warning("Voice %s: cannot read %s: %s", voice_id, path, e)
+        return voice_id, None
+
+
+def backfill(processes: int, batch_size: int) -> int:
+    """
+    Read the audio metadata of the voices that have none, `processes` files at
+    a time. Only the headers are read, remote objects with range requests.
+    Returns the number of voices updated.
+    """
+    db = SessionLocal()
+    updated = 0
+    last_id = 0
+    try:
+        with Pool(processes, initializer=init_process) as pool:
+            while True:
+                rows = (
+                    db.query(Voice.id, Voice.path)
+                    .filter(Voice.byte_size.is_(None), Voice.id > last_id)
+                    .order_by(Voice.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                results = pool.map(probe_voice, [tuple(row) for row in rows])
+                mappings = [
+                    {"id": voice_id, **metadata._asdict()}
+                    for voice_id, metadata in results
+                    if metadata is not None
+                ]
+                db.bulk_update_mappings(Voice, mappings)
+                db.commit()
+                updated += len(mappings)
+                logger.info("%s voices updated, up to id %s", updated, last_id)
+    finally:
+        db.close()
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill the audio metadata of the voices")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    logger.info("Backfilling audio metadata")
+    backfill(args.processes, args.batch_size)
+    logger.info("Audio metadata backfilled")
+
+
+if __name__ == "__main__":
+    main()
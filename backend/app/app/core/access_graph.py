@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, DefaultDict, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.assistant_manager import AssistantManager
+from app.models.doctor_manager import DoctorManager
+from app.models.doctor_patient import DoctorPatient
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel the relationship changes are announced on
+CHANNEL = "access_graph"
+
+# kind: (model, column of the first id, column of the second id)
+RELATIONSHIPS = {
+    "doctor_manager": (DoctorManager, "doctor_id", "manager_id"),
+    "doctor_patient": (DoctorPatient, "doctor_id", "patient_id"),
+    "assistant_manager": (AssistantManager, "assistant_id", "manager_id"),
+}
+
+Adjacency = DefaultDict[int, Set[int]]
+
+
+class _Edges:
+    """
+    One relationship in both directions.
+    """
+
+    def __init__(self) -> None:
+        self.forward: Adjacency = defaultdict(set)
+        self.backward: Adjacency = defaultdict(set)
+
+    def set(self, a: int, b: int, present: bool) -> None:
+        if present:
+            self.forward[a].add(b)
+            self.backward[b].add(a)
+        else:
+            self.forward[a].discard(b)
+            self.backward[b].discard(a)
+
+
+class AccessGraph:
+    """
+    The care team relationships (doctor-manager, doctor-patient and
+    assistant-manager) held in memory as adjacency sets, so deciding whether
+    a user may see a voice or a note takes no query.
+
+    The whole graph is loaded on first use and again every `ttl` seconds as a
+    safety net. Changes made through crud.user are applied to the graph of
+    the process that makes them and announced with a Postgres NOTIFY, the
+    listener thread of every other process then reads the changed
+    relationship back, so the processes converge on the database within
+    milliseconds.
+
+    Async code loads it with ensure_loaded_async, never with ensure_loaded
+    through AsyncSession.run_sync: load holds a thread lock while it reads,
+    and run_sync gives the event loop to the other requests on each query,
+    the next one to wait on the lock would block the loop for good.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._edges: Dict[str, _Edges] = {kind: _Edges() for kind in RELATIONSHIPS}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._changes_during_load: Optional[List[Tuple[str, int, int, bool]]] = None
+        # the load the coroutines of the event loop are waiting on
+        self._loading: Optional["asyncio.Future[None]"] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # Loading and changes
+
+    def load(self, db: Session) -> None:
+        with self._load_lock:
+            with self._lock:
+                # changes made while the tables are read are replayed after
+                self._changes_during_load = []
+            edges = {kind: _Edges() for kind in RELATIONSHIPS}
+            for kind, (model, a, b) in RELATIONSHIPS.items():
+                for first, second in db.query(getattr(model, a), getattr(model, b)):
+                    edges[kind].set(first, second, True)
+            with self._lock:
+                for kind, first, second, present in self._changes_during_load:
+                    edges[kind].set(first, second, present)
+                self._changes_during_load = None
+                self._edges = edges
+                self._loaded_at = time.monotonic()
+
+    def is_fresh(self) -> bool:
+        loaded_at = self._loaded_at
+        return loaded_at is not None and time.monotonic() - loaded_at <= self.ttl
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self.is_fresh():
+            self.load(db)
+
+    async def ensure_loaded_async(self, session_factory: Callable[[], Session]) -> None:
+        """
+        ensure_loaded for the event loop. The graph is read in the threadpool
+        with a session of its own, the requests arriving meanwhile wait on
+        that same load.
+        """
+        if self.is_fresh():
+            return
+        loop = asyncio.get_running_loop()
+        loading = self._loading
+        if loading is None or loading.get_loop() is not loop:
+            loading = loop.create_task(run_in_threadpool(self._load_new_session, session_factory))
+            loading.add_done_callback(self._loading_done)
+            self._loading = loading
+        # a cancelled request does not cancel the load of the others
+        await asyncio.shield(loading)
+
+    def _load_new_session(self, session_factory: Callable[[], Session]) -> None:
+        db = session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    def _loading_done(self, loading: "asyncio.Future[None]") -> None:
+        if self._loading is loading:
+            self._loading = None
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def set_edge(self, kind: str, a: int, b: int, present: bool) -> None:
+        with self._lock:
+            self._edges[kind].set(a, b, present)
+            if self._changes_during_load is not None:
+                self._changes_during_load.append((kind, a, b, present))
+
+    def announce(self, db: Session, kind: str, a: int, b: int) -> None:
+        """
+        Tell the other processes that the relationship changed, delivered
+        when the transaction of `db` commits.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            payload = json.dumps([kind, a, b])
+            db.execute("SELECT pg_notify(:channel, :payload)", {"channel": CHANNEL, "payload": payload})
+
+    def refresh_edge(self, db: Session, kind: str, a: int, b: int) -> None:
+        model, column_a, column_b = RELATIONSHIPS[kind]
+        present = (
+            db.query(model.id)
+            .filter(getattr(model, column_a) == a, getattr(model, column_b) == b)
+            .first()
+            is not None
+        )
+        self.set_edge(kind, a, b, present)
+
+    # Queries, O(1) or the size of an assistant's managers
+
+    def manages_doctor(self, manager_id: int, doctor_id: int) -> bool:
+        return manager_id in self._edges["doctor_manager"].forward.get(doctor_id, ())
+
+    def manages_assistant(self, manager_id: int, assistant_id: int) -> bool:
+        return manager_id in self._edges["assistant_manager"].forward.get(assistant_id, ())
+
+    def is_doctor_of_patient(self, doctor_id: int, patient_id: int) -> bool:
+        return doctor_id in self._edges["doctor_patient"].backward.get(patient_id, ())
+
+    def assists_doctor(self, assistant_id: int, doctor_id: int) -> bool:
+        """
+        Whether the assistant works for one of the managers of the doctor.
+        """
+        managers = self._edges["assistant_manager"].forward.get(assistant_id)
+        doctor_managers = self._edges["doctor_manager"].forward.get(doctor_id)
+        return bool(managers and doctor_managers and not managers.isdisjoint(doctor_managers))
+
+    def can_access_voice(self, user: Any, voice: Any) -> bool:
+        """
+        Its doctor, its patient, the managers of the doctor, the assistants
+        of those managers and super users.
+        """
+        if user.is_superuser or user.id in (voice.doctor_id, voice.patient_id):
+            return True
+        return self.manages_doctor(user.id, voice.doctor_id) or self.assists_doctor(
+            user.id, voice.doctor_id
+        )
+
+    # Listening to the other processes
+
+    def start_listener(self, engine: Engine, session_factory: Callable[[], Session]) -> None:
+        if engine.dialect.name != "postgresql" or self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen, args=(engine, session_factory), name="access-graph", daemon=True
+        )
+        self._listener.start()
+
+    def stop_listener(self) -> None:
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+
+    def _listen(self, engine: Engine, session_factory: Callable[[], Session]) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen_once(engine, session_factory)
+            except Exception:
+                logger.exception("Access graph listener failed, reconnecting")
+            # changes may have been missed while disconnected
+            self.invalidate()
+            self._stop.wait(5)
+
+    def _listen_once(self, engine: Engine, session_factory: Callable[[], Session]) -> None:
+        connection = engine.raw_connection()
+        # kept out of the pool, it is left in autocommit
+        connection.detach()
+        try:
+            connection.connection.set_isolation_level(0)
+            cursor = connection.cursor()
+            cursor.execute(f"LISTEN {CHANNEL}")
+            # anything before LISTEN is covered by a reload
+            self.invalidate()
+            while not self._stop.is_set():
+                if select.select([connection.connection], [], [], 1.0) == ([], [], []):
+                    continue
+                connection.connection.poll()
+                changes: Set[Tuple[str, int, int]] = set()
+                while connection.connection.notifies:
+                    notify = connection.connection.notifies.pop(0)
+                    kind, a, b = json.loads(notify.payload)
+                    changes.add((kind, a, b))
+                if changes:
+                    db = session_factory()
+                    try:
+                        for kind, a, b in changes:
+                            self.refresh_edge(db, kind, a, b)
+                    finally:
+                        db.close()
+        finally:
+            connection.close()
+
+
+access_graph = AccessGraph(ttl=settings.ACCESS_GRAPH_TTL)
@@ -0,0 +1,126 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.vad import Segment
+
+try:
+    import vosk
+except ImportError:  # pragma: nocover
+    vosk = None  # type: ignore
+
+# Vosk models are trained on 16 kHz audio
+SAMPLE_RATE = 16000
+# Words further apart than this (seconds) start a new paragraph of the draft
+PARAGRAPH_GAP = 2.0
+# Samples handed to the recognizer at once
+FEED_SAMPLES = 8000
+
+
+class Word(NamedTuple):
+    word: str
+    start: float
+    end: float
+    conf: float
+
+
+def plan_chunks(segments: Sequence[Segment], max_seconds: float) -> List[Segment]:
+    """
+    Group consecutive speech segments into chunks of at most `max_seconds`,
+    so every chunk starts and ends in a pause. A single segment longer than
+    that, rare in dictation, is cut at fixed intervals.
+    """
+    chunks: List[Segment] = []
+    for start, end in segments:
+        while end - start > max_seconds:
+            chunks.append((start, start + max_seconds))
+            start += max_seconds
+        if chunks and end - chunks[-1][0] <= max_seconds:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+    return chunks
+
+
+def words_to_text(words: Sequence[Word]) -> str:
+    text = []
+    previous: Optional[Word] = None
+    for word in words:
+        if previous is not None:
+            text.append("\n\n" if word.start - previous.end >= PARAGRAPH_GAP else " ")
+        text.append(word.word)
+        previous = word
+    return "".join(text)
+
+
+_model: Any = None
+
+
+def _load_model(model_path: str) -> None:
+    global _model
+    vosk.SetLogLevel(-1)
+    _model = vosk.Model(model_path)
+
+
+def _transcribe_chunk(job: Tuple[str, float, float]) -> List[Word]:
+    pcm_path, start, end = job
+    recognizer = vosk.KaldiRecognizer(_model, SAMPLE_RATE)
+    recognizer.SetWords(True)
+    first, last = int(start * SAMPLE_RATE) * 2, int(end * SAMPLE_RATE) * 2
+    results = []
+    with open(pcm_path, "rb", buffering=0) as f:
+        position = first
+        while position < last:
+            data = os.pread(f.fileno(), min(FEED_SAMPLES * 2, last - position), position)
+            if not data:
+                break
+            position += len(data)
+            if recognizer.AcceptWaveform(data):
+                results.append(recognizer.Result())
+    results.append(recognizer.FinalResult())
+    words = []
+    for result in results:
+        for item in json.loads(result).get("result", []):
+            words.append(
+                Word(item["word"], round(start + item["start"], 3), round(start + item["end"], 3), item["conf"])
+            )
+    return words
+
+
+class Transcriber:
+    """
+    Offline speech to text with a pool of processes, each holding the Vosk
+    model once. Recordings are transcribed in chunks cut at speech pauses,
+    the chunks in parallel, the words put back in order with their timing in
+    the recording.
+
+    A process pool cannot be started from a daemonic process, such as a
+    prefork Celery child, the worker running it has to use the solo pool.
+    """
+
+    def __init__(self, model_path: str, processes: int):
+        if vosk is None:
+            raise RuntimeError("The `vosk` library must be installed for speech to text.")
+        self.model_path = model_path
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(
+            processes, initializer=_load_model, initargs=(model_path,)
+        )
+
+    @property
+    def engine(self) -> str:
+        return "vosk:" + os.path.basename(os.path.normpath(self.model_path))
+
+    def transcribe(self, pcm_path: str, chunks: Sequence[Segment]) -> List[Word]:
+        """
+        Words of the mono s16le 16 kHz PCM file `pcm_path` within `chunks`.
+        """
+        jobs = [(pcm_path, start, end) for start, end in chunks]
+        words: List[Word] = []
+        for chunk_words in self.executor.map(_transcribe_chunk, jobs):
+            words.extend(chunk_words)
+        return words
+
+    def close(self) -> None:
+        self.executor.shutdown()
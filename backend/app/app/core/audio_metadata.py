@@ -0,0 +1,412 @@
+import os
+import struct
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Tuple
+
+from app.storage import StorageBackend
+
+# The headers of WAV, Ogg and WebM files are at the start, the last Ogg page,
+# which holds the duration, at the end. Nothing in between is kept.
+HEAD_SIZE = 256 * 1024
+TAIL_SIZE = 64 * 1024
+# An MP4 `moov` box can sit after the media data, it is kept wherever it is
+MAX_MOOV_SIZE = 16 * 1024 * 1024
+READ_SIZE = 256 * 1024
+
+WAV_CODECS = {
+    0x0006: "pcm_alaw",
+    0x0007: "pcm_mulaw",
+    0x0011: "adpcm_ima_wav",
+    0x0055: "mp3",
+}
+MP4_CODECS = {
+    b"mp4a": "aac",
+    b"Opus": "opus",
+    b"alac": "alac",
+    b"fLaC": "flac",
+    b".mp3": "mp3",
+    b"samr": "amr_nb",
+    b"sawb": "amr_wb",
+}
+WEBM_CODECS = {
+    "A_OPUS": "opus",
+    "A_VORBIS": "vorbis",
+    "A_FLAC": "flac",
+    "A_MPEG/L3": "mp3",
+    "A_PCM/INT/LIT": "pcm",
+    "A_PCM/FLOAT/IEEE": "pcm_float",
+}
+
+
+class AudioMetadata(NamedTuple):
+    duration: Optional[float]
+    sample_rate: Optional[int]
+    channels: Optional[int]
+    codec: Optional[str]
+    byte_size: int
+
+
+def _parse_wav(head: bytes, size: int) -> Dict[str, Any]:
+    if head[8:12] != b"WAVE":
+        return {}
+    info: Dict[str, Any] = {}
+    byte_rate = 0
+    pos = 12
+    while pos + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack("<4sI", head[pos : pos + 8])
+        body = pos + 8
+        if chunk_id == b"fmt " and len(head) >= body + 16:
+            tag, channels, rate, byte_rate, _, bits = struct.unpack(
+                "<HHIIHH", head[body : body + 16]
+            )
+            if tag == 0xFFFE and chunk_size >= 26 and len(head) >= body + 26:
+                # WAVE_FORMAT_EXTENSIBLE, the real tag starts the sub format
+                (tag,) = struct.unpack("<H", head[body + 24 : body + 26])
+            if tag == 1:
+                codec = "pcm_u8" if bits == 8 else f"pcm_s{bits}le"
+            elif tag == 3:
+                codec = f"pcm_f{bits}le"
+            else:
+                codec = WAV_CODECS.get(tag, f"wav_0x{tag:04x}")
+            info.update(sample_rate=rate, channels=channels, codec=codec)
+        elif chunk_id == b"data":
+            data_size = size - body
+            # recorders that stream the file leave the size at 0 or -1
+            if 0 < chunk_size < data_size:
+                data_size = chunk_size
+            if byte_rate:
+                info["duration"] = data_size / byte_rate
+            break
+        pos = body + chunk_size + (chunk_size & 1)
+    return info
+
+
+def _last_granule(tail: bytes) -> Optional[int]:
+    pos = len(tail)
+    while True:
+        pos = tail.rfind(b"OggS", 0, pos)
+        if pos < 0 or pos + 14 > len(tail):
+            return None
+        if tail[pos + 4] == 0:
+            (granule,) = struct.unpack("<q", tail[pos + 6 : pos + 14])
+            # -1 marks a page on which no packet ends
+            if granule >= 0:
+                return granule
+
+
+def _parse_ogg(head: bytes, tail: bytes) -> Dict[str, Any]:
+    segments = head[26]
+    packet = head[27 + segments :]
+    if packet.startswith(b"OpusHead"):
+        channels = packet[9]
+        pre_skip, rate = struct.unpack("<HI", packet[10:16])
+        info = {"codec": "opus", "channels": channels, "sample_rate": rate or 48000}
+        # Opus granule positions always count 48 kHz samples
+        granule_rate = 48000
+    elif packet.startswith(b"\x01vorbis"):
+        channels = packet[11]
+        (rate,) = struct.unpack("<I", packet[12:16])
+        info = {"codec": "vorbis", "channels": channels, "sample_rate": rate}
+        pre_skip, granule_rate = 0, rate
+    elif packet.startswith(b"\x7fFLAC"):
+        streaminfo = packet[17:]
+        rate = streaminfo[10] << 12 | streaminfo[11] << 4 | streaminfo[12] >> 4
+        channels = (streaminfo[12] >> 1 & 0x7) + 1
+        info = {"codec": "flac", "channels": channels, "sample_rate": rate}
+        pre_skip, granule_rate = 0, rate
+    else:
+        return {}
+    granule = _last_granule(tail)
+    if granule is not None and granule_rate:
+        info["duration"] = max(granule - pre_skip, 0) / granule_rate
+    return info
+
+
+def _mp4_boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            (size,) = struct.unpack(">Q", data[pos + 8 : pos + 16])
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _mp4_child(data: bytes, start: int, end: int, path: Tuple[bytes, ...]) -> Optional[Tuple[int, int]]:
+    for kind, body, box_end in _mp4_boxes(data, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return body, box_end
+            return _mp4_child(data, body, box_end, path[1:])
+    return None
+
+
+def _parse_mp4(moov: bytes) -> Dict[str, Any]:
+    root = _mp4_child(moov, 0, len(moov), (b"moov",))
+    if root is None:
+        return {}
+    for kind, body, end in _mp4_boxes(moov, *root):
+        if kind != b"trak":
+            continue
+        hdlr = _mp4_child(moov, body, end, (b"mdia", b"hdlr"))
+        if hdlr is None or moov[hdlr[0] + 8 : hdlr[0] + 12] != b"soun":
+            continue
+        info: Dict[str, Any] = {}
+        mdhd = _mp4_child(moov, body, end, (b"mdia", b"mdhd"))
+        timescale = 0
+        if mdhd is not None:
+            start = mdhd[0]
+            if moov[start] == 1:
+                timescale, duration = struct.unpack(">IQ", moov[start + 20 : start + 32])
+            else:
+                timescale, duration = struct.unpack(">II", moov[start + 12 : start + 20])
+            if timescale:
+                info["duration"] = duration / timescale
+        stsd = _mp4_child(moov, body, end, (b"mdia", b"minf", b"stbl", b"stsd"))
+        if stsd is not None:
+            entry = stsd[0] + 8
+            kind = moov[entry + 4 : entry + 8]
+            info["codec"] = MP4_CODECS.get(kind, kind.decode("latin-1").strip())
+            channels, rate = struct.unpack(">H6xI", moov[entry + 24 : entry + 36])
+            info["channels"] = channels
+            # the 16.16 rate of the sample entry cannot hold more than 65535 Hz,
+            # the media timescale of an audio track is its sample rate
+            info["sample_rate"] = (rate >> 16) or timescale or None
+        return info
+    return {}
+
+
+def _ebml_element(data: bytes, pos: int, end: int) -> Optional[Tuple[int, int, Optional[int]]]:
+    if pos >= end or not data[pos]:
+        return None
+    id_length = 9 - data[pos].bit_length()
+    if id_length > 4 or pos + id_length >= end or not data[pos + id_length]:
+        return None
+    element_id = int.from_bytes(data[pos : pos + id_length], "big")
+    pos += id_length
+    size_length = 9 - data[pos].bit_length()
+    if pos + size_length > end:
+        return None
+    mask = (1 << (7 * size_length)) - 1
+    size: Optional[int] = int.from_bytes(data[pos : pos + size_length], "big") & mask
+    if size == mask:
+        size = None  # unknown size, a live recording
+    return element_id, pos + size_length, size
+
+
+def _ebml_children(data: bytes, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+    pos = start
+    while True:
+        element = _ebml_element(data, pos, end)
+        if element is None:
+            return
+        element_id, body, size = element
+        body_end = end if size is None else min(body + size, end)
+        yield element_id, body, body_end
+        if size is None or body + size > end:
+            return
+        pos = body + size
+
+
+def _ebml_float(value: bytes) -> float:
+    return struct.unpack(">f" if len(value) == 4 else ">d", value)[0]
+
+
+def _parse_webm(head: bytes) -> Dict[str, Any]:
+    info: Dict[str, Any] = {}
+    for element_id, body, end in _ebml_children(head, 0, len(head)):
+        if element_id != 0x18538067:  # Segment
+            continue
+        timecode_scale = 1000000
+        duration = None
+        for child_id, child, child_end in _ebml_children(head, body, end):
+            if child_id == 0x1549A966:  # Info
+                for item_id, item, item_end in _ebml_children(head, child, child_end):
+                    if item_id == 0x2AD7B1:
+                        timecode_scale = int.from_bytes(head[item:item_end], "big")
+                    elif item_id == 0x4489:
+                        duration = _ebml_float(head[item:item_end])
+            elif child_id == 0x1654AE6B:  # Tracks
+                for entry_id, entry, entry_end in _ebml_children(head, child, child_end):
+                    if entry_id != 0xAE:
+                        continue
+                    track: Dict[str, Any] = {}
+                    for item_id, item, item_end in _ebml_children(head, entry, entry_end):
+                        value = head[item:item_end]
+                        if item_id == 0x83:
+                            track["type"] = int.from_bytes(value, "big")
+                        elif item_id == 0x86:
+                            codec_id = value.decode("ascii", "replace")
+                            track["codec"] = WEBM_CODECS.get(
+                                codec_id, "aac" if codec_id.startswith("A_AAC") else codec_id.lower()
+                            )
+                        elif item_id == 0xE1:  # Audio
+                            for audio_id, audio, audio_end in _ebml_children(head, item, item_end):
+                                if audio_id == 0xB5:
+                                    track["sample_rate"] = int(_ebml_float(head[audio:audio_end]))
+                                elif audio_id == 0x9F:
+                                    track["channels"] = int.from_bytes(head[audio:audio_end], "big")
+                    if track.pop("type", None) == 2 and "codec" not in info:
+                        info.update(track)
+            elif child_id == 0x1F43B675:  # Cluster, the media data
+                break
+        # MediaRecorder files have no duration, it is left unknown
+        if duration is not None:
+            info["duration"] = duration * timecode_scale / 1e9
+        break
+    return info
+
+
+class AudioProbe:
+    """
+    Extract the metadata of a recording from its bytes as they go by, so the
+    upload does not have to be read again.
+
+    Understands WAV (RIFF/RF64), Ogg (Opus, Vorbis, FLAC), MP4/M4A and
+    WebM/Matroska. Only the head and the tail of the stream are buffered, plus
+    the `moov` box of MP4 files. Anything it cannot read is reported as
+    unknown, a malformed header never fails an upload.
+    """
+
+    def __init__(self) -> None:
+        self.size = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+        # top level MP4 box walker
+        self._walking = True
+        self._box_pos = 0
+        self._box_header = bytearray()
+        self._moov: Optional[bytearray] = None
+        self._moov_remaining = 0
+
+    def feed(self, data: bytes) -> None:
+        offset = self.size
+        self.size += len(data)
+        if len(self._head) < HEAD_SIZE:
+            self._head += data[: HEAD_SIZE - len(self._head)]
+        if len(data) >= TAIL_SIZE:
+            self._tail = bytearray(data[-TAIL_SIZE:])
+        else:
+            self._tail += data
+            del self._tail[:-TAIL_SIZE]
+        if self._walking:
+            self._walk(data, offset)
+
+    def skip(self, count: int) -> None:
+        """
+        Account for `count` bytes that were not read, see `skippable`.
+        """
+        if count:
+            self.size += count
+            self._tail.clear()
+
+    def skippable(self, total: int) -> int:
+        """
+        Number of bytes from the current position, in a stream of `total`
+        bytes, that are not needed. Lets a reader that can seek skip them.
+        """
+        if len(self._head) < HEAD_SIZE or self._moov_remaining:
+            return 0
+        if self._walking:
+            return max(self._box_pos - self.size, 0)
+        return max(total - TAIL_SIZE - self.size, 0)
+
+    def _walk(self, data: bytes, offset: int) -> None:
+        i = 0
+        while i < len(data) and self._walking:
+            if self._moov_remaining:
+                chunk = data[i : i + self._moov_remaining]
+                self._moov += chunk  # type: ignore
+                self._moov_remaining -= len(chunk)
+                i += len(chunk)
+                if not self._moov_remaining:
+                    self._walking = False
+                continue
+            position = offset + i
+            if position < self._box_pos:
+                i += min(len(data) - i, self._box_pos - position)
+                continue
+            header = self._box_header
+            wanted = 16 if len(header) >= 8 and header[:4] == b"\0\0\0\1" else 8
+            chunk = data[i : i + wanted - len(header)]
+            header += chunk
+            i += len(chunk)
+            if len(header) < 8:
+                continue
+            size, kind = struct.unpack(">I4s", header[:8])
+            if size == 1:
+                if len(header) < 16:
+                    continue
+                (size,) = struct.unpack(">Q", header[8:16])
+            if (self._box_pos == 0 and kind != b"ftyp") or size < len(header):
+                # not an MP4 file, or a box running to the end of the file
+                self._walking = False
+                break
+            if kind == b"moov":
+                if size > MAX_MOOV_SIZE:
+                    self._walking = False
+                    break
+                self._moov = bytearray(header)
+                self._moov_remaining = size - len(header)
+            self._box_pos += size
+            self._box_header = bytearray()
+
+    def result(self) -> AudioMetadata:
+        head, tail = bytes(self._head), bytes(self._tail)
+        info: Dict[str, Any] = {}
+        try:
+            if head[:4] in (b"RIFF", b"RF64"):
+                info = _parse_wav(head, self.size)
+            elif head[:4] == b"OggS":
+                info = _parse_ogg(head, tail)
+            elif head[4:8] == b"ftyp":
+                if self._moov is not None and not self._moov_remaining:
+                    info = _parse_mp4(bytes(self._moov))
+            elif head[:4] == b"\x1a\x45\xdf\xa3":
+                info = _parse_webm(head)
+        except (struct.error, IndexError, ValueError):
+            info = {}
+        return AudioMetadata(
+            duration=info.get("duration"),
+            sample_rate=info.get("sample_rate") or None,
+            channels=info.get("channels") or None,
+            codec=info.get("codec"),
+            byte_size=self.size,
+        )
+
+
+def _probe(read: Callable[[int, int], bytes], size: int) -> AudioMetadata:
+    probe = AudioProbe()
+    while probe.size < size:
+        probe.skip(probe.skippable(size))
+        if probe.size >= size:
+            break
+        chunk = read(probe.size, min(READ_SIZE, size - probe.size))
+        if not chunk:
+            break
+        probe.feed(chunk)
+    return probe.result()
+
+
+def probe_file(path: str) -> AudioMetadata:
+    """
+    Metadata of a local file, reading only the parts that matter.
+    """
+    with open(path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        return _probe(lambda start, count: os.pread(fd, count, start), os.fstat(fd).st_size)
+
+
+def probe_object(storage: StorageBackend, key: str) -> AudioMetadata:
+    """
+    Same as `probe_file` for an object of the storage, with range reads.
+    """
+    size = storage.stat(key).size
+    return _probe(lambda start, count: storage.read_range(key, start, count), size)
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import uuid
+from typing import BinaryIO, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.storage import StorageBackend
+
+CHUNK_SIZE = 1024 * 1024
+# Requests asking for more ranges than this are answered with the whole file
+MAX_RANGES = 16
+# ASGI zero-copy send extension, lets the server use sendfile(2) on our fd
+ZEROCOPY_EXTENSION = "http.response.zerocopy"
+
+# (magic, offset of the magic, media type)
+AUDIO_SIGNATURES = [
+    (b"RIFF", 0, "audio/wav"),
+    (b"OggS", 0, "audio/ogg"),
+    (b"ftyp", 4, "audio/mp4"),
+    (b"\x1a\x45\xdf\xa3", 0, "audio/webm"),
+    (b"fLaC", 0, "audio/flac"),
+    (b"ID3", 0, "audio/mpeg"),
+    (b"\xff\xfb", 0, "audio/mpeg"),
+]
+
+
+def sniff_media_type(head: bytes) -> str:
+    for magic, offset, media_type in AUDIO_SIGNATURES:
+        if head[offset : offset + len(magic)] == magic:
+            return media_type
+    return "application/octet-stream"
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a `Range: bytes=...` header into sorted, coalesced, inclusive
+    (start, end) pairs.
+
+    Returns None when the header is malformed or asks for too many ranges, it
+    is then ignored, and an empty list when no range can be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def accel_redirect_uri(prefix: str, root: str, path: str) -> Optional[str]:
+    """
+    The X-Accel-Redirect location of `path` for the proxy location `prefix`
+    mapped on `root`. None when the file is not under `root`, as for voices
+    uploaded before the blob store that keep their absolute path: they are
+    served by the app.
+    """
+    root = os.path.realpath(root)
+    path = os.path.realpath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return prefix + os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    candidates = [c.strip() for c in header.split(",")]
+    weak = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(
+        (c[2:] if c.startswith("W/") else c) == weak for c in candidates
+    )
+
+
+class AudioFileResponse(Response):
+    """
+    Serve a stored recording with conditional and (multi) range request support.
+
+    For objects on the local filesystem the body is sent with the ASGI
+    zero-copy extension when the server offers it, so the kernel moves the
+    bytes with sendfile(2). Otherwise it is read in large ranges from the
+    storage in the threadpool. With `accel_redirect` the body is left to the
+    front proxy (nginx X-Accel-Redirect), which then does the range handling
+    and sendfile itself.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        key: str,
+        *,
+        request_headers: Headers,
+        etag: Optional[str] = None,
+        media_type: Optional[str] = None,
+        accel_redirect: Optional[str] = None,
+        method: str = "GET",
+    ) -> None:
+        stat_result = storage.stat(key)
+        self.storage = storage
+        self.key = key
+        self.size = stat_result.size
+        self.background = None
+        self.send_header_only = method.upper() == "HEAD"
+        if media_type is None:
+            head = storage.read_range(key, 0, min(12, self.size)) if self.size else b""
+            media_type = sniff_media_type(head)
+        self.media_type = media_type
+        self.accel_redirect = accel_redirect
+        self.boundary: Optional[str] = None
+        self.parts: List[Tuple[int, int]] = []
+        if etag is None:
+            etag_base = f"{stat_result.mtime}-{stat_result.size}"
+            etag = 'W/"%s"' % hashlib.md5(etag_base.encode()).hexdigest()
+        self.init_headers(
+            {
+                "accept-ranges": "bytes",
+                "etag": etag,
+                "cache-control": "private, no-cache",
+            }
+        )
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            self.status_code = 304
+            return
+        if accel_redirect is not None:
+            self.status_code = 200
+            self.headers["x-accel-redirect"] = accel_redirect
+            return
+
+        ranges = None
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and (if_range is None or if_range == etag):
+            ranges = parse_range(range_header, self.size)
+        if ranges is None:
+            self.status_code = 200
+            self.parts = [(0, self.size - 1)] if self.size else []
+            self.headers["content-length"] = str(self.size)
+        elif not ranges:
+            self.status_code = 416
+            self.headers["content-range"] = f"bytes */{self.size}"
+            self.headers["content-length"] = "0"
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self.parts = ranges
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.size}"
+            self.headers["content-length"] = str(end - start + 1)
+        else:
+            self.status_code = 206
+            self.parts = ranges
+            self.boundary = uuid.uuid4().hex
+            length = len(self._epilogue())
+            for start, end in ranges:
+                length += len(self._part_header(start, end)) + end - start + 1 + 2
+            self.headers["content-type"] = (
+                f"multipart/byteranges; boundary={self.boundary}"
+            )
+            self.headers["content-length"] = str(length)
+
+    def _part_header(self, start: int, end: int) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Type: {self.media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{self.size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _epilogue(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if self.send_header_only or not self.parts:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        path = self.storage.local_path(self.key)
+        if path is None:
+            await self._send_parts(send, None, zerocopy=False)
+        else:
+            zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+            with open(path, "rb", buffering=0) as file:
+                await self._send_parts(send, file, zerocopy=zerocopy)
+        tail = self._epilogue() if self.boundary is not None else b""
+        await send({"type": "http.response.body", "body": tail, "more_body": False})
+
+    def _read(self, file: Optional[BinaryIO], start: int, count: int) -> bytes:
+        if file is None:
+            return self.storage.read_range(self.key, start, count)
+        return os.pread(file.fileno(), count, start)
+
+    async def _send_parts(
+        self, send: Send, file: Optional[BinaryIO], zerocopy: bool
+    ) -> None:
+        for start, end in self.parts:
+            if self.boundary is not None:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": self._part_header(start, end),
+                        "more_body": True,
+                    }
+                )
+            if zerocopy:
+                await send(
+                    {
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": file,
+                        "offset": start,
+                        "count": end - start + 1,
+                        "more_body": True,
+                    }
+                )
+            else:
+                position = start
+                while position <= end:
+                    count = min(CHUNK_SIZE, end - position + 1)
+                    chunk = await run_in_threadpool(self._read, file, position, count)
+                    if not chunk:
+                        break
+                    position += len(chunk)
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            if self.boundary is not None:
+                await send(
+                    {"type": "http.response.body", "body": b"\r\n", "more_body": True}
+                )
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.storage import StorageBackend, StorageStat, StorageWriter, storage
+
+BLOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+# Objects computed from a blob, removed along with it
+DERIVED_NAMES = ("peaks.dat", "trimmed.ogg")
+
+
+class BlobStore:
+    """
+    Content addressed store for the voice recordings.
+
+    A blob is identified by the hex SHA-256 of its content and lives at
+    `<id[0:2]>/<id[2:4]>/<id>` in the storage backend. The two level fan-out
+    keeps every directory small (65536 leaf directories) well past millions of
+    blobs on a filesystem.
+
+    Reference counts are kept in the `blob` table, see `crud.blob`. Objects
+    computed from a blob (DERIVED_NAMES) live under `derived/` and go away
+    with it.
+    """
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+
+    def key(self, blob_id: str) -> str:
+        if not BLOB_ID_RE.match(blob_id):
+            # Voices uploaded before the blob store keep their absolute path
+            if os.path.isabs(blob_id):
+                return blob_id
+            raise ValueError(f"Invalid blob id {blob_id!r}")
+        return f"{blob_id[0:2]}/{blob_id[2:4]}/{blob_id}"
+
+    def derived_key(self, blob_id: str, name: str) -> str:
+        assert name in DERIVED_NAMES, name
+        if os.path.isabs(blob_id):
+            blob_id = "legacy-" + hashlib.sha256(blob_id.encode()).hexdigest()
+        elif not BLOB_ID_RE.match(blob_id):
+            raise ValueError(f"Invalid blob id {blob_id!r}")
+        return f"derived/{blob_id[-64:-62]}/{blob_id[-62:-60]}/{blob_id}/{name}"
+
+    def exists(self, blob_id: str) -> bool:
+        return self.storage.exists(self.key(blob_id))
+
+    def stat(self, blob_id: str) -> StorageStat:
+        return self.storage.stat(self.key(blob_id))
+
+    def local_path(self, blob_id: str) -> Optional[str]:
+        return self.storage.local_path(self.key(blob_id))
+
+    def open_writer(self) -> StorageWriter:
+        return self.storage.open_writer()
+
+    async def put(self, writer: StorageWriter) -> str:
+        """
+        Move the content of `writer` into the store. When the blob is already
+        present the written copy is dropped, duplicates cost no extra disk.
+
+        The caller must hold a reference on the blob (`crud.blob.acquire`)
+        before calling this, so a concurrent release cannot delete it.
+        """
+        blob_id = await writer.hexdigest()
+        key = self.key(blob_id)
+        if await run_in_threadpool(self.storage.exists, key):
+            await writer.abort()
+        else:
+            await writer.commit(key)
+        return blob_id
+
+    def put_file(self, src: str, blob_id: str) -> None:
+        """
+        Same as `put` for a complete local file whose hash has been computed by
+        the caller, `src` is consumed.
+        """
+        key = self.key(blob_id)
+        if self.storage.exists(key):
+            os.remove(src)
+        else:
+            self.storage.put_file(src, key)
+
+    @contextmanager
+    def open_local(self, blob_id: str) -> Iterator[str]:
+        """
+        Path of the blob on the local filesystem, downloaded to a temporary
+        file for the duration of the block when the storage is remote.
+        """
+        key = self.key(blob_id)
+        path = self.storage.local_path(key)
+        if path is not None:
+            yield path
+            return
+        with tempfile.NamedTemporaryFile(prefix="blob-") as f:
+            for chunk in self.storage.get(key):
+                f.write(chunk)
+            f.flush()
+            yield f.name
+
+    def delete(self, blob_id: str) -> None:
+        self.storage.delete(self.key(blob_id))
+        for name in DERIVED_NAMES:
+            self.storage.delete(self.derived_key(blob_id, name))
+
+
+blobstore = BlobStore(storage)
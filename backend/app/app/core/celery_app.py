@@ -2,4 +2,24 @@ from celery import Celery
 
 celery_app = Celery("worker", broker="amqp://guest@queue//")
 
-celery_app.conf.task_routes = {"app.worker.test_celery": "main-queue"}
+celery_app.conf.task_routes = {
+    "app.worker.test_celery": "main-queue",
+    "app.worker.cleanup_voice_uploads": "main-queue",
+    "app.worker.cleanup_refresh_tokens": "main-queue",
+    # CPU bound, give it its own workers so it does not delay the other tasks
+    "app.worker.process_voice": "audio-queue",
+    # consumed by a solo pool worker that runs its own process pool
+    "app.worker.transcribe_voice": "asr-queue",
+}
+
+# Sent by the celerybeat service of docker-compose.yml
+celery_app.conf.beat_schedule = {
+    "cleanup-voice-uploads": {
+        "task": "app.worker.cleanup_voice_uploads",
+        "schedule": 60 * 60,
+    },
+    "cleanup-refresh-tokens": {
+        "task": "app.worker.cleanup_refresh_tokens",
+        "schedule": 24 * 60 * 60,
+    },
+}
@@ -7,8 +7,11 @@ from pydantic import AnyHttpUrl, BaseSettings, EmailStr, HttpUrl, PostgresDsn, v
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = secrets.token_urlsafe(32)
-    # 60 minutes * 24 hours * 8 days = 8 days
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    # Access tokens carry the role and flags of the user, a change to them
+    # (or a revoked session) reaches the API once the token expires
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    # Refresh tokens rotate on every use, a session lasts this long unused
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 8
     SERVER_NAME: str
     SERVER_HOST: AnyHttpUrl
     # BACKEND_CORS_ORIGINS is a JSON-formatted list of origins
@@ -51,6 +54,56 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
 
+    # The same database through asyncpg, for the async endpoints
+    ASYNC_SQLALCHEMY_DATABASE_URI: Optional[str] = None
+
+    @validator("ASYNC_SQLALCHEMY_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        uri = values.get("SQLALCHEMY_DATABASE_URI")
+        if not uri:
+            # SQLALCHEMY_DATABASE_URI failed its own validation
+            raise ValueError("ASYNC_SQLALCHEMY_DATABASE_URI needs a valid SQLALCHEMY_DATABASE_URI")
+        return "postgresql+asyncpg://" + str(uri).split("://", 1)[1]
+
+    # Connection pool of each engine (sync and async) in each worker process,
+    # workers x 2 x (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below the
+    # server's max_connections. Checkouts wait up to DB_POOL_TIMEOUT seconds
+    # for a connection, connections are replaced after DB_POOL_RECYCLE
+    # seconds, the most recently used is handed out first (LIFO) so the idle
+    # ones beyond the pool size can time out on the server side
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_USE_LIFO: bool = True
+    DB_CONNECT_TIMEOUT: int = 10
+    # Behind PgBouncer in transaction mode: no statement caches on the
+    # connections (asyncpg still needs PgBouncer >= 1.21 with
+    # max_prepared_statements) and no LISTEN, the care team relationships of
+    # the other processes are then only reloaded every ACCESS_GRAPH_TTL
+    DB_PGBOUNCER: bool = False
+
+    # Read replicas of the database, e.g. '["postgresql://app:pw@replica1/app"]'.
+    # GET requests read from one that is at most REPLICA_MAX_LAG seconds
+    # behind (measured every REPLICA_LAG_INTERVAL), a caller's reads go to the
+    # primary for READ_YOUR_WRITES seconds after each of its writes
+    SQLALCHEMY_REPLICA_URIS: List[str] = []
+    ASYNC_SQLALCHEMY_REPLICA_URIS: List[str] = []
+    REPLICA_MAX_LAG: float = 5
+    REPLICA_LAG_INTERVAL: float = 1
+    READ_YOUR_WRITES: int = 10
+
+    @validator("ASYNC_SQLALCHEMY_REPLICA_URIS", pre=True)
+    def assemble_async_replica_connections(cls, v: Any, values: Dict[str, Any]) -> Any:
+        if v:
+            return v
+        return [
+            "postgresql+asyncpg://" + uri.split("://", 1)[1]
+            for uri in values.get("SQLALCHEMY_REPLICA_URIS") or []
+        ]
+
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = None
     SMTP_HOST: Optional[str] = None
@@ -82,6 +135,89 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER_PASSWORD: str
     USERS_OPEN_REGISTRATION: bool = False
 
+    # Voice and note listings are paginated, see app.core.pagination
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+    # Seconds after which the care team relationships held by each process
+    # are reloaded, changes are otherwise pushed to them as they happen
+    ACCESS_GRAPH_TTL: int = 300
+    # Seconds the id, role and flags of an authenticated user are cached,
+    # shared by all the processes when a Redis URL is set
+    PRINCIPAL_CACHE_TTL: int = 60
+    PRINCIPAL_CACHE_REDIS_URL: Optional[str] = None
+    # bcrypt cost, hashes made with another cost are replaced on login
+    BCRYPT_ROUNDS: int = 12
+    # Passwords are hashed in their own processes, 0 hashes in the request
+    # thread. Beyond PASSWORD_HASH_MAX_PENDING running or queued hashes,
+    # logins are answered 503 until the burst drains
+    PASSWORD_HASH_PROCESSES: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    # Where the voice recordings are stored, "local" (VOICE_STORAGE_DIR) or
+    # "s3" (any S3 compatible service, e.g. MinIO with S3_ENDPOINT_URL)
+    STORAGE_BACKEND: str = "local"
+    VOICE_STORAGE_DIR: str = "/app/storage"
+    S3_BUCKET: Optional[str] = None
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 4
+
+    @validator("S3_BUCKET", always=True)
+    def s3_bucket_required(cls, v: Optional[str], values: Dict[str, Any]) -> Optional[str]:
+        if values.get("STORAGE_BACKEND") == "s3" and not v:
+            raise ValueError("S3_BUCKET is required with the s3 storage backend")
+        return v
+
+    # Partial resumable uploads, with several API nodes this has to be a shared
+    # volume. With the local backend it must be on the storage filesystem.
+    VOICE_UPLOAD_DIR: str = "/app/storage/uploads"
+    VOICE_UPLOAD_EXPIRE_HOURS: int = 48
+    # Seconds an assistant holds a voice claimed from the work queue unless it
+    # renews the lease
+    QUEUE_LEASE_SECONDS: int = 600
+    # Turnaround promised from the recording to its note, in hours per urgency
+    # (app.core.scheduler.Urgency)
+    VOICE_SLA_HOURS: Dict[str, float] = {"routine": 72.0, "urgent": 24.0, "stat": 4.0}
+    # Expected assistant work on a voice: seconds per second of audio plus a
+    # fixed part, with QUEUE_DEFAULT_DURATION seconds of audio when unknown
+    QUEUE_WORK_PER_AUDIO_SECOND: float = 3.0
+    QUEUE_WORK_OVERHEAD_SECONDS: float = 120.0
+    QUEUE_DEFAULT_DURATION: float = 180.0
+
+    @validator("VOICE_SLA_HOURS")
+    def sla_for_each_urgency(cls, v: Dict[str, float]) -> Dict[str, float]:
+        missing = {"routine", "urgent", "stat"} - set(v)
+        if missing:
+            raise ValueError(f"VOICE_SLA_HOURS has no value for {', '.join(sorted(missing))}")
+        return v
+
+    # When set, audio is served by the front proxy through X-Accel-Redirect
+    # to this internal location mapped on VOICE_STORAGE_DIR, e.g. "/storage/"
+    VOICE_ACCEL_REDIRECT_PREFIX: Optional[str] = None
+
+    # Recordings are transcoded to Opus/Ogg by the worker after the upload
+    VOICE_TRANSCODE_ENABLED: bool = True
+    VOICE_OPUS_BITRATE: str = "24k"
+    VOICE_TRANSCODE_TIMEOUT: int = 15 * 60
+    FFMPEG_BINARY: str = "ffmpeg"
+    FFPROBE_BINARY: str = "ffprobe"
+    # Waveform peaks, levels are samples per pixel at VOICE_PEAKS_SAMPLE_RATE,
+    # each a multiple of the first
+    VOICE_PEAKS_SAMPLE_RATE: int = 8000
+    VOICE_PEAKS_LEVELS: List[int] = [64, 256, 1024, 4096]
+    # Voice activity detection, and whether to store a copy of the recording
+    # without its silences
+    VOICE_VAD_SAMPLE_RATE: int = 16000
+    VOICE_VAD_TRIM: bool = False
+    # Offline speech to text (Vosk), off while no model directory is set
+    ASR_MODEL_PATH: Optional[str] = None
+    ASR_PROCESSES: int = 2
+    ASR_MAX_CHUNK_SECONDS: float = 30.0
+
     class Config:
         case_sensitive = True
 
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterator, Sequence
+
+from sqlalchemy import Table, select
+from sqlalchemy.orm import Session
+
+# Rows fetched from the server side cursor at once
+BATCH_SIZE = 2000
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_ndjson(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> bytes:
+    lines = [
+        json.dumps({c: _value(v) for c, v in zip(columns, row)}, separators=(",", ":"))
+        for row in rows
+    ]
+    return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+def encode_csv(rows: Sequence[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_value(v) for v in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def export_table(
+    db: Session, table: Table, format: ExportFormat, batch_size: int = BATCH_SIZE
+) -> Iterator[bytes]:
+    """
+    Every row of `table`, by id, encoded batch by batch.
+
+    The rows are read as plain tuples through a server side cursor (a named
+    cursor with psycopg2), so neither the result nor ORM objects are ever
+    held in memory whatever the size of the table.
+    """
+    columns = [column.name for column in table.columns]
+    if format == ExportFormat.csv:
+        yield encode_csv([columns])
+    result = db.execute(
+        select([table]).order_by(table.c.id).execution_options(stream_results=True)
+    )
+    try:
+        for rows in iter(lambda: result.fetchmany(batch_size), []):
+            if format == ExportFormat.csv:
+                yield encode_csv(rows)
+            else:
+                yield encode_ndjson(columns, rows)
+    finally:
+        result.close()
@@ -0,0 +1,231 @@
+import hashlib
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect, Request
+
+from app.core.audio_metadata import AudioMetadata, AudioProbe
+from app.storage import StorageWriter
+from app.storage.local import WRITE_BUFFER_SIZE
+
+try:
+    from multipart.multipart import parse_options_header
+    import multipart
+except ImportError:  # pragma: nocover
+    parse_options_header = None
+    multipart = None
+
+# Upper bound for a plain (non file) form field, they only carry ids and text.
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class IngestError(Exception):
+    pass
+
+
+def hash_file(path: str, probe: Optional[AudioProbe] = None) -> str:
+    """
+    SHA-256 of the file, `probe` sees the content in the same pass.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        for block in iter(lambda: f.read(WRITE_BUFFER_SIZE), b""):
+            sha256.update(block)
+            if probe is not None:
+                probe.feed(block)
+    return sha256.hexdigest()
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+async def append_stream(
+    request: Request, path: str, offset: int, limit: int
+) -> Tuple[int, bool]:
+    """
+    Write the request body into the file at `path`, starting at `offset`.
+
+    At most `limit` bytes are written. When the client goes away mid-request
+    the bytes received so far are kept, so the upload can resume from there.
+    Returns the number of bytes written and whether the body was larger than
+    `limit`.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    buffer = bytearray()
+    written = 0
+    overflow = False
+    try:
+        try:
+            async for chunk in request.stream():
+                room = limit - written - len(buffer)
+                if len(chunk) > room:
+                    buffer += chunk[:room]
+                    overflow = True
+                    break
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    data = bytes(buffer)
+                    buffer.clear()
+                    await run_in_threadpool(_pwrite_all, fd, data, offset + written)
+                    written += len(data)
+        except ClientDisconnect:
+            pass
+        if buffer:
+            await run_in_threadpool(_pwrite_all, fd, bytes(buffer), offset + written)
+            written += len(buffer)
+        await run_in_threadpool(os.fsync, fd)
+    finally:
+        os.close(fd)
+    return written, overflow
+
+
+class IngestedForm:
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        filename: Optional[str],
+        content_type: Optional[str],
+        file: Optional[StorageWriter],
+        metadata: Optional[AudioMetadata] = None,
+    ):
+        self.fields = fields
+        self.filename = filename
+        self.content_type = content_type
+        self.file = file
+        self.metadata = metadata
+
+    async def abort(self) -> None:
+        if self.file is not None:
+            await self.file.abort()
+
+
+def _decode(src: bytes, charset: str) -> str:
+    try:
+        return src.decode(charset)
+    except (UnicodeDecodeError, LookupError):
+        return src.decode("latin-1")
+
+
+class StreamingFormParser:
+    """
+    multipart/form-data parser that streams the single file part of the request
+    straight into the storage instead of spooling it to a temporary file first.
+
+    Plain fields are kept in memory, `file_field` is written through a
+    `StorageWriter` from `open_writer` that the caller commits or aborts.
+    With `probe_audio` the audio metadata of the file is read on the way.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        open_writer: Callable[[], StorageWriter],
+        file_field: str,
+        probe_audio: bool = False,
+    ):
+        assert (
+            multipart is not None
+        ), "The `python-multipart` library must be installed to use form parsing."
+        self.request = request
+        self.open_writer = open_writer
+        self.file_field = file_field
+        self.probe_audio = probe_audio
+        self._events: List[Tuple[str, bytes]] = []
+
+    def _on(self, event: str):  # type: ignore
+        def callback(data: bytes = b"", start: int = 0, end: int = 0) -> None:
+            self._events.append((event, data[start:end]))
+
+        return callback
+
+    async def parse(self) -> IngestedForm:
+        content_type, params = parse_options_header(
+            self.request.headers.get("Content-Type", "")
+        )
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise IngestError("Expected a multipart/form-data body")
+        charset = params.get(b"charset", b"utf-8").decode("latin-1")
+        callbacks = {
+            "on_" + name: self._on(name)
+            for name in (
+                "part_begin",
+                "part_data",
+                "part_end",
+                "header_field",
+                "header_value",
+                "header_end",
+                "headers_finished",
+            )
+        }
+        parser = multipart.MultipartParser(params[b"boundary"], callbacks)
+
+        fields: Dict[str, str] = {}
+        writer: Optional[StorageWriter] = None
+        probe: Optional[AudioProbe] = None
+        filename = part_type = None
+        header_field = header_value = b""
+        disposition = b""
+        part_content_type = b""
+        field_name = ""
+        data = bytearray()
+        in_file = False
+        try:
+            async for chunk in self.request.stream():
+                parser.write(chunk)
+                events, self._events = self._events, []
+                for event, payload in events:
+                    if event == "part_begin":
+                        disposition = part_content_type = b""
+                        data = bytearray()
+                        in_file = False
+                    elif event == "header_field":
+                        header_field += payload
+                    elif event == "header_value":
+                        header_value += payload
+                    elif event == "header_end":
+                        name = header_field.lower()
+                        if name == b"content-disposition":
+                            disposition = header_value
+                        elif name == b"content-type":
+                            part_content_type = header_value
+                        header_field = header_value = b""
+                    elif event == "headers_finished":
+                        _, options = parse_options_header(disposition)
+                        field_name = _decode(options.get(b"name", b""), charset)
+                        if b"filename" in options:
+                            if field_name != self.file_field or writer is not None:
+                                raise IngestError(
+                                    f"Unexpected file field {field_name!r}"
+                                )
+                            filename = os.path.basename(
+                                _decode(options[b"filename"], charset)
+                            )
+                            part_type = part_content_type.decode("latin-1")
+                            writer = self.open_writer()
+                            if self.probe_audio:
+                                probe = AudioProbe()
+                            in_file = True
+                    elif event == "part_data":
+                        if in_file:
+                            await writer.write(payload)  # type: ignore
+                            if probe is not None:
+                                probe.feed(payload)
+                        else:
+                            data += payload
+                            if len(data) > MAX_FIELD_SIZE:
+                                raise IngestError(f"Field {field_name!r} too large")
+                    elif event == "part_end" and not in_file:
+                        fields[field_name] = _decode(bytes(data), charset)
+            parser.finalize()
+        except BaseException:
+            if writer is not None:
+                await writer.abort()
+            raise
+        metadata = probe.result() if probe is not None else None
+        return IngestedForm(fields, filename, part_type, writer, metadata)
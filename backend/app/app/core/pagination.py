@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import Select
+
+# Position after which a page starts: (date_creation, id) of the last row of
+# the previous page
+Position = Tuple[datetime, int]
+
+
+class Page(NamedTuple):
+    limit: int
+    after: Optional[Position] = None
+
+
+def encode_cursor(position: Position) -> str:
+    date_creation, id = position
+    raw = json.dumps([date_creation.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Position:
+    """
+    Inverse of `encode_cursor`, raises ValueError on anything it did not make.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date_creation, id = json.loads(raw)
+        position = (datetime.fromisoformat(date_creation), id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if type(position[1]) is not int:
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def keyset(query: Any, model: Any, page: Page) -> Any:
+    """
+    Restrict `query`, a Query or a select(), to the rows of the page and the
+    first row of the next one.
+    """
+    if page.after is not None:
+        query = query.filter(tuple_(model.date_creation, model.id) < tuple_(*page.after))
+    return query.order_by(model.date_creation.desc(), model.id.desc()).limit(page.limit + 1)
+
+
+def split_page(rows: List[Any], page: Page) -> Tuple[List[Any], Optional[str]]:
+    """
+    The rows of the page, out of what `keyset` selected, and the cursor of
+    the next page (None on the last one).
+    """
+    if len(rows) <= page.limit:
+        return rows, None
+    last = rows[page.limit - 1]
+    return rows[: page.limit], encode_cursor((last.date_creation, last.id))
+
+
+def paginate(query: Query, model: Any, page: Page) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of `query`, newest first, and the cursor of the next page (None
+    on the last one).
+
+    Rows are ordered by (date_creation, id), unique, so the order is stable
+    and the next page starts strictly after the last row seen: no row is
+    skipped or repeated when rows are added meanwhile, and with an index on
+    the filter columns followed by (date_creation, id) a page costs the same
+    however deep it is, unlike an OFFSET.
+    """
+    return split_page(keyset(query, model, page).all(), page)
+
+
+async def paginate_async(
+    db: AsyncSession, stmt: Select, model: Any, page: Page
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    `paginate` for a select() of `model` run on an AsyncSession.
+    """
+    result = await db.execute(keyset(stmt, model, page))
+    return split_page(result.scalars().all(), page)
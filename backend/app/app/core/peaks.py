@@ -0,0 +1,116 @@
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.storage import StorageBackend
+
+# audiowaveform .dat version 1 header, as read by peaks.js:
+# version, flags (1 = 8 bit), sample rate, samples per pixel, length in pixels
+DAT_HEADER = struct.Struct("<iIiiI")
+DAT_VERSION = 1
+DAT_FLAG_8BIT = 1
+
+
+def _reduce(
+    mins: np.ndarray, maxs: np.ndarray, factor: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    pad = -len(mins) % factor
+    if pad:
+        mins = np.concatenate([mins, np.full(pad, np.iinfo(np.int16).max, np.int16)])
+        maxs = np.concatenate([maxs, np.full(pad, np.iinfo(np.int16).min, np.int16)])
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def encode_dat(
+    mins: np.ndarray, maxs: np.ndarray, sample_rate: int, samples_per_pixel: int
+) -> bytes:
+    """
+    One zoom level in the audiowaveform 8 bit format, 16 bit peaks are scaled
+    down the same way audiowaveform does.
+    """
+    pairs = np.empty(2 * len(mins), dtype=np.int8)
+    pairs[0::2] = mins >> 8
+    pairs[1::2] = maxs >> 8
+    header = DAT_HEADER.pack(
+        DAT_VERSION, DAT_FLAG_8BIT, sample_rate, samples_per_pixel, len(mins)
+    )
+    return header + pairs.tobytes()
+
+
+class PeaksBuilder:
+    """
+    Min/max waveform peaks of a PCM stream at several zoom levels.
+
+    The stream (mono s16le) is folded into the finest level block by block, the
+    coarser levels are computed from it, so memory is bounded by the size of
+    the finest level. `levels` are samples per pixel, ascending, each a
+    multiple of the first.
+    """
+
+    def __init__(self, sample_rate: int, levels: List[int]):
+        if not levels or any(level % levels[0] for level in levels):
+            raise ValueError("Peak levels must be multiples of the finest one")
+        self.sample_rate = sample_rate
+        self.levels = sorted(levels)
+        self._pending = b""
+        self._rest = np.empty(0, dtype=np.int16)
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+
+    def feed(self, pcm: bytes) -> None:
+        data = self._pending + pcm
+        cut = len(data) & ~1
+        self._pending = data[cut:]
+        samples = np.frombuffer(data[:cut], dtype="<i2")
+        if len(self._rest):
+            samples = np.concatenate([self._rest, samples])
+        finest = self.levels[0]
+        full = len(samples) - len(samples) % finest
+        blocks = samples[:full].reshape(-1, finest)
+        self._mins.append(blocks.min(axis=1))
+        self._maxs.append(blocks.max(axis=1))
+        self._rest = samples[full:].copy()
+
+    def finish(self) -> bytes:
+        """
+        All levels, finest first, as concatenated .dat documents.
+        """
+        if len(self._rest):
+            self._mins.append(self._rest.min(keepdims=True))
+            self._maxs.append(self._rest.max(keepdims=True))
+            self._rest = np.empty(0, dtype=np.int16)
+        mins = np.concatenate(self._mins) if self._mins else np.empty(0, np.int16)
+        maxs = np.concatenate(self._maxs) if self._maxs else np.empty(0, np.int16)
+        out = []
+        for level in self.levels:
+            level_mins, level_maxs = _reduce(mins, maxs, level // self.levels[0])
+            out.append(encode_dat(level_mins, level_maxs, self.sample_rate, level))
+        return b"".join(out)
+
+
+def read_level(
+    storage: StorageBackend, key: str, samples_per_pixel: Optional[int] = None
+) -> Tuple[bytes, int, List[int]]:
+    """
+    The stored level with the smallest samples per pixel at least
+    `samples_per_pixel`, or the coarsest one, as a .dat document. Only the
+    headers of the other levels are read.
+    Returns the document, its level and all the available levels.
+    """
+    size = storage.stat(key).size
+    pos = 0
+    found: List[Tuple[int, int, int]] = []
+    while pos + DAT_HEADER.size <= size:
+        header = storage.read_range(key, pos, DAT_HEADER.size)
+        _, _, _, level, length = DAT_HEADER.unpack(header)
+        end = pos + DAT_HEADER.size + 2 * length
+        found.append((level, pos, end))
+        pos = end
+    if not found:
+        raise FileNotFoundError(key)
+    chosen = found[-1]
+    if samples_per_pixel is not None:
+        chosen = next((f for f in found if f[0] >= samples_per_pixel), chosen)
+    level, start, end = chosen
+    return storage.read_range(key, start, end - start), level, [f[0] for f in found]
@@ -0,0 +1,154 @@
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+try:
+    import redis
+except ImportError:  # pragma: nocover
+    redis = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class Principal(NamedTuple):
+    """
+    The parts of a user that authorization needs and that do not change on
+    their own, what get_current_principal hands to most endpoints instead of
+    the User row.
+    """
+
+    id: int
+    role: Optional[str]
+    is_active: bool
+    is_superuser: bool
+    relationship_version: int = 0
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Principal":
+        return cls(
+            user.id,
+            user.role,
+            bool(user.is_active),
+            bool(user.is_superuser),
+            user.relationship_version or 0,
+        )
+
+
+class PrincipalCache(ABC):
+    """
+    Async code uses get_async and set_async, which the caches doing I/O run
+    off the event loop.
+    """
+
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[Principal]:
+        ...
+
+    @abstractmethod
+    def set(self, principal: Principal) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate(self, user_id: int) -> None:
+        ...
+
+    async def get_async(self, user_id: int) -> Optional[Principal]:
+        return self.get(user_id)
+
+    async def set_async(self, principal: Principal) -> None:
+        self.set(principal)
+
+
+class LocalPrincipalCache(PrincipalCache):
+    """
+    Per process, least recently used entries go first beyond `max_size`.
+    An invalidation only reaches the process that makes it, the others see
+    the change once their entry expires.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[float, Principal]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, principal: Principal) -> None:
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class RedisPrincipalCache(PrincipalCache):
+    """
+    Shared by all the processes through Redis (or anything speaking its
+    protocol), an invalidation is seen by all of them at once. Redis being
+    unavailable is a cache miss, never an authentication failure.
+    """
+
+    def __init__(self, url: str, ttl: int, prefix: str = "principal:"):
+        if redis is None:
+            raise RuntimeError("The `redis` library must be installed for PRINCIPAL_CACHE_REDIS_URL.")
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        try:
+            data = self.client.get(f"{self.prefix}{user_id}")
+        except redis.RedisError:
+            logger.warning("Principal cache unavailable", exc_info=True)
+            return None
+        return Principal(*json.loads(data)) if data is not None else None
+
+    def set(self, principal: Principal) -> None:
+        try:
+            self.client.set(f"{self.prefix}{principal.id}", json.dumps(principal), ex=self.ttl)
+        except redis.RedisError:
+            logger.warning("Principal cache unavailable", exc_info=True)
+
+    def invalidate(self, user_id: int) -> None:
+        # unlike a miss, a lost invalidation would keep a stale entry: raise
+        self.client.delete(f"{self.prefix}{user_id}")
+
+    # the client blocks, up to its socket timeout when Redis is down
+
+    async def get_async(self, user_id: int) -> Optional[Principal]:
+        return await run_in_threadpool(self.get, user_id)
+
+    async def set_async(self, principal: Principal) -> None:
+        await run_in_threadpool(self.set, principal)
+
+
+def get_principal_cache() -> PrincipalCache:
+    if settings.PRINCIPAL_CACHE_REDIS_URL:
+        return RedisPrincipalCache(settings.PRINCIPAL_CACHE_REDIS_URL, settings.PRINCIPAL_CACHE_TTL)
+    return LocalPrincipalCache(settings.PRINCIPAL_CACHE_TTL)
+
+
+principal_cache = get_principal_cache()
@@ -0,0 +1,106 @@
+import heapq
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+
+class Urgency(str, Enum):
+    """
+    Set by the doctor on a voice, how soon its note is due, see
+    VOICE_SLA_HOURS.
+    """
+
+    routine = "routine"
+    urgent = "urgent"
+    stat = "stat"
+
+
+def work_seconds(duration: Optional[float]) -> float:
+    """
+    Expected time for an assistant to write the note of a recording of
+    `duration` seconds.
+    """
+    if duration is None:
+        duration = settings.QUEUE_DEFAULT_DURATION
+    return settings.QUEUE_WORK_PER_AUDIO_SECOND * duration + settings.QUEUE_WORK_OVERHEAD_SECONDS
+
+
+def schedule(voice: Any) -> None:
+    """
+    Set the due time of the voice from its urgency, and the time its work
+    has to start by to be done then: the queue order.
+
+    Ordering on `start_by` weighs the three at once. The urgency sets how
+    far the deadline is, the age is in it as both count from date_creation,
+    and longer recordings start earlier by their expected work. Unlike a
+    score it does not change as time passes, so it is a plain column with
+    an index, see Voice.__table_args__.
+    """
+    if voice.urgency is None:
+        voice.urgency = Urgency.routine.value
+    urgency = Urgency(voice.urgency)
+    voice.due_at = voice.date_creation + timedelta(hours=settings.VOICE_SLA_HOURS[urgency.value])
+    voice.start_by = start_by(voice.due_at, voice.duration)
+
+
+def start_by(due_at: Any, duration: Optional[float]) -> Any:
+    """
+    When the work on a recording of `duration` seconds due at `due_at` has
+    to start, `due_at` may be the column in an UPDATE.
+    """
+    return due_at - timedelta(seconds=work_seconds(duration))
+
+
+class Forecast(NamedTuple):
+    voice_id: int
+    # who is expected to do it, None while the team has no assistant
+    assistant_id: Optional[int]
+    start: Optional[datetime]
+    completion: Optional[datetime]
+    due_at: datetime
+
+    @property
+    def late(self) -> bool:
+        return self.completion is not None and self.completion > self.due_at
+
+
+def forecast(voices: Sequence[Any], assistant_ids: Sequence[int], now: datetime) -> List[Forecast]:
+    """
+    When the notes of `voices`, pending and in queue order, should be done
+    by the assistants of the team.
+
+    The voices an assistant holds a lease on are finished first, from when
+    they were claimed. Then, as each claim takes the next voice of the
+    queue, every other voice goes to the assistant who is free the
+    soonest, so the work spreads by the current load of each assistant.
+    """
+    team = set(assistant_ids)
+    busy_until: Dict[int, datetime] = {}
+    held: Dict[int, Forecast] = {}
+    for voice in voices:
+        assistant_id = voice.claimed_by
+        if assistant_id not in team or voice.lease_expires_at is None or voice.lease_expires_at < now:
+            continue
+        start = busy_until.get(assistant_id, voice.claimed_at or now)
+        # work taking longer than expected is assumed to end now
+        completion = max(start + timedelta(seconds=work_seconds(voice.duration)), now)
+        busy_until[assistant_id] = completion
+        held[voice.id] = Forecast(voice.id, assistant_id, start, completion, voice.due_at)
+
+    heap: List[Tuple[datetime, int]] = [(busy_until.get(id, now), id) for id in assistant_ids]
+    heapq.heapify(heap)
+    forecasts: List[Forecast] = []
+    for voice in voices:
+        if voice.id in held:
+            forecasts.append(held[voice.id])
+            continue
+        if not heap:
+            forecasts.append(Forecast(voice.id, None, None, None, voice.due_at))
+            continue
+        start, assistant_id = heapq.heappop(heap)
+        completion = start + timedelta(seconds=work_seconds(voice.duration))
+        heapq.heappush(heap, (completion, assistant_id))
+        forecasts.append(Forecast(voice.id, assistant_id, start, completion, voice.due_at))
+    return forecasts
@@ -1,34 +1,238 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 
 from jose import jwt
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
+from app.core.principal_cache import Principal
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# min and max rounds pinned to the configured cost, so a hash made with any
+# other cost is flagged by verify_and_update and replaced on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 
 ALGORITHM = "HS256"
 
 
 def create_access_token(
-    subject: Union[str, Any], expires_delta: timedelta = None
+    subject: Union[str, Any],
+    expires_delta: timedelta = None,
+    claims: Optional[Dict[str, Any]] = None,
 ) -> str:
+    """
+    `claims` are added to the token, see principal_claims.
+    """
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {"exp": expire, "sub": str(subject), **(claims or {})}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def principal_claims(principal: Principal) -> Dict[str, Any]:
+    """
+    What get_current_principal needs to authorize a request without reading
+    the user: role, super user flag, and the relationship version it
+    checks against the principal cache. Only active users are given
+    tokens, a deactivation takes effect when the access token expires or
+    the care team of the user changes.
+    """
+    return {
+        "role": principal.role,
+        "su": principal.is_superuser,
+        "rv": principal.relationship_version,
+    }
+
+
+def generate_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> str:
+    # the token is random and long, a plain digest is enough to store it
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _lower_priority() -> None:
+    # on a busy host the requests of the API process go before the hashes
+    os.nice(10)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHashingBusy(Exception):
+    """
+    More hashes are waiting than PASSWORD_HASH_MAX_PENDING, answered 503.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt (about 250 ms of CPU per call) in a pool of `processes`
+    worker processes, so a burst of logins takes neither the GIL of the API
+    process nor, awaited through verify_and_update_async, its request
+    threads. At most `max_pending` hashes
+    are running or queued, further calls raise PasswordHashingBusy at once
+    rather than piling up. With no processes the hashes run in the caller.
+    """
+
+    def __init__(self, processes: int, max_pending: int):
+        self.processes = processes
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.seconds = 0.0
+
+    def start(self) -> None:
+        """
+        Start the worker processes now rather than on the first logins.
+        """
+        with self._lock:
+            executor = self._ensure_executor()
+        for future in [executor.submit(os.getpid) for _ in range(self.processes)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawned, not forked: the API process has threads and connections
+            self._executor = ProcessPoolExecutor(
+                self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+            )
+        return self._executor
+
+    def _acquire(self) -> Tuple[ProcessPoolExecutor, float]:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHashingBusy()
+            self.pending += 1
+            return self._ensure_executor(), time.perf_counter()
+
+    def _release(self, executor: ProcessPoolExecutor, started: float, broken: bool) -> None:
+        with self._lock:
+            if broken and self._executor is executor:
+                # a worker died, the next call starts a new pool
+                logger.error("Password hashing pool broken, restarting it")
+                self._executor = None
+            self.pending -= 1
+            self.completed += 1
+            self.seconds += time.perf_counter() - started
+
+    def _call(self, fn: Callable, *args: Any) -> Any:
+        if not self.processes:
+            return fn(*args)
+        executor, started = self._acquire()
+        broken = False
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            broken = True
+            raise
+        finally:
+            self._release(executor, started, broken)
+
+    async def _call_async(self, fn: Callable, *args: Any) -> Any:
+        if not self.processes:
+            return await run_in_threadpool(fn, *args)
+        executor, started = self._acquire()
+        broken = False
+        try:
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            broken = True
+            raise
+        finally:
+            self._release(executor, started, broken)
+
+    def _count_rehash(self, result: Tuple[bool, Optional[str]]) -> Tuple[bool, Optional[str]]:
+        if result[1] is not None:
+            with self._lock:
+                self.rehashed += 1
+        return result
+
+    def hash(self, password: str) -> str:
+        return self._call(_hash, password)
+
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Whether the password matches, and its new hash when the stored one
+        was made with another cost.
+        """
+        return self._count_rehash(self._call(_verify_and_update, password, hashed_password))
+
+    async def verify_and_update_async(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        verify_and_update without holding a request thread while waiting.
+        """
+        return self._count_rehash(
+            await self._call_async(_verify_and_update, password, hashed_password)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queued": max(0, self.pending - self.processes),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "seconds": round(self.seconds, 3),
+            }
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_PROCESSES, settings.PASSWORD_HASH_MAX_PENDING
+)
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify_and_update(plain_password, hashed_password)[0]
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
@@ -0,0 +1,148 @@
+import json
+import subprocess
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from app.core.config import settings
+
+# Target format of the stored recordings
+TARGET_CODEC = "opus"
+TARGET_FORMAT = "ogg"
+
+
+class TranscodeError(Exception):
+    """
+    ffmpeg could not read or convert the recording, retrying will not help.
+    """
+
+
+def _run(cmd: List[str], timeout: int) -> bytes:
+    # A missing binary or a timeout is raised as is, those are worth a retry
+    result = subprocess.run(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=timeout,
+        check=False,
+    )
+    if result.returncode != 0:
+        message = result.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise TranscodeError(message[-1] if message else f"{cmd[0]} failed")
+    return result.stdout
+
+
+def probe(path: str) -> Dict[str, Any]:
+    """
+    Container and first audio stream of the file, as reported by ffprobe.
+    """
+    output = _run(
+        [
+            settings.FFPROBE_BINARY,
+            "-v", "error",
+            "-select_streams", "a:0",
+            "-show_entries", "format=format_name,duration:stream=codec_name,sample_rate,channels",
+            "-of", "json",
+            path,
+        ],
+        timeout=settings.VOICE_TRANSCODE_TIMEOUT,
+    )
+    info = json.loads(output or b"{}")
+    if not info.get("streams"):
+        raise TranscodeError("No audio stream found")
+    return {"format": info.get("format", {}), "stream": info["streams"][0]}
+
+
+def is_target_format(info: Dict[str, Any]) -> bool:
+    formats = info["format"].get("format_name", "").split(",")
+    return TARGET_FORMAT in formats and info["stream"].get("codec_name") == TARGET_CODEC
+
+
+def to_opus(src: str, dst: str) -> None:
+    """
+    Transcode `src` to Opus in an Ogg container at VOICE_OPUS_BITRATE.
+
+    Dictations are speech, the VOIP application mode and a mono downmix keep
+    them intelligible at a fraction of the size of the phone's WAV.
+    """
+    _run(
+        [
+            settings.FFMPEG_BINARY,
+            "-nostdin",
+            "-v", "error",
+            "-y",
+            "-i", src,
+            "-vn",
+            "-map_metadata", "-1",
+            "-ac", "1",
+            "-c:a", "libopus",
+            "-b:a", settings.VOICE_OPUS_BITRATE,
+            "-application", "voip",
+            "-f", TARGET_FORMAT,
+            dst,
+        ],
+        timeout=settings.VOICE_TRANSCODE_TIMEOUT,
+    )
+
+
+def trim_to_segments(src: str, dst: str, segments: Sequence[Tuple[float, float]]) -> None:
+    """
+    Opus/Ogg copy of `src` made of the given (start, end) segments only, in
+    seconds, back to back.
+    """
+    selection = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in segments)
+    _run(
+        [
+            settings.FFMPEG_BINARY,
+            "-nostdin",
+            "-v", "error",
+            "-y",
+            "-i", src,
+            "-vn",
+            "-map_metadata", "-1",
+            "-af", f"aselect='{selection}',asetpts=N/SR/TB",
+            "-ac", "1",
+            "-c:a", "libopus",
+            "-b:a", settings.VOICE_OPUS_BITRATE,
+            "-application", "voip",
+            "-f", TARGET_FORMAT,
+            dst,
+        ],
+        timeout=settings.VOICE_TRANSCODE_TIMEOUT,
+    )
+
+
+def decode_pcm(path: str, sample_rate: int, block_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    Decode the recording to mono signed 16 bit little endian PCM at
+    `sample_rate`, streamed in blocks of at most `block_size` bytes so hour
+    long recordings are never held in memory.
+    """
+    process = subprocess.Popen(
+        [
+            settings.FFMPEG_BINARY,
+            "-nostdin",
+            "-v", "error",
+            "-i", path,
+            "-vn",
+            "-ac", "1",
+            "-ar", str(sample_rate),
+            "-f", "s16le",
+            "pipe:1",
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        for block in iter(lambda: process.stdout.read(block_size), b""):  # type: ignore
+            yield block
+        stderr = process.stderr.read()  # type: ignore
+        if process.wait(timeout=settings.VOICE_TRANSCODE_TIMEOUT) != 0:
+            message = stderr.decode("utf-8", "replace").strip().splitlines()
+            raise TranscodeError(message[-1] if message else "ffmpeg failed")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()  # type: ignore
+        process.stderr.close()  # type: ignore
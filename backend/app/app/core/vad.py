@@ -0,0 +1,110 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# (start, end) in seconds
+Segment = Tuple[float, float]
+
+# Frames quieter than this (dB of the mean square of 16 bit samples) are never
+# speech, whatever the noise floor: a digitally silent file has no speech
+MIN_SPEECH_DB = 30.0
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and (exclusive) end indices of the runs of True in `mask`.
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _merge(starts: np.ndarray, ends: np.ndarray, min_gap: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(starts) < 2:
+        return starts, ends
+    keep = starts[1:] - ends[:-1] >= min_gap
+    return starts[np.r_[True, keep]], ends[np.r_[keep, True]]
+
+
+class VoiceActivityDetector:
+    """
+    Energy and zero crossing rate voice activity detection of a mono s16le
+    PCM stream.
+
+    Frame features are computed as the stream is fed, only them and a partial
+    frame are kept. The decision is taken by `finish` against the noise floor
+    of the whole recording (a low percentile of the frame energies), so a
+    quiet office and a car are handled alike. Frames well above the floor are
+    speech, and so are frames moderately above it with a high zero crossing
+    rate, the unvoiced consonants that are weak in energy.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        *,
+        frame_ms: int = 30,
+        threshold_db: float = 12.0,
+        zcr_threshold: float = 0.25,
+        min_speech_ms: int = 120,
+        min_silence_ms: int = 400,
+        padding_ms: int = 150,
+    ):
+        self.sample_rate = sample_rate
+        self.frame = sample_rate * frame_ms // 1000
+        self.threshold_db = threshold_db
+        self.zcr_threshold = zcr_threshold
+        self.min_speech = max(min_speech_ms // frame_ms, 1)
+        self.min_silence = max(min_silence_ms // frame_ms, 1)
+        self.padding = padding_ms // frame_ms
+        self.samples = 0
+        self._pending = b""
+        self._rest = np.empty(0, dtype=np.int16)
+        self._energy: List[np.ndarray] = []
+        self._zcr: List[np.ndarray] = []
+
+    def feed(self, pcm: bytes) -> None:
+        data = self._pending + pcm
+        cut = len(data) & ~1
+        self._pending = data[cut:]
+        samples = np.frombuffer(data[:cut], dtype="<i2")
+        self.samples += len(samples)
+        if len(self._rest):
+            samples = np.concatenate([self._rest, samples])
+        full = len(samples) - len(samples) % self.frame
+        frames = samples[:full].reshape(-1, self.frame)
+        self._rest = samples[full:].copy()
+        if not len(frames):
+            return
+        values = frames.astype(np.float32)
+        self._energy.append(np.einsum("ij,ij->i", values, values) / self.frame)
+        signs = np.signbit(frames)
+        self._zcr.append(np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame)
+
+    def finish(self) -> List[Segment]:
+        """
+        Speech segments of the stream, in seconds.
+        """
+        if not self._energy:
+            return []
+        energy = 10 * np.log10(np.concatenate(self._energy) + 1e-3)
+        zcr = np.concatenate(self._zcr)
+        floor = np.percentile(energy, 10)
+        loud = energy > max(floor + self.threshold_db, MIN_SPEECH_DB)
+        fricative = (energy > max(floor + self.threshold_db / 2, MIN_SPEECH_DB)) & (
+            zcr > self.zcr_threshold
+        )
+        starts, ends = _runs(loud | fricative)
+        # pauses between words belong to the speech, isolated clicks do not
+        starts, ends = _merge(starts, ends, self.min_silence)
+        long_enough = ends - starts >= self.min_speech
+        starts, ends = starts[long_enough], ends[long_enough]
+        starts = np.maximum(starts - self.padding, 0)
+        ends = np.minimum(ends + self.padding, len(energy))
+        starts, ends = _merge(starts, ends, 1)
+        seconds = self.frame / self.sample_rate
+        duration = self.samples / self.sample_rate
+        # a segment reaching the last frame also covers the partial one after it
+        return [
+            (round(start * seconds, 3), round(duration if end == len(energy) else end * seconds, 3))
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ]
@@ -2,6 +2,17 @@ from .crud_item import item
 from .crud_user import user
 from .crud_voice import voice
 from .crud_note import note
+from .crud_blob import blob
+from .crud_voice_upload import voice_upload
+from .crud_voice_segment import voice_segment
+from .crud_transcript import transcript
+from .crud_refresh_token import refresh_token
+
+# The same for an AsyncSession (deps.get_async_db)
+from .async_crud_user import user_async
+from .async_crud_voice import voice_async
+from .async_crud_note import note_async
+from .async_crud_voice_upload import voice_upload_async
 
 # For a new basic set of CRUD operations you could just do
 
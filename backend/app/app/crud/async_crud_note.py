@@ -0,0 +1,84 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.core.pagination import Page, paginate_async
+from app.core.principal_cache import Principal
+from app.crud.async_base import AsyncCRUDBase
+from app.crud.crud_note import NoteClaim, note
+from app.models.note import Note
+from app.models.user import User
+from app.models.voice import Voice
+from app.schemas.note import NoteCreate, NoteUpdate
+
+
+class AsyncCRUDNote(AsyncCRUDBase[Note, NoteCreate, NoteUpdate]):
+    """
+    crud.note for an AsyncSession, with the same conditions (visible_to,
+    managed_by) so both return the same notes.
+    """
+
+    async def claim(
+        self, db: AsyncSession, *, obj_in: NoteCreate, date_creation: datetime
+    ) -> NoteClaim:
+        result = await db.execute(note.claim_statement(obj_in=obj_in, date_creation=date_creation))
+        row = result.first()
+        if row is not None:
+            return note.claim_result(row)
+        # the note that won was committed after the statement started
+        result = await db.execute(select(Note.id).filter(Note.voice_id == obj_in.voice_id))
+        return NoteClaim(note=None, existing_id=result.scalar())
+
+    async def update_note(
+        self, db: AsyncSession, *, db_obj: Note, obj_in: Union[NoteUpdate, Dict[str, Any]]
+    ) -> Note:
+        if isinstance(obj_in, dict):
+            update_data = obj_in
+        else:
+            update_data = obj_in.dict(exclude_unset=True)
+        return await super().update(db, db_obj=db_obj, obj_in=update_data)
+
+    async def get_by_note_id(self, db: AsyncSession, *, id: int) -> Optional[Note]:
+        # with its voice, check_note_access reads the doctor
+        result = await db.execute(
+            select(Note).options(joinedload(Note.voice)).filter(Note.id == id)
+        )
+        return result.scalars().first()
+
+    async def get_multi_visible(
+        self, db: AsyncSession, *, user: Union[User, Principal], page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        stmt = select(Note).filter(note.visible_to(user))
+        if type(validated) is bool:
+            stmt = stmt.filter(Note.validated == validated)
+        return await paginate_async(db, stmt, Note, page)
+
+    async def get_multi_by_doctor_id(
+        self, db: AsyncSession, *, doctor_id: int, page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        stmt = select(Note).join(Voice, Note.voice_id == Voice.id).filter(Voice.doctor_id == doctor_id)
+        if type(validated) is bool:
+            stmt = stmt.filter(Note.validated == validated)
+        return await paginate_async(db, stmt, Note, page)
+
+    async def get_multi_by_manager(
+        self, db: AsyncSession, *, manager_id: int, page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        stmt = select(Note).filter(note.managed_by(manager_id))
+        if type(validated) is bool:
+            stmt = stmt.filter(Note.validated == validated)
+        return await paginate_async(db, stmt, Note, page)
+
+    async def get_multi_by_patient(
+        self, db: AsyncSession, *, patient_id: int, page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        stmt = select(Note).join(Voice, Voice.id == Note.voice_id).filter(Voice.patient_id == patient_id)
+        if type(validated) is bool:
+            stmt = stmt.filter(Note.validated == validated)
+        return await paginate_async(db, stmt, Note, page)
+
+
+note_async = AsyncCRUDNote(Note)
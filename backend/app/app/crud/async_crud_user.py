@@ -0,0 +1,33 @@
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.async_base import AsyncCRUDBase
+from app.models.assistant_manager import AssistantManager
+from app.models.user import User
+from app.schemas.user import UserCreate, UserUpdate
+
+
+class AsyncCRUDUser(AsyncCRUDBase[User, UserCreate, UserUpdate]):
+    """
+    The reads of crud.user, writes (passwords, relationships) stay sync.
+    """
+
+    async def get_by_email(self, db: AsyncSession, *, email: str) -> Optional[User]:
+        result = await db.execute(select(User).filter(User.email == email))
+        return result.scalars().first()
+
+    async def get_by_id(self, db: AsyncSession, *, id: int) -> Optional[User]:
+        return await db.get(User, id)
+
+    async def get_assistant_ids_by_manager(self, db: AsyncSession, *, manager_id: int) -> List[int]:
+        result = await db.execute(
+            select(AssistantManager.assistant_id)
+            .filter(AssistantManager.manager_id == manager_id)
+            .order_by(AssistantManager.assistant_id)
+        )
+        return list(result.scalars())
+
+
+user_async = AsyncCRUDUser(User)
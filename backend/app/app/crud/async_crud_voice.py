@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import scheduler
+from app.core.pagination import Page, paginate_async
+from app.core.principal_cache import Principal
+from app.crud.async_base import AsyncCRUDBase
+from app.crud.crud_voice import voice
+from app.models.user import User
+from app.models.voice import Voice
+from app.schemas.voice import VoiceCreate, VoiceUpdate
+
+
+class AsyncCRUDVoice(AsyncCRUDBase[Voice, VoiceCreate, VoiceUpdate]):
+    """
+    crud.voice for an AsyncSession, with the same conditions (visible_to,
+    managed_by, assisted_by) so both return the same voices.
+    """
+
+    async def create_with_doctor(
+        self, db: AsyncSession, *, obj_in: VoiceCreate, date_creation: datetime
+    ) -> Voice:
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data, date_creation=date_creation)
+        db.add(db_obj)
+        await db.flush()
+        return db_obj
+
+    async def set_processing_status(self, db: AsyncSession, *, id: int, status: str) -> None:
+        await db.execute(
+            update(Voice)
+            .where(Voice.id == id)
+            .values(processing_status=status)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def claim_next(
+        self, db: AsyncSession, *, user: Union[User, Principal], lease: int
+    ) -> Optional[Voice]:
+        result = await db.execute(voice.claim_next_statement(user=user, lease=lease))
+        return result.scalars().first()
+
+    async def renew_lease(self, db: AsyncSession, *, id: int, user_id: int, lease: int) -> Optional[Voice]:
+        result = await db.execute(voice.renew_statement(id=id, user_id=user_id, lease=lease))
+        return result.scalars().first()
+
+    async def release_lease(self, db: AsyncSession, *, id: int, user_id: int) -> Optional[Voice]:
+        result = await db.execute(voice.release_statement(id=id, user_id=user_id))
+        return result.scalars().first()
+
+    async def get_queue_by_manager(self, db: AsyncSession, *, manager_id: int, limit: int) -> List[Voice]:
+        result = await db.execute(voice.queue_statement(manager_id=manager_id, limit=limit))
+        return list(result.scalars())
+
+    async def set_urgency(self, db: AsyncSession, *, db_obj: Voice, urgency: str) -> Voice:
+        db_obj.urgency = urgency
+        scheduler.schedule(db_obj)
+        db.add(db_obj)
+        await db.flush()
+        return db_obj
+
+    async def get_by_voice_id(self, db: AsyncSession, *, id: int) -> Optional[Voice]:
+        return await db.get(Voice, id)
+
+    async def get_multi_visible(
+        self, db: AsyncSession, *, user: Union[User, Principal], page: Page, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        stmt = select(Voice).filter(voice.visible_to(user))
+        if type(note_created) is bool:
+            stmt = stmt.filter(Voice.note_created == note_created)
+        return await paginate_async(db, stmt, Voice, page)
+
+    async def get_multi_by_doctor_id(
+        self, db: AsyncSession, *, doctor_id: int, page: Page, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        stmt = select(Voice).filter(Voice.doctor_id == doctor_id)
+        if type(note_created) is bool:
+            stmt = stmt.filter(Voice.note_created == note_created)
+        return await paginate_async(db, stmt, Voice, page)
+
+    async def get_multi_by_manager(
+        self, db: AsyncSession, *, manager_id: int, page: Page, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        stmt = select(Voice).filter(voice.managed_by(manager_id))
+        if type(note_created) is bool:
+            stmt = stmt.filter(Voice.note_created == note_created)
+        return await paginate_async(db, stmt, Voice, page)
+
+    async def get_multi_by_patient(
+        self, db: AsyncSession, *, patient_id: int, page: Page, doctor_id: Optional[int]=None, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        stmt = select(Voice).filter(Voice.patient_id == patient_id)
+        if type(doctor_id) is int:
+            stmt = stmt.filter(Voice.doctor_id == doctor_id)
+        if type(note_created) is bool:
+            stmt = stmt.filter(Voice.note_created == note_created)
+        return await paginate_async(db, stmt, Voice, page)
+
+
+voice_async = AsyncCRUDVoice(Voice)
@@ -0,0 +1,13 @@
+from app.crud.async_base import AsyncCRUDBase
+from app.models.voice_upload import VoiceUpload
+from app.schemas.voice_upload import VoiceUploadCreate, VoiceUploadUpdate
+
+
+class AsyncCRUDVoiceUpload(AsyncCRUDBase[VoiceUpload, VoiceUploadCreate, VoiceUploadUpdate]):
+    """
+    crud.voice_upload for an AsyncSession, for the endpoints that stream the
+    chunks and finalize the upload.
+    """
+
+
+voice_upload_async = AsyncCRUDVoiceUpload(VoiceUpload)
@@ -0,0 +1,79 @@
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.blobstore import blobstore
+from app.crud.base import CRUDBase
+from app.db.session import SessionLocal, after_commit, after_rollback
+from app.models.blob import Blob
+from app.schemas.blob import BlobCreate, BlobUpdate
+
+
+class CRUDBlob(CRUDBase[Blob, BlobCreate, BlobUpdate]):
+    """
+    Reference counts of the stored files. The counts change in the caller's
+    transaction, the files are only deleted once it is over, see
+    delete_unreferenced.
+    """
+
+    def lock(self, db: Session, *, id: str) -> None:
+        # held until the transaction ends, serializes taking a reference
+        # with deleting the file
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(id))))
+
+    def acquire(self, db: Session, *, id: str, size: int) -> int:
+        """
+        Take a reference on the blob, creating its row on first use.
+        Store the file only after this: a release of the last reference
+        elsewhere cannot delete it until this transaction ends, and then
+        sees the reference. Returns the new reference count.
+        """
+        self.lock(db, id=id)
+        stmt = insert(Blob).values(id=id, size=size, refcount=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Blob.id], set_={"refcount": Blob.refcount + 1}
+        ).returning(Blob.refcount)
+        refcount = db.execute(stmt).scalar()
+        if refcount == 1:
+            # the file stored for a reference that is never committed
+            after_rollback(db, lambda: self.delete_unreferenced(id))
+        return refcount
+
+    def release(self, db: Session, *, id: str) -> Optional[int]:
+        """
+        Drop a reference on the blob. The last reference removes the row,
+        and the stored file once the transaction commits. Returns the
+        remaining reference count.
+        """
+        blob = (
+            db.query(Blob).filter(Blob.id == id).with_for_update().first()
+        )
+        if not blob:
+            # voices from before the blob store have no row
+            return None
+        blob.refcount -= 1
+        if blob.refcount <= 0:
+            db.delete(blob)
+            after_commit(db, lambda: self.delete_unreferenced(id))
+        db.flush()
+        return max(blob.refcount, 0)
+
+    def delete_unreferenced(self, id: str) -> None:
+        """
+        Delete the stored file of the blob unless it has a row again, in a
+        transaction of its own. A reference being taken concurrently holds
+        the lock, this waits for it to commit and then keeps the file.
+        """
+        db = SessionLocal()
+        try:
+            self.lock(db, id=id)
+            if db.query(Blob.id).filter(Blob.id == id).first() is None:
+                blobstore.delete(id)
+            db.commit()
+        finally:
+            db.close()
+
+
+blob = CRUDBlob(Blob)
@@ -15,8 +15,7 @@ class CRUDItem(CRUDBase[Item, ItemCreate, ItemUpdate]):
         obj_in_data = jsonable_encoder(obj_in)
         db_obj = self.model(**obj_in_data, owner_id=owner_id)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        db.flush()
         return db_obj
 
     def get_multi_by_owner(
@@ -1,10 +1,15 @@
-from typing import List, Optional, Any, Dict, Optional, Union
+from typing import List, Optional, Any, Dict, NamedTuple, Optional, Tuple, Union
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, Integer, String, and_, exists, false, literal, select, true, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.sql.expression import ClauseElement, CompoundSelect
 
+from app.core.pagination import Page, paginate
+from app.core.principal_cache import Principal
 from app.crud.base import CRUDBase
 from app.models.note import Note
+from app.models.user import User
 from app.models.voice import Voice
 from app.models.doctor_manager import DoctorManager
 from app.models.assistant_manager import AssistantManager
@@ -16,16 +21,67 @@ from app.schemas.user_doctor import Doctor
 from app.schemas.user_patient import Patient
 
 
+class NoteClaim(NamedTuple):
+    """
+    The note a claim created, or the id of the one the voice already has.
+    Both None when the voice does not exist.
+    """
+
+    note: Optional[Dict[str, Any]]
+    existing_id: Optional[int]
+
+
 class CRUDNote(CRUDBase[Note, NoteCreate, NoteUpdate]):
-    def create_with_assistant(
-        self, db: Session, *, obj_in: NoteCreate, date_creation: datetime
-    ) -> Note:
-        obj_in_data = jsonable_encoder(obj_in)
-        db_obj = self.model(**obj_in_data, date_creation = date_creation)
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
+    def claim_statement(self, *, obj_in: NoteCreate, date_creation: datetime) -> CompoundSelect:
+        """
+        Create the note of the voice unless it has one, and mark the voice
+        (ending its work queue lease) in the same statement. Its row is the
+        new note (`created`) or the note already on the voice, none when the
+        voice does not exist.
+        """
+        new_note = (
+            insert(Note)
+            .from_select(
+                ["content_txt", "validated", "voice_id", "assistant_id", "date_creation"],
+                select(
+                    literal(obj_in.content_txt, String),
+                    false(),
+                    Voice.id,
+                    literal(obj_in.assistant_id, Integer),
+                    literal(date_creation, DateTime),
+                ).where(Voice.id == obj_in.voice_id),
+            )
+            .on_conflict_do_nothing(index_elements=[Note.voice_id])
+            .returning(*Note.__table__.c)
+            .cte("new_note")
+        )
+        created = exists(select(new_note.c.id))
+        mark_voice = (
+            update(Voice)
+            .where(Voice.id == obj_in.voice_id, created)
+            .values(note_created=True, claimed_by=None, claimed_at=None, lease_expires_at=None)
+            .returning(Voice.id)
+            .cte("mark_voice")
+        )
+        return union_all(
+            select(*new_note.c, true().label("created")),
+            select(*Note.__table__.c, false().label("created")).where(
+                Note.voice_id == obj_in.voice_id, ~created
+            ),
+        ).add_cte(mark_voice)
+
+    def claim_result(self, row: Any) -> NoteClaim:
+        values = dict(row._mapping)
+        if values.pop("created"):
+            return NoteClaim(note=values, existing_id=None)
+        return NoteClaim(note=None, existing_id=values["id"])
+
+    def claim(self, db: Session, *, obj_in: NoteCreate, date_creation: datetime) -> NoteClaim:
+        row = db.execute(self.claim_statement(obj_in=obj_in, date_creation=date_creation)).first()
+        if row is not None:
+            return self.claim_result(row)
+        # the note that won was committed after the statement started
+        return NoteClaim(note=None, existing_id=db.query(Note.id).filter(Note.voice_id == obj_in.voice_id).scalar())
 
     def update_note(
         self, db: Session, *, db_obj: Note, obj_in: Union[NoteUpdate, Dict[str, Any]]
@@ -37,75 +93,90 @@ class CRUDNote(CRUDBase[Note, NoteCreate, NoteUpdate]):
         return super().update(db, db_obj=db_obj, obj_in=update_data)
     
     def get_all(
-        self, db: Session
-    ) -> List[Note]:
-        return (
-            db.query(self.model)
-            .all()
-        )
+        self, db: Session, *, page: Page
+    ) -> Tuple[List[Note], Optional[str]]:
+        return paginate(db.query(self.model), Note, page)
     
     def get_multi_by_doctor_id(
-        self, db: Session, *, doctor_id: int, validated: Optional[bool]=None
-    ) -> List[Note]:
-        if type(validated) is bool:
-            return (db.query(self.model)
+        self, db: Session, *, doctor_id: int, page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        query = (db.query(self.model)
             .join(Voice, Note.voice_id == Voice.id)
-            .filter(Voice.doctor_id == doctor_id, Note.validated == validated)
-            .all())
-        return (db.query(self.model)
-            .join(Voice, Note.voice_id == Voice.id)
-            .filter(Voice.doctor_id == doctor_id)
-            .all())
+            .filter(Voice.doctor_id == doctor_id))
+        if type(validated) is bool:
+            query = query.filter(Note.validated == validated)
+        return paginate(query, Note, page)
 
     def get_by_note_id(
         self, db: Session, *, id: int
     ) -> Note:
         return (
             db.query(self.model)
+            .options(joinedload(Note.voice))
             .filter(Note.id == id)
             .first()
         )
     
+    def managed_by(self, manager_id: int) -> ClauseElement:
+        # notes of the assistants of the manager
+        return exists().where(
+            and_(AssistantManager.assistant_id == Note.assistant_id, AssistantManager.manager_id == manager_id)
+        )
+
+    def of_doctor(self, doctor_id: int) -> ClauseElement:
+        # notes on the voices of the doctor
+        return exists().where(and_(Voice.id == Note.voice_id, Voice.doctor_id == doctor_id))
+
+    def visible_to(self, user: Union[User, Principal]) -> ClauseElement:
+        """
+        Condition on Note selecting the notes the user may list: an assistant
+        their own, a manager those of their assistants, a doctor those on
+        their voices. A note only last modified by a user is readable by id but
+        not listed, an OR on modifier_id would defeat the indexes.
+        """
+        if user.is_superuser:
+            return true()
+        if user.role == "assistant":
+            return Note.assistant_id == user.id
+        if user.role == "manager":
+            return self.managed_by(user.id)
+        if user.role == "doctor":
+            return self.of_doctor(user.id)
+        return false()
+
+    def get_multi_visible(
+        self, db: Session, *, user: Union[User, Principal], page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        query = db.query(self.model).filter(self.visible_to(user))
+        if type(validated) is bool:
+            query = query.filter(Note.validated == validated)
+        return paginate(query, Note, page)
+    
     def get_multi_by_manager(
-        self, db: Session, *, manager_id: int, validated: Optional[bool]=None
-    ) -> List[Note]:
+        self, db: Session, *, manager_id: int, page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        query = db.query(self.model).filter(self.managed_by(manager_id))
         if type(validated) is bool:
-            return (db.query(self.model)
-            .join(AssistantManager, AssistantManager.assistant_id == Note.assistant_id)
-            .filter(AssistantManager.manager_id == manager_id, Note.validated==validated)
-            .all())
-        return (db.query(self.model)
-            .join(AssistantManager, AssistantManager.assistant_id == Note.assistant_id)
-            .filter(AssistantManager.manager_id == manager_id)
-            .all())
+            query = query.filter(Note.validated == validated)
+        return paginate(query, Note, page)
     
     def get_multi_by_assistant(
-        self, db: Session, *, assistant_id: int, validated: Optional[bool]=None
-    ) -> List[Note]:
+        self, db: Session, *, assistant_id: int, page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        query = db.query(self.model).filter(Note.assistant_id == assistant_id)
         if type(validated) is bool:
-            return (
-            db.query(self.model)
-            .filter(Note.assistant_id==assistant_id, Note.validated==validated)
-            .all())
-        return (
-            db.query(self.model)
-            .filter(Note.assistant_id==assistant_id)
-            .all())
+            query = query.filter(Note.validated == validated)
+        return paginate(query, Note, page)
     
     def get_multi_by_patient(
-        self, db: Session, *, patient_id: int, validated: Optional[bool]=None
-    ) -> List[Note]:
-        if type(validated) is bool:
-            return (
-            db.query(self.model)
+        self, db: Session, *, patient_id: int, page: Page, validated: Optional[bool]=None
+    ) -> Tuple[List[Note], Optional[str]]:
+        query = (db.query(self.model)
             .join(Voice, Voice.id == Note.voice_id)
-            .filter(Voice.patient_id==patient_id, Note.validated==validated)
-            .all())
-        return (
-            db.query(self.model)
-            .join(Voice, Voice.id == Note.voice_id)
-            .filter(Voice.patient_id==patient_id)
-            .all())
+            .filter(Voice.patient_id == patient_id))
+        if type(validated) is bool:
+            query = query.filter(Note.validated == validated)
+        return paginate(query, Note, page)
 
 
 note = CRUDNote(Note)
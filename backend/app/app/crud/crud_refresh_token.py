@@ -0,0 +1,94 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.security import generate_refresh_token, hash_refresh_token
+from app.crud.base import CRUDBase
+from app.models.refresh_token import RefreshToken
+from app.schemas.refresh_token import RefreshTokenCreate, RefreshTokenUpdate
+
+
+class CRUDRefreshToken(CRUDBase[RefreshToken, RefreshTokenCreate, RefreshTokenUpdate]):
+    def issue(self, db: Session, *, user_id: int, family: Optional[str] = None) -> str:
+        """
+        A new refresh token for the user, of a new family unless given one.
+        Only its hash is stored, the token is returned to hand to the client.
+        """
+        token = generate_refresh_token()
+        now = datetime.utcnow()
+        db.add(
+            RefreshToken(
+                user_id=user_id,
+                family=family or str(uuid.uuid4()),
+                token_hash=hash_refresh_token(token),
+                expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+                revoked=False,
+                date_creation=now,
+            )
+        )
+        db.flush()
+        return token
+
+    def rotate(self, db: Session, *, token: str) -> Optional[Tuple[int, str]]:
+        """
+        Exchange the token for the next one of its family. Returns the user
+        and the new token, None when the token is unknown, expired or
+        revoked. A token exchanged twice was copied, its whole family is
+        revoked and the legitimate client has to log in again.
+        """
+        db_obj = (
+            db.query(RefreshToken)
+            .filter(RefreshToken.token_hash == hash_refresh_token(token))
+            .with_for_update()
+            .first()
+        )
+        now = datetime.utcnow()
+        if db_obj is None or db_obj.revoked or db_obj.expires_at < now:
+            return None
+        if db_obj.used_at is not None:
+            self.revoke_family(db, family=db_obj.family)
+            # the request fails, the revocation has to stay
+            db.commit()
+            return None
+        db_obj.used_at = now
+        db.add(db_obj)
+        return db_obj.user_id, self.issue(db, user_id=db_obj.user_id, family=db_obj.family)
+
+    def revoke(self, db: Session, *, token: str) -> None:
+        """
+        End the session the token belongs to.
+        """
+        family = (
+            db.query(RefreshToken.family)
+            .filter(RefreshToken.token_hash == hash_refresh_token(token))
+            .scalar()
+        )
+        if family is not None:
+            self.revoke_family(db, family=family)
+
+    def revoke_family(self, db: Session, *, family: str) -> None:
+        db.query(RefreshToken).filter(RefreshToken.family == family).update(
+            {RefreshToken.revoked: True}, synchronize_session=False
+        )
+
+    def revoke_user(self, db: Session, *, user_id: int) -> None:
+        """
+        End every session of the user, e.g. once their password changed.
+        """
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user_id, RefreshToken.revoked.is_(False)
+        ).update({RefreshToken.revoked: True}, synchronize_session=False)
+
+    def remove_expired(self, db: Session, *, before: datetime) -> int:
+        count = (
+            db.query(RefreshToken)
+            .filter(RefreshToken.expires_at < before)
+            .delete(synchronize_session=False)
+        )
+        return count
+
+
+refresh_token = CRUDRefreshToken(RefreshToken)
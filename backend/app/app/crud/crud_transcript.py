@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.crud.base import CRUDBase
+from app.models.transcript import Transcript
+from app.schemas.transcript import TranscriptCreate, TranscriptUpdate
+
+
+class CRUDTranscript(CRUDBase[Transcript, TranscriptCreate, TranscriptUpdate]):
+    def get_by_voice(self, db: Session, *, voice_id: int) -> Optional[Transcript]:
+        return (
+            db.query(self.model)
+            .filter(Transcript.voice_id == voice_id)
+            .first()
+        )
+
+    def create(self, db: Session, *, obj_in: TranscriptCreate) -> Transcript:
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data, date_creation=datetime.now())
+        db.add(db_obj)
+        db.flush()
+        return db_obj
+
+
+transcript = CRUDTranscript(Transcript)
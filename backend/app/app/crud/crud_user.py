@@ -2,8 +2,12 @@ from typing import Any, Dict, Optional, Union
 
 from sqlalchemy.orm import Session
 
-from app.core.security import get_password_hash, verify_password
+from app.core.access_graph import access_graph
+from app.core.principal_cache import principal_cache
+from app.core.security import get_password_hash, password_hasher
 from app.crud.base import CRUDBase
+from app.crud.crud_refresh_token import refresh_token
+from app.db.session import after_commit
 
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
@@ -34,8 +38,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             role = obj_in.role
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        db.flush()
         return db_obj
 
     def update(
@@ -45,18 +48,44 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
-        if update_data.get("password"):
+        password_changed = bool(update_data.get("password"))
+        if password_changed:
             hashed_password = get_password_hash(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        # tokens carrying the former role or flags are stale from now on
+        authorization_changed = any(
+            field in update_data and update_data[field] != getattr(db_obj, field)
+            for field in ("role", "is_active", "is_superuser")
+        )
+        user = super().update(db, db_obj=db_obj, obj_in=update_data)
+        if authorization_changed:
+            self.bump_relationship_version(db, user.id)
+        # role or flags may have changed, the next request reads them again
+        after_commit(db, lambda: principal_cache.invalidate(user.id))
+        if password_changed:
+            refresh_token.revoke_user(db, user_id=user.id)
+        return user
 
     def authenticate(self, db: Session, *, email: str, password: str) -> Optional[User]:
         user = self.get_by_email(db, email=email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        valid, new_hash = password_hasher.verify_and_update(password, user.hashed_password)
+        if not valid:
             return None
+        if new_hash:
+            self.set_password_hash(db, user=user, hashed_password=new_hash)
+        return user
+
+    def set_password_hash(self, db: Session, *, user: User, hashed_password: str) -> User:
+        """
+        Replace the hash of the password with an equivalent one, made with
+        the configured cost.
+        """
+        user.hashed_password = hashed_password
+        db.add(user)
+        db.flush()
         return user
 
     def is_active(self, user: User) -> bool:
@@ -68,55 +97,105 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
     def role(self, user: User) -> str:
         return user.role
 
+    def bump_relationship_version(self, db: Session, *ids: int) -> None:
+        """
+        Mark the care team, role or flags of the users as changed, in the
+        transaction of the change.
+        """
+        db.query(User).filter(User.id.in_(ids)).update(
+            {User.relationship_version: User.relationship_version + 1},
+            synchronize_session=False,
+        )
+
+        def invalidate() -> None:
+            for id in ids:
+                principal_cache.invalidate(id)
+
+        after_commit(db, invalidate)
+
     def create_doctor_manager(self, db: Session, *, obj_in: DoctorManagerCreate) -> DoctorManager:
+        # a relationship exists once, creating it again returns it
+        existing = db.query(DoctorManager).filter_by(doctor_id=obj_in.doctor_id, manager_id=obj_in.manager_id).first()
+        if existing:
+            return existing
         db_obj = DoctorManager(
             doctor_id=obj_in.doctor_id,
             manager_id=obj_in.manager_id
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        access_graph.announce(db, "doctor_manager", obj_in.doctor_id, obj_in.manager_id)
+        self.bump_relationship_version(db, obj_in.doctor_id, obj_in.manager_id)
+        db.flush()
+        after_commit(db, lambda: access_graph.set_edge("doctor_manager", obj_in.doctor_id, obj_in.manager_id, True))
         return db_obj
     
-    def remove_doctor_manager(self, db: Session, *, obj_in: DoctorManagerUpdate) -> DoctorManager:
-        obj = db.query(DoctorManager).filter(doctor_id=obj_in.doctor_id,
+    def remove_doctor_manager(self, db: Session, *, obj_in: DoctorManagerUpdate) -> Optional[DoctorManager]:
+        obj = db.query(DoctorManager).filter_by(doctor_id=obj_in.doctor_id,
             manager_id=obj_in.manager_id).first()
+        if not obj:
+            return None
+        edge = obj.doctor_id, obj.manager_id
         db.delete(obj)
-        db.commit()
+        access_graph.announce(db, "doctor_manager", *edge)
+        self.bump_relationship_version(db, *edge)
+        db.flush()
+        after_commit(db, lambda: access_graph.set_edge("doctor_manager", *edge, False))
         return obj
     
     def create_doctor_patient(self, db: Session, *, obj_in: DoctorPatientCreate) -> DoctorPatient:
+        existing = db.query(DoctorPatient).filter_by(doctor_id=obj_in.doctor_id, patient_id=obj_in.patient_id).first()
+        if existing:
+            return existing
         db_obj = DoctorPatient(
             doctor_id=obj_in.doctor_id,
             patient_id=obj_in.patient_id
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        access_graph.announce(db, "doctor_patient", obj_in.doctor_id, obj_in.patient_id)
+        self.bump_relationship_version(db, obj_in.doctor_id, obj_in.patient_id)
+        db.flush()
+        after_commit(db, lambda: access_graph.set_edge("doctor_patient", obj_in.doctor_id, obj_in.patient_id, True))
         return db_obj
     
-    def remove_doctor_patient(self, db: Session, *, obj_in: DoctorPatientUpdate) -> DoctorPatient:
-        obj = db.query(DoctorPatient).filter(doctor_id=obj_in.doctor_id,
+    def remove_doctor_patient(self, db: Session, *, obj_in: DoctorPatientUpdate) -> Optional[DoctorPatient]:
+        obj = db.query(DoctorPatient).filter_by(doctor_id=obj_in.doctor_id,
             patient_id=obj_in.patient_id).first()
+        if not obj:
+            return None
+        edge = obj.doctor_id, obj.patient_id
         db.delete(obj)
-        db.commit()
+        access_graph.announce(db, "doctor_patient", *edge)
+        self.bump_relationship_version(db, *edge)
+        db.flush()
+        after_commit(db, lambda: access_graph.set_edge("doctor_patient", *edge, False))
         return obj
     
     def create_assistant_manager(self, db: Session, *, obj_in: AssistantManagerCreate) -> AssistantManager:
+        existing = db.query(AssistantManager).filter_by(assistant_id=obj_in.assistant_id, manager_id=obj_in.manager_id).first()
+        if existing:
+            return existing
         db_obj = AssistantManager(
             assistant_id=obj_in.assistant_id,
             manager_id=obj_in.manager_id
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        access_graph.announce(db, "assistant_manager", obj_in.assistant_id, obj_in.manager_id)
+        self.bump_relationship_version(db, obj_in.assistant_id, obj_in.manager_id)
+        db.flush()
+        after_commit(db, lambda: access_graph.set_edge("assistant_manager", obj_in.assistant_id, obj_in.manager_id, True))
         return db_obj
-
-    def remove_assistant_manager(self, db: Session, *, obj_in: AssistantManagerUpdate) -> AssistantManager:
-        obj = db.query(AssistantManager).filter(assistant_id=obj_in.assistant_id,
+    
+    def remove_assistant_manager(self, db: Session, *, obj_in: AssistantManagerUpdate) -> Optional[AssistantManager]:
+        obj = db.query(AssistantManager).filter_by(assistant_id=obj_in.assistant_id,
             manager_id=obj_in.manager_id).first()
+        if not obj:
+            return None
+        edge = obj.assistant_id, obj.manager_id
         db.delete(obj)
-        db.commit()
+        access_graph.announce(db, "assistant_manager", *edge)
+        self.bump_relationship_version(db, *edge)
+        db.flush()
+        after_commit(db, lambda: access_graph.set_edge("assistant_manager", *edge, False))
         return obj
     
 user = CRUDUser(User)
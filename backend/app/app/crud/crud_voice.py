@@ -1,20 +1,31 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, case, exists, false, func, or_, select, true, update
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Select
 
+from app.core import scheduler
+from app.core.pagination import Page, paginate
+from app.core.principal_cache import Principal
 from app.crud.base import CRUDBase
+from app.crud.crud_blob import blob
+from app.models.user import User
 from app.models.voice import Voice
 from app.models.doctor_manager import DoctorManager
 from app.models.assistant_manager import AssistantManager
 from app.models.doctor_patient import DoctorPatient
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.schemas.voice import VoiceCreate, VoiceUpdate
 from app.schemas.user_doctor import Doctor
 from app.schemas.user_patient import Patient
 
 
+# The processing statuses of the voices an assistant can work on
+QUEUED_STATUSES = ("ready", "failed")
+
+
 class CRUDVoice(CRUDBase[Voice, VoiceCreate, VoiceUpdate]):
     def create_with_doctor(
         self, db: Session, *, obj_in: VoiceCreate, date_creation: datetime
@@ -22,30 +33,54 @@ class CRUDVoice(CRUDBase[Voice, VoiceCreate, VoiceUpdate]):
         obj_in_data = jsonable_encoder(obj_in)
         db_obj = self.model(**obj_in_data, date_creation = date_creation)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        db.flush()
         return db_obj
+
+    def set_processing_status(self, db: Session, *, id: int, status: str) -> None:
+        db.query(Voice).filter(Voice.id == id).update(
+            {Voice.processing_status: status}, synchronize_session=False
+        )
+
+    def replace_path(
+        self, db: Session, *, id: int, old_path: str, new_path: str, values: Dict[str, Any]
+    ) -> bool:
+        """
+        Point the voice at `new_path` if it still uses `old_path`, updating
+        `values` along (a new duration moves the voice in the queue), and
+        drop its reference on the old blob in the same transaction.
+        Returns False, without any change, when the voice was removed or its
+        recording replaced in the meantime.
+        """
+        values = {**values, "path": new_path}
+        if "duration" in values:
+            values["start_by"] = scheduler.start_by(Voice.due_at, values["duration"])
+        updated = (
+            db.query(Voice)
+            .filter(Voice.id == id, Voice.path == old_path)
+            .update(values, synchronize_session=False)
+        )
+        if not updated:
+            return False
+        blob.release(db, id=old_path)
+        return True
+
+    def remove(self, db: Session, *, id: int) -> Voice:
+        obj = super().remove(db, id=id)
+        blob.release(db, id=obj.path)
+        return obj
     
     def get_all(
-        self, db: Session
-    ) -> List[Voice]:
-        return (
-            db.query(self.model)
-            .all()
-        )
+        self, db: Session, *, page: Page
+    ) -> Tuple[List[Voice], Optional[str]]:
+        return paginate(db.query(self.model), Voice, page)
     
     def get_multi_by_doctor_id(
-        self, db: Session, *, doctor_id: int, note_created: Optional[bool]=None
-    ) -> List[Voice]:
+        self, db: Session, *, doctor_id: int, page: Page, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        query = db.query(self.model).filter(Voice.doctor_id == doctor_id)
         if type(note_created) is bool:
-            return (db.query(self.model)
-            .filter(Voice.doctor_id == doctor_id, Voice.note_created == note_created)
-            .all())
-        return (
-            db.query(self.model)
-            .filter(Voice.doctor_id == doctor_id)
-            .all()
-        )
+            query = query.filter(Voice.note_created == note_created)
+        return paginate(query, Voice, page)
 
     def get_by_voice_id(
         self, db: Session, *, id: int
@@ -56,51 +91,170 @@ class CRUDVoice(CRUDBase[Voice, VoiceCreate, VoiceUpdate]):
             .first()
         )
     
-    def get_multi_by_manager(
-        self, db: Session, *, manager_id: int, note_created: Optional[bool]=None
-    ) -> List[Voice]:
-        if type(note_created) is bool:
-            return (
-            db.query(self.model)
-            .join(DoctorManager, DoctorManager.doctor_id == Voice.doctor_id)
-            .filter(DoctorManager.manager_id == manager_id, Voice.note_created==note_created)
-            .all())
+    def managed_by(self, manager_id: int) -> ClauseElement:
+        # voices of the doctors of the manager
+        return exists().where(
+            and_(DoctorManager.doctor_id == Voice.doctor_id, DoctorManager.manager_id == manager_id)
+        )
+
+    def assisted_by(self, assistant_id: int) -> ClauseElement:
+        # voices of the doctors of the managers of the assistant
+        return exists().where(
+            and_(
+                DoctorManager.doctor_id == Voice.doctor_id,
+                AssistantManager.manager_id == DoctorManager.manager_id,
+                AssistantManager.assistant_id == assistant_id,
+            )
+        )
+
+    def visible_to(self, user: Union[User, Principal]) -> ClauseElement:
+        """
+        Condition on Voice selecting the voices the user may read, the rule
+        of AccessGraph.can_access_voice for the role of the user, so that
+        the database returns nothing else.
+        """
+        if user.is_superuser:
+            return true()
+        if user.role == "doctor":
+            return Voice.doctor_id == user.id
+        if user.role == "patient":
+            return Voice.patient_id == user.id
+        if user.role == "manager":
+            return self.managed_by(user.id)
+        if user.role == "assistant":
+            return self.assisted_by(user.id)
+        return false()
+
+    # Work queue
+
+    def lease_free(self) -> ClauseElement:
+        # never claimed, released, or the assistant let the lease expire
+        return or_(Voice.lease_expires_at.is_(None), Voice.lease_expires_at < func.now())
+
+    def leased_by(self, user_id: int) -> ClauseElement:
+        return and_(Voice.claimed_by == user_id, Voice.lease_expires_at >= func.now())
+
+    def returning_voice(self, stmt: Any) -> Select:
+        # the voices the statement changed, as they are now even if already
+        # loaded in the session
         return (
-            db.query(self.model)
-            .join(DoctorManager, DoctorManager.doctor_id == Voice.doctor_id)
-            .filter(DoctorManager.manager_id == manager_id)
-            .all()
+            select(Voice)
+            .from_statement(stmt.returning(*Voice.__table__.c))
+            .execution_options(populate_existing=True)
         )
+
+    def claim_next_statement(self, *, user: Union[User, Principal], lease: int) -> Select:
+        """
+        Lease to the user the first voice of the queue (the earliest
+        start_by, see app.core.scheduler.schedule) without a note it may see
+        that nobody holds, or extend the lease it already holds on one.
+        Voices still being processed wait, those whose processing failed
+        are queued with their original recording, rather than never get a
+        note.
+        The voices other claims have locked are skipped, not waited for,
+        so concurrent claims each get a different voice in one round trip.
+        """
+        held = (
+            select(Voice.id)
+            .where(Voice.note_created == false(), self.leased_by(user.id))
+            .order_by(Voice.start_by, Voice.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        free = (
+            select(Voice.id)
+            .where(
+                Voice.note_created == false(),
+                Voice.processing_status.in_(QUEUED_STATUSES),
+                self.visible_to(user),
+                self.lease_free(),
+            )
+            .order_by(Voice.start_by, Voice.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        return self.returning_voice(
+            update(Voice)
+            .where(Voice.id == func.coalesce(held, free))
+            .values(
+                claimed_by=user.id,
+                # kept when the lease is only extended
+                claimed_at=case((self.leased_by(user.id), Voice.claimed_at), else_=func.now()),
+                lease_expires_at=func.now() + timedelta(seconds=lease),
+            )
+        )
+
+    def renew_statement(self, *, id: int, user_id: int, lease: int) -> Select:
+        # an expired lease is renewed too as long as nobody claimed the voice
+        return self.returning_voice(
+            update(Voice)
+            .where(Voice.id == id, Voice.claimed_by == user_id, Voice.note_created == false())
+            .values(lease_expires_at=func.now() + timedelta(seconds=lease))
+        )
+
+    def release_statement(self, *, id: int, user_id: int) -> Select:
+        return self.returning_voice(
+            update(Voice)
+            .where(Voice.id == id, Voice.claimed_by == user_id, Voice.note_created == false())
+            .values(claimed_by=None, claimed_at=None, lease_expires_at=None)
+        )
+
+    def queue_statement(self, *, manager_id: int, limit: int) -> Select:
+        # the first `limit` pending voices of the doctors of the manager, in
+        # queue order
+        return (
+            select(Voice)
+            .filter(Voice.note_created == false(), self.managed_by(manager_id))
+            .order_by(Voice.start_by, Voice.id)
+            .limit(limit)
+        )
+
+    def get_queue_by_manager(self, db: Session, *, manager_id: int, limit: int) -> List[Voice]:
+        return list(db.execute(self.queue_statement(manager_id=manager_id, limit=limit)).scalars())
+
+    def claim_next(self, db: Session, *, user: Union[User, Principal], lease: int) -> Optional[Voice]:
+        return db.execute(self.claim_next_statement(user=user, lease=lease)).scalars().first()
+
+    def renew_lease(self, db: Session, *, id: int, user_id: int, lease: int) -> Optional[Voice]:
+        return db.execute(self.renew_statement(id=id, user_id=user_id, lease=lease)).scalars().first()
+
+    def release_lease(self, db: Session, *, id: int, user_id: int) -> Optional[Voice]:
+        return db.execute(self.release_statement(id=id, user_id=user_id)).scalars().first()
+
+    def get_multi_visible(
+        self, db: Session, *, user: Union[User, Principal], page: Page, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        query = db.query(self.model).filter(self.visible_to(user))
+        if type(note_created) is bool:
+            query = query.filter(Voice.note_created == note_created)
+        return paginate(query, Voice, page)
+    
+    def get_multi_by_manager(
+        self, db: Session, *, manager_id: int, page: Page, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        query = db.query(self.model).filter(self.managed_by(manager_id))
+        if type(note_created) is bool:
+            query = query.filter(Voice.note_created == note_created)
+        return paginate(query, Voice, page)
     
     def get_multi_by_assistant(
-        self, db: Session, *, assistant_id: int, note_created: Optional[bool]=None
-    ) -> List[Voice]:
+        self, db: Session, *, assistant_id: int, page: Page, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        query = db.query(self.model).filter(self.assisted_by(assistant_id))
         if type(note_created) is bool:
-            return (
-            db.query(self.model)
-            .join(DoctorManager, DoctorManager.doctor_id == Voice.doctor_id)
-            .join(AssistantManager, AssistantManager.manager_id == AssistantManager.manager_id)
-            .filter(AssistantManager.assistant_id == assistant_id, Voice.note_created==note_created)
-            .all())
-        return (
-            db.query(self.model)
-            .join(DoctorManager, DoctorManager.doctor_id == Voice.doctor_id)
-            .join(AssistantManager, AssistantManager.manager_id == AssistantManager.manager_id)
-            .filter(AssistantManager.assistant_id == assistant_id)
-            .all()
-        )
+            query = query.filter(Voice.note_created == note_created)
+        return paginate(query, Voice, page)
     
     def get_multi_by_patient(
-        self, db: Session, *, patient_id: int, doctor_id: Optional[int]=None ,note_created: Optional[bool]=None
-    ) -> List[Voice]:
-        if type(note_created) is bool and type(doctor_id) is int:
-            return (
-            db.query(self.model).filter(Voice.patient_id==patient_id, Voice.doctor_id==doctor_id, Voice.note_created==note_created).all())
-        elif type(note_created) is bool:
-            return (
-            db.query(self.model).filter(Voice.patient_id==patient_id, Voice.note_created==note_created).all())
-        else:
-            return (db.query(self.model).filter(Voice.patient_id==patient_id).all())
+        self, db: Session, *, patient_id: int, page: Page, doctor_id: Optional[int]=None, note_created: Optional[bool]=None
+    ) -> Tuple[List[Voice], Optional[str]]:
+        query = db.query(self.model).filter(Voice.patient_id == patient_id)
+        if type(doctor_id) is int:
+            query = query.filter(Voice.doctor_id == doctor_id)
+        if type(note_created) is bool:
+            query = query.filter(Voice.note_created == note_created)
+        return paginate(query, Voice, page)
     
 
 voice = CRUDVoice(Voice)
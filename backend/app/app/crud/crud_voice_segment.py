@@ -0,0 +1,44 @@
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app.core.vad import Segment
+from app.crud.base import CRUDBase
+from app.models.voice import Voice
+from app.models.voice_segment import VoiceSegment
+from app.schemas.voice_segment import VoiceSegmentCreate, VoiceSegmentUpdate
+
+
+class CRUDVoiceSegment(CRUDBase[VoiceSegment, VoiceSegmentCreate, VoiceSegmentUpdate]):
+    def get_multi_by_voice(self, db: Session, *, voice_id: int) -> List[VoiceSegment]:
+        return (
+            db.query(self.model)
+            .filter(VoiceSegment.voice_id == voice_id)
+            .order_by(VoiceSegment.start_time)
+            .all()
+        )
+
+    def replace_for_voice(
+        self, db: Session, *, voice_id: int, segments: List[Segment]
+    ) -> None:
+        """
+        Store the speech segments of the voice in place of the previous ones,
+        along with its total speech duration.
+        """
+        db.query(VoiceSegment).filter(VoiceSegment.voice_id == voice_id).delete(
+            synchronize_session=False
+        )
+        db.bulk_insert_mappings(
+            VoiceSegment,
+            [
+                {"voice_id": voice_id, "start_time": start, "end_time": end}
+                for start, end in segments
+            ],
+        )
+        db.query(Voice).filter(Voice.id == voice_id).update(
+            {Voice.speech_duration: sum(end - start for start, end in segments)},
+            synchronize_session=False,
+        )
+
+
+voice_segment = CRUDVoiceSegment(VoiceSegment)
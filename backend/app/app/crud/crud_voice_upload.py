@@ -0,0 +1,37 @@
+import uuid
+from datetime import datetime
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.crud.base import CRUDBase
+from app.models.voice_upload import VoiceUpload
+from app.schemas.voice_upload import VoiceUploadCreate, VoiceUploadUpdate
+
+
+class CRUDVoiceUpload(CRUDBase[VoiceUpload, VoiceUploadCreate, VoiceUploadUpdate]):
+    def create_with_owner(
+        self, db: Session, *, obj_in: VoiceUploadCreate, owner_id: int
+    ) -> VoiceUpload:
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(
+            **obj_in_data,
+            id=str(uuid.uuid4()),
+            owner_id=owner_id,
+            offset=0,
+            date_creation=datetime.now(),
+        )
+        db.add(db_obj)
+        db.flush()
+        return db_obj
+
+    def get_expired(self, db: Session, *, before: datetime) -> List[VoiceUpload]:
+        return (
+            db.query(self.model)
+            .filter(VoiceUpload.date_creation < before)
+            .all()
+        )
+
+
+voice_upload = CRUDVoiceUpload(VoiceUpload)
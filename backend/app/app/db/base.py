@@ -4,6 +4,11 @@ from app.db.base_class import Base  # noqa
 from app.models.item import Item  # noqa
 from app.models.voice import Voice  # noqa
 from app.models.note import Note  # noqa
+from app.models.blob import Blob  # noqa
+from app.models.voice_upload import VoiceUpload  # noqa
+from app.models.voice_segment import VoiceSegment  # noqa
+from app.models.transcript import Transcript  # noqa
+from app.models.refresh_token import RefreshToken  # noqa
 from app.models.assistant_manager import AssistantManager
 from app.models.doctor_manager import DoctorManager
 from app.models.doctor_patient import DoctorPatient
@@ -24,3 +24,4 @@ def init_db(db: Session) -> None:
             role='admin'
         )
         user = crud.user.create(db, obj_in=user_in)  # noqa: F841
+        db.commit()
@@ -0,0 +1,194 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+# Upper bounds in seconds of the checkout wait and hold time buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Cumulative counts per upper bound, as Prometheus reads them.
+    """
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative: List[int] = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return {
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], cumulative)),
+            "count": total,
+            "sum": round(self.sum, 6),
+        }
+
+
+class PoolMetrics:
+    """
+    What the connection pool of an engine did since the process started.
+
+    A checkout is `exhausted` when every connection the pool may open is in
+    use and it has to wait for one to come back. Starvation shows there and
+    in the wait histogram well before checkouts reach DB_POOL_TIMEOUT and
+    fail (`timeouts`).
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.checkout_wait = Histogram()
+        self.hold_time = Histogram()
+        self.waiting = 0
+        self.exhausted = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+
+    def begin_checkout(self, exhausted: bool) -> None:
+        with self._lock:
+            if exhausted:
+                self.exhausted += 1
+                self.waiting += 1
+
+    def end_checkout(self, exhausted: bool, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            if exhausted:
+                self.waiting -= 1
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkout_wait.observe(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        with self._lock:
+            return {
+                "size": pool.size(),
+                "max_overflow": getattr(pool, "_max_overflow", 0),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "waiting": self.waiting,
+                "exhausted": self.exhausted,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "checkout_wait_seconds": self.checkout_wait.snapshot(),
+                "hold_seconds": self.hold_time.snapshot(),
+            }
+
+
+class _TimedCheckout:
+    """
+    Times every checkout, from asking the pool until a connection is ready
+    (pre-ping and new connections included). The pool events only fire once
+    a connection is had, so the wait is measured here.
+    """
+
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self) -> Any:
+        metrics = self.metrics
+        if metrics is None:
+            return super().connect()  # type: ignore
+        exhausted = self.checkedin() == 0 and self.overflow() >= self._max_overflow  # type: ignore
+        metrics.begin_checkout(exhausted)
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()  # type: ignore
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            metrics.end_checkout(exhausted, time.perf_counter() - start, timed_out)
+
+    def recreate(self) -> Any:
+        # Engine.dispose() replaces the pool, the metrics carry on
+        pool = super().recreate()  # type: ignore
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncPool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(engine: Engine) -> PoolMetrics:
+    """
+    Attach metrics to an engine created with one of the pools above, for an
+    AsyncEngine pass its `sync_engine`.
+    """
+    metrics = PoolMetrics(engine)
+    engine.pool.metrics = metrics  # type: ignore
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        with metrics._lock:
+            metrics.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection: Any, connection_record: Any) -> None:
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            with metrics._lock:
+                metrics.hold_time.observe(time.perf_counter() - checked_out_at)
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection: Any, connection_record: Any, exception: Any) -> None:
+        with metrics._lock:
+            metrics.invalidated += 1
+
+    return metrics
+
+
+def engine_options(async_driver: bool = False) -> Dict[str, Any]:
+    """
+    create_engine / create_async_engine arguments from the DB_* settings.
+    """
+    options: Dict[str, Any] = {
+        "poolclass": InstrumentedAsyncPool if async_driver else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_use_lifo": settings.DB_POOL_USE_LIFO,
+        "pool_pre_ping": True,
+    }
+    if async_driver:
+        connect_args: Dict[str, Any] = {"timeout": settings.DB_CONNECT_TIMEOUT}
+        if settings.DB_PGBOUNCER:
+            # neither SQLAlchemy's nor asyncpg's statement cache, a statement
+            # is prepared in the transaction that runs it
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["statement_cache_size"] = 0
+    else:
+        # psycopg2 keeps no prepared statements on the server
+        connect_args = {"connect_timeout": settings.DB_CONNECT_TIMEOUT}
+    options["connect_args"] = connect_args
+    return options
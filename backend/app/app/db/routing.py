@@ -0,0 +1,151 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from starlette.requests import HTTPConnection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Until when (Unix time) the requests of a caller who just wrote read from
+# the primary, set on the responses to its writes
+PRIMARY_COOKIE = "read_primary_until"
+PRIMARY_HEADER = "X-Read-Primary-Until"
+
+# Seconds the replica is behind, 0 when it has replayed everything it received
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaSet:
+    """
+    The read replicas and how far behind the primary each one is.
+
+    A thread measures the lag of every replica each `interval` seconds. A
+    replica takes reads while its last measured lag plus the age of that
+    measurement stays within `max_lag`, so it is never further behind than
+    that even if it stopped replaying right after being measured. Replicas
+    that cannot be reached, or no measurement at all, leave the reads on the
+    primary.
+    """
+
+    def __init__(self, engines: Sequence[Engine], max_lag: float, interval: float):
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self.interval = interval
+        self._lags: List[Optional[float]] = [None] * len(self.engines)
+        self._checked_at: Optional[float] = None
+        self._turn = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def measure(self, engine: Engine) -> float:
+        with engine.connect() as connection:
+            return float(connection.execute(LAG_QUERY).scalar() or 0)
+
+    def check(self) -> None:
+        lags: List[Optional[float]] = []
+        for engine in self.engines:
+            try:
+                lags.append(self.measure(engine))
+            except Exception:
+                logger.warning("Replica %s unavailable", engine.url.host, exc_info=True)
+                lags.append(None)
+        self._lags = lags
+        self._checked_at = time.monotonic()
+
+    def healthy(self) -> List[int]:
+        checked_at = self._checked_at
+        if checked_at is None:
+            return []
+        age = time.monotonic() - checked_at
+        return [i for i, lag in enumerate(self._lags) if lag is not None and lag + age <= self.max_lag]
+
+    def choose(self) -> Optional[int]:
+        """
+        Index of the replica for the next read, in turn among the healthy
+        ones, None for the primary.
+        """
+        healthy = self.healthy()
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        healthy = self.healthy()
+        return [
+            {"host": engine.url.host, "lag_seconds": lag, "healthy": i in healthy}
+            for i, (engine, lag) in enumerate(zip(self.engines, self._lags))
+        ]
+
+    # Measuring in the background
+
+    def start(self) -> None:
+        if not self.engines or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-lag", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
+
+
+def reads_from_primary(connection: HTTPConnection) -> bool:
+    """
+    Whether the request has to read from the primary: anything but a GET,
+    and the GETs of a caller who wrote in the last READ_YOUR_WRITES seconds.
+    """
+    if connection.scope.get("method") != "GET":
+        return True
+    value = connection.cookies.get(PRIMARY_COOKIE) or connection.headers.get(PRIMARY_HEADER)
+    if not value:
+        return False
+    try:
+        return float(value) > time.time()
+    except ValueError:
+        return False
+
+
+class ReadYourWritesMiddleware:
+    """
+    Marks the successful writes of a caller with PRIMARY_COOKIE, and the
+    PRIMARY_HEADER for clients that keep no cookies and send it back
+    themselves, so their next reads see what they wrote.
+    """
+
+    def __init__(self, app: Callable, seconds: int = settings.READ_YOUR_WRITES):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marked(message: Dict) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = str(int(time.time()) + self.seconds)
+                cookie = f"{PRIMARY_COOKIE}={until}; Max-Age={self.seconds}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode()),
+                    (PRIMARY_HEADER.lower().encode(), until.encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
@@ -1,7 +1,69 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import Any, Callable
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, SessionTransaction, sessionmaker
 
 from app.core.config import settings
+from app.db.pool import engine_options, instrument
+from app.db.routing import ReplicaSet
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, **engine_options())
+pool_metrics = instrument(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(
+    settings.ASYNC_SQLALCHEMY_DATABASE_URI, **engine_options(async_driver=True)
+)
+async_pool_metrics = instrument(async_engine.sync_engine)
+# nothing is loaded lazily in async code, objects stay readable after commit
+AsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    class_=AsyncSession,
+)
+
+replica_engines = [create_engine(uri, **engine_options()) for uri in settings.SQLALCHEMY_REPLICA_URIS]
+async_replica_engines = [
+    create_async_engine(uri, **engine_options(async_driver=True))
+    for uri in settings.ASYNC_SQLALCHEMY_REPLICA_URIS
+]
+replica_pool_metrics = [instrument(e) for e in replica_engines] + [
+    instrument(e.sync_engine) for e in async_replica_engines
+]
+# the sync and async engines of a replica share its index
+replica_set = ReplicaSet(replica_engines, settings.REPLICA_MAX_LAG, settings.REPLICA_LAG_INTERVAL)
+
+
+def after_commit(db: Session, callback: Callable[[], Any]) -> None:
+    """
+    Call `callback` once the transaction of `db` commits, never if it is
+    rolled back: tasks about rows the transaction writes, caches of them.
+    """
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+def after_rollback(db: Session, callback: Callable[[], Any]) -> None:
+    """
+    Call `callback` once the transaction of `db` ends without committing,
+    rolled back or with the session closed: cleanup of what it created
+    outside the database.
+    """
+    db.info.setdefault("after_rollback", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(db: Session) -> None:
+    db.info.pop("after_rollback", None)
+    for callback in db.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _end_transaction(db: Session, transaction: SessionTransaction) -> None:
+    if transaction.parent is None:
+        db.info.pop("after_commit", None)
+        for callback in db.info.pop("after_rollback", []):
+            callback()
@@ -1,8 +1,14 @@
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 from app.api.api_v1.api import api_router
+from app.core.access_graph import access_graph
 from app.core.config import settings
+from app.core.security import PasswordHashingBusy, password_hasher
+from app.db.routing import PRIMARY_HEADER, ReadYourWritesMiddleware
+from app.db.session import SessionLocal, async_engine, async_replica_engines, engine, replica_set
 
 app = FastAPI(
     title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
@@ -16,6 +22,59 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Peaks-Levels", PRIMARY_HEADER],
     )
 
+if settings.SQLALCHEMY_REPLICA_URIS:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy(request: Request, exc: PasswordHashingBusy) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many logins in progress, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.on_event("startup")
+def start_access_graph_listener() -> None:
+    # LISTEN needs a session of its own, PgBouncer hands out transactions
+    if not settings.DB_PGBOUNCER:
+        access_graph.start_listener(engine, SessionLocal)
+
+
+@app.on_event("startup")
+def start_replica_lag_checks() -> None:
+    replica_set.start()
+
+
+@app.on_event("startup")
+def start_password_hasher() -> None:
+    if settings.PASSWORD_HASH_PROCESSES:
+        password_hasher.start()
+
+
+@app.on_event("shutdown")
+def stop_access_graph_listener() -> None:
+    access_graph.stop_listener()
+
+
+@app.on_event("shutdown")
+def stop_replica_lag_checks() -> None:
+    replica_set.stop()
+
+
+@app.on_event("shutdown")
+def stop_password_hasher() -> None:
+    password_hasher.shutdown()
+
+
+@app.on_event("shutdown")
+async def close_async_engine() -> None:
+    await async_engine.dispose()
+    for replica in async_replica_engines:
+        await replica.dispose()
@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship, backref
 
 from app.db.base_class import Base
@@ -10,6 +10,11 @@ if TYPE_CHECKING:
 
 
 class AssistantManager(Base):
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     assistant_id = Column(Integer, ForeignKey("user.id"))
-    manager_id = Column(Integer, ForeignKey("user.id"))
\ No newline at end of file
+    manager_id = Column(Integer, ForeignKey("user.id"))
+
+    __table_args__ = (
+        Index("ix_assistantmanager_assistant_id_manager_id", "assistant_id", "manager_id", unique=True),
+        Index("ix_assistantmanager_manager_id_assistant_id", "manager_id", "assistant_id"),
+    )
@@ -0,0 +1,11 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, func
+
+from app.db.base_class import Base
+
+
+class Blob(Base):
+    # hex encoded SHA-256 of the content, also its location in the blob store
+    id = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    refcount = Column(Integer, nullable=False, default=1)
+    date_creation = Column(DateTime(), nullable=False, server_default=func.now())
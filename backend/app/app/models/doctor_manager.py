@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship, backref
 
 from app.db.base_class import Base
@@ -10,7 +10,12 @@ if TYPE_CHECKING:
 
 
 class DoctorManager(Base):
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
 
     doctor_id = Column(Integer, ForeignKey("user.id"))
     manager_id = Column(Integer, ForeignKey("user.id"))
+
+    __table_args__ = (
+        Index("ix_doctormanager_doctor_id_manager_id", "doctor_id", "manager_id", unique=True),
+        Index("ix_doctormanager_manager_id_doctor_id", "manager_id", "doctor_id"),
+    )
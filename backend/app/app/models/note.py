@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship, backref
 
 from app.db.base_class import Base
@@ -12,12 +12,13 @@ if TYPE_CHECKING:
 
 
 class Note(Base):
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
 
-    content_txt = Column(String, index=True)
+    content_txt = Column(String)
     validated = Column(Boolean(), default=False)
     
-    voice_id = Column(Integer, ForeignKey("voice.id"))
+    # a voice has one note, see crud.note.claim_statement
+    voice_id = Column(Integer, ForeignKey("voice.id"), index=True, unique=True)
     voice = relationship("Voice", foreign_keys=[voice_id], backref=backref("voice", uselist=False))
 
     assistant_id = Column(Integer, ForeignKey("user.id"))
@@ -26,4 +27,10 @@ class Note(Base):
     modifier_id = Column(Integer, ForeignKey("user.id"), nullable=True)
                     
     date_creation = Column(DateTime, nullable= False)
-    date_modification = Column(DateTime, nullable= True)
\ No newline at end of file
+    date_modification = Column(DateTime, nullable= True)
+
+    __table_args__ = (
+        # the listings, paginated on (date_creation, id)
+        Index("ix_note_date_creation", "date_creation", "id"),
+        Index("ix_note_assistant_id_date_creation", "assistant_id", "date_creation", "id"),
+    )
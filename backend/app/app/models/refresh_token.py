@@ -0,0 +1,22 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+
+from app.db.base_class import Base
+
+if TYPE_CHECKING:
+    from .user import User  # noqa: F401
+
+
+class RefreshToken(Base):
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False, index=True)
+    # the tokens rotated from one login, revoked together
+    family = Column(String(36), nullable=False, index=True)
+    # sha256 of the token, the token itself is only known to the client
+    token_hash = Column(String(64), nullable=False, unique=True)
+    expires_at = Column(DateTime(), nullable=False, index=True)
+    # set when exchanged, a second exchange means the token was stolen
+    used_at = Column(DateTime(), nullable=True)
+    revoked = Column(Boolean(), nullable=False, default=False)
+    date_creation = Column(DateTime(), nullable=False)
@@ -0,0 +1,23 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import JSON, Column, DateTime, Float, ForeignKey, Integer, String
+
+from app.db.base_class import Base
+
+if TYPE_CHECKING:
+    from .voice import Voice  # noqa: F401
+
+
+class Transcript(Base):
+    id = Column(Integer, primary_key=True, index=True)
+    voice_id = Column(Integer, ForeignKey("voice.id", ondelete="CASCADE"), nullable=False, unique=True)
+
+    # draft for the assistant writing the note
+    text = Column(String, nullable=False)
+    # [{"word", "start", "end", "conf"}], times in seconds in the recording
+    words = Column(JSON, nullable=False)
+    engine = Column(String, nullable=False)
+    # processing time over audio duration, per process
+    real_time_factor = Column(Float, nullable=True)
+
+    date_creation = Column(DateTime(), nullable=False)
@@ -17,5 +17,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean(), default=True)
     is_superuser = Column(Boolean(), default=False)
+    # bumped whenever a care team relationship of the user changes, stamped
+    # on the access tokens
+    relationship_version = Column(Integer, nullable=False, default=0, server_default="0")
     #items = relationship("Item", back_populates="owner")
     
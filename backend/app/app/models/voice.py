@@ -1,8 +1,9 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime, Boolean
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer, String, Boolean, DateTime, Boolean, Float, Index, event
 from sqlalchemy.orm import relationship
 
+from app.core import scheduler
 from app.db.base_class import Base
 
 if TYPE_CHECKING:
@@ -10,12 +11,24 @@ if TYPE_CHECKING:
 
 
 class Voice(Base):
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     
-    path = Column(String, index=True, nullable=False)
-    title = Column(String, index=True, nullable=True)
-    remarque = Column(String, index=True, nullable=True)
+    path = Column(String, nullable=False)
+    title = Column(String, nullable=True)
+    remarque = Column(String, nullable=True)
     note_created = Column(Boolean(), default=False)
+    # pending, processing, ready or failed, see app.worker.process_voice
+    processing_status = Column(String, nullable=False, default="pending")
+
+    # Read from the container headers, unknown (None) when the format is not
+    # understood. duration is in seconds, byte_size the size of the stored file
+    duration = Column(Float, nullable=True)
+    sample_rate = Column(Integer, nullable=True)
+    channels = Column(Integer, nullable=True)
+    codec = Column(String, nullable=True)
+    byte_size = Column(BigInteger, nullable=True)
+    # total of the speech segments (VoiceSegment), None until detected
+    speech_duration = Column(Float, nullable=True)
     
     doctor_id = Column(Integer, ForeignKey("user.id"))
     doctor = relationship("User", foreign_keys=[doctor_id], backref="voices")
@@ -23,4 +36,55 @@ class Voice(Base):
     patient_id = Column(Integer, ForeignKey("user.id"))
     patient = relationship("User", foreign_keys=[patient_id])
                     
-    date_creation = Column(DateTime(), nullable= False)
\ No newline at end of file
+    date_creation = Column(DateTime(), nullable= False)
+
+    # Work queue lease, see crud.voice_async.claim_next: the assistant working
+    # on the voice until lease_expires_at, when any other may claim it again
+    claimed_by = Column(Integer, ForeignKey("user.id"), nullable=True)
+    claimed_at = Column(DateTime(), nullable=True)
+    lease_expires_at = Column(DateTime(), nullable=True)
+
+    # Set by the doctor, the note is due_at and its work should start by
+    # start_by, the queue order, see app.core.scheduler.schedule
+    urgency = Column(String, nullable=False, default=scheduler.Urgency.routine.value)
+    due_at = Column(DateTime(), nullable=False)
+    start_by = Column(DateTime(), nullable=False)
+
+    __table_args__ = (
+        # "minutes of dictation pending" is answered from the index alone
+        Index("ix_voice_note_created_duration", "note_created", "duration"),
+        # the listings, filtered by one of the users and paginated on
+        # (date_creation, id), see app.core.pagination
+        Index("ix_voice_date_creation", "date_creation", "id"),
+        Index("ix_voice_doctor_id_date_creation", "doctor_id", "date_creation", "id"),
+        Index("ix_voice_patient_id_date_creation", "patient_id", "date_creation", "id"),
+        # voices waiting for their note, a small part of the table
+        Index(
+            "ix_voice_doctor_id_pending",
+            "doctor_id",
+            "date_creation",
+            "id",
+            postgresql_where=note_created == False,  # noqa: E712
+        ),
+        # the work queue, the pending voice to start first
+        Index(
+            "ix_voice_queue",
+            "start_by",
+            "id",
+            postgresql_where=note_created == False,  # noqa: E712
+        ),
+        # the leases an assistant holds, few at any time
+        Index(
+            "ix_voice_claimed_by",
+            "claimed_by",
+            "start_by",
+            "id",
+            postgresql_where=claimed_by.isnot(None),
+        ),
+    )
+
+
+@event.listens_for(Voice, "before_insert")
+def schedule_voice(mapper: Any, connection: Any, target: Voice) -> None:
+    if target.start_by is None:
+        scheduler.schedule(target)
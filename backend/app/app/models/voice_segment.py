@@ -0,0 +1,17 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Column, Float, ForeignKey, Integer
+
+from app.db.base_class import Base
+
+if TYPE_CHECKING:
+    from .voice import Voice  # noqa: F401
+
+
+class VoiceSegment(Base):
+    id = Column(Integer, primary_key=True, index=True)
+    voice_id = Column(Integer, ForeignKey("voice.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    # seconds from the start of the recording
+    start_time = Column(Float, nullable=False)
+    end_time = Column(Float, nullable=False)
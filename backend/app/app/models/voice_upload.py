@@ -0,0 +1,26 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String
+
+from app.db.base_class import Base
+
+if TYPE_CHECKING:
+    from .user import User  # noqa: F401
+
+
+class VoiceUpload(Base):
+    # uuid4, also the name of the partial file in VOICE_UPLOAD_DIR
+    id = Column(String(36), primary_key=True)
+    owner_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+
+    doctor_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    title = Column(String, nullable=True)
+    remarque = Column(String, nullable=True)
+    filename = Column(String, nullable=True)
+
+    length = Column(BigInteger, nullable=False)
+    offset = Column(BigInteger, nullable=False, default=0)
+
+    # expired uploads are looked up by age
+    date_creation = Column(DateTime(), nullable=False, index=True)
@@ -1,14 +1,18 @@
 from .item import Item, ItemCreate, ItemInDB, ItemUpdate
 from .msg import Msg
-from .token import Token, TokenPayload
+from .token import RefreshRequest, Token, TokenPayload
 from .user import User, UserCreate, UserInDB, UserUpdate
 from .user_assistant import Assistant, AssistantCreate, AssistantInDB, AssistantUpdate
 from .user_doctor import Doctor, DoctorCreate, DoctorInDB, DoctorUpdate
 from .user_manager import Manager, ManagerCreate, ManagerInDB, ManagerUpdate
 
-from .voice import Voice, VoiceCreate, VoiceInDB, VoiceUpdate
+from .voice import Voice, VoiceCreate, VoiceForecast, VoiceInDB, VoiceUpdate, VoiceUrgency
+from .voice_upload import VoiceUpload, VoiceUploadCreate, VoiceUploadInDB, VoiceUploadUpdate
+from .voice_segment import VoiceSegment, VoiceSegmentCreate, VoiceSegmentInDB, VoiceSegmentUpdate
+from .transcript import Transcript, TranscriptCreate, TranscriptInDB, TranscriptUpdate, TranscriptWord
 from .note import Note, NoteCreate, NoteInDB, NoteUpdate
 
 from .doctor_manager import DoctorManager, DoctorManagerCreate, DoctorManagerInDB, DoctorManagerUpdate
 from .doctor_patient import DoctorPatient, DoctorPatientCreate, DoctorPatientInDB, DoctorPatientUpdate
 from .assistant_manager import AssistantManager, AssistantManagerCreate, AssistantManagerInDB, AssistantManagerUpdate
+from .blob import Blob, BlobCreate, BlobInDB, BlobUpdate
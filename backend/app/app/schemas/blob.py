@@ -0,0 +1,39 @@
+from typing import Optional
+
+from pydantic import BaseModel
+from datetime import datetime
+
+
+# Shared properties
+class BlobBase(BaseModel):
+    size: int
+
+
+# Properties to receive on blob creation
+class BlobCreate(BlobBase):
+    id: str
+
+
+# Properties to receive on blob update
+class BlobUpdate(BaseModel):
+    refcount: Optional[int] = None
+
+
+# Properties shared by models stored in DB
+class BlobInDBBase(BlobBase):
+    id: str
+    refcount: int
+    date_creation: datetime
+
+    class Config:
+        orm_mode = True
+
+
+# Properties to return to client
+class Blob(BlobInDBBase):
+    pass
+
+
+# Properties properties stored in DB
+class BlobInDB(BlobInDBBase):
+    pass
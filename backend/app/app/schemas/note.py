@@ -35,8 +35,9 @@ class NoteInDBBase(NoteBase):
     validated : bool
     assistant_id : int
     date_creation : datetime
-    modifier_id : int
-    date_modification : datetime
+    # not modified yet
+    modifier_id : Optional[int] = None
+    date_modification : Optional[datetime] = None
 
     class Config:
         orm_mode = True
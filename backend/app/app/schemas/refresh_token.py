@@ -0,0 +1,22 @@
+from typing import Optional
+
+from pydantic import BaseModel
+from datetime import datetime
+
+
+# Shared properties
+class RefreshTokenBase(BaseModel):
+    user_id: int
+    family: str
+
+
+# Properties to receive on refresh token creation
+class RefreshTokenCreate(RefreshTokenBase):
+    token_hash: str
+    expires_at: datetime
+
+
+# Properties to receive on refresh token update
+class RefreshTokenUpdate(BaseModel):
+    used_at: Optional[datetime] = None
+    revoked: Optional[bool] = None
@@ -6,7 +6,19 @@ from pydantic import BaseModel
 class Token(BaseModel):
     access_token: str
     token_type: str
+    # seconds the access token is valid for
+    expires_in: Optional[int] = None
+    # exchanged once at /login/refresh-token for a new pair
+    refresh_token: Optional[str] = None
 
 
 class TokenPayload(BaseModel):
     sub: Optional[int] = None
+    # absent from the tokens issued before they carried the claims
+    role: Optional[str] = None
+    su: Optional[bool] = None
+    rv: Optional[int] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
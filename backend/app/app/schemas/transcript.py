@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class TranscriptWord(BaseModel):
+    word : str
+    start : float
+    end : float
+    conf : float
+
+
+# Shared properties
+class TranscriptBase(BaseModel):
+    text : str
+    words : List[TranscriptWord]
+
+
+# Properties to receive on transcript creation
+class TranscriptCreate(TranscriptBase):
+    voice_id : int
+    engine : str
+    real_time_factor : Optional[float] = None
+
+
+# Properties to receive on transcript update
+class TranscriptUpdate(BaseModel):
+    text : str
+
+
+# Properties shared by models stored in DB
+class TranscriptInDBBase(TranscriptBase):
+    id: int
+    voice_id : int
+    engine : str
+    date_creation : datetime
+
+    class Config:
+        orm_mode = True
+
+
+# Properties to return to client
+class Transcript(TranscriptInDBBase):
+    pass
+
+
+# Properties properties stored in DB
+class TranscriptInDB(TranscriptInDBBase):
+    real_time_factor : Optional[float] = None
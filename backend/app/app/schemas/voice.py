@@ -3,6 +3,8 @@ from typing import Optional
 from pydantic import BaseModel
 from datetime import datetime
 
+from app.core.scheduler import Urgency
+
 from .user_doctor import Doctor
 from .user_patient import Patient
 
@@ -18,6 +20,12 @@ class VoiceCreate(VoiceBase):
     patient_id : int
     title: Optional[str] = None
     remarque : Optional[str] = None
+    duration : Optional[float] = None
+    sample_rate : Optional[int] = None
+    channels : Optional[int] = None
+    codec : Optional[str] = None
+    byte_size : Optional[int] = None
+    urgency : Urgency = Urgency.routine
 
 
 # Properties to receive on item update
@@ -25,6 +33,11 @@ class VoiceUpdate(VoiceBase):
     pass
 
 
+# Properties to receive on a change of urgency
+class VoiceUrgency(BaseModel):
+    urgency : Urgency
+
+
 # Properties shared by models stored in DB
 class VoiceInDBBase(VoiceBase):
     id: int
@@ -33,6 +46,18 @@ class VoiceInDBBase(VoiceBase):
     title: Optional[str]=None
     date_creation : datetime
     note_created : bool = False
+    processing_status : Optional[str] = None
+    duration : Optional[float] = None
+    sample_rate : Optional[int] = None
+    channels : Optional[int] = None
+    codec : Optional[str] = None
+    byte_size : Optional[int] = None
+    speech_duration : Optional[float] = None
+    claimed_by : Optional[int] = None
+    lease_expires_at : Optional[datetime] = None
+    urgency : Urgency = Urgency.routine
+    due_at : Optional[datetime] = None
+    start_by : Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -46,3 +71,13 @@ class Voice(VoiceInDBBase):
 # Properties properties stored in DB
 class VoiceInDB(VoiceInDBBase):
     pass
+
+
+# Predicted completion of a pending voice, see app.core.scheduler.forecast
+class VoiceForecast(BaseModel):
+    voice_id : int
+    assistant_id : Optional[int] = None
+    start : Optional[datetime] = None
+    completion : Optional[datetime] = None
+    due_at : datetime
+    late : bool = False
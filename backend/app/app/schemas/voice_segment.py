@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+
+
+# Shared properties
+class VoiceSegmentBase(BaseModel):
+    start_time : float
+    end_time : float
+
+
+# Properties to receive on segment creation
+class VoiceSegmentCreate(VoiceSegmentBase):
+    voice_id : int
+
+
+# Properties to receive on segment update
+class VoiceSegmentUpdate(VoiceSegmentBase):
+    pass
+
+
+# Properties shared by models stored in DB
+class VoiceSegmentInDBBase(VoiceSegmentBase):
+    id: int
+    voice_id : int
+
+    class Config:
+        orm_mode = True
+
+
+# Properties to return to client
+class VoiceSegment(VoiceSegmentInDBBase):
+    pass
+
+
+# Properties properties stored in DB
+class VoiceSegmentInDB(VoiceSegmentInDBBase):
+    pass
@@ -0,0 +1,45 @@
+from typing import Optional
+
+from pydantic import BaseModel, conint
+from datetime import datetime
+
+
+# Shared properties
+class VoiceUploadBase(BaseModel):
+    doctor_id : int
+    patient_id : int
+    title: Optional[str] = None
+    remarque : Optional[str] = None
+    filename : Optional[str] = None
+
+
+# Properties to receive on upload creation
+class VoiceUploadCreate(VoiceUploadBase):
+    # total size of the recording in bytes
+    length : conint(gt=0)  # type: ignore
+
+
+# Properties to receive on upload update
+class VoiceUploadUpdate(BaseModel):
+    offset : int
+
+
+# Properties shared by models stored in DB
+class VoiceUploadInDBBase(VoiceUploadBase):
+    id: str
+    length : int
+    offset : int
+    date_creation : datetime
+
+    class Config:
+        orm_mode = True
+
+
+# Properties to return to client
+class VoiceUpload(VoiceUploadInDBBase):
+    pass
+
+
+# Properties properties stored in DB
+class VoiceUploadInDB(VoiceUploadInDBBase):
+    owner_id : int
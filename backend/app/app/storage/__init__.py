@@ -0,0 +1,23 @@
+from app.core.config import settings
+
+from .base import StorageBackend, StorageStat, StorageWriter
+from .local import LocalStorage
+from .s3 import S3Storage
+
+
+def get_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(
+            settings.S3_BUCKET,  # type: ignore
+            prefix=settings.S3_PREFIX,
+            part_size=settings.S3_PART_SIZE,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        )
+    return LocalStorage(settings.VOICE_STORAGE_DIR)
+
+
+storage = get_storage()
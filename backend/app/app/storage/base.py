@@ -0,0 +1,66 @@
+from typing import Iterator, NamedTuple, Optional
+
+
+class StorageStat(NamedTuple):
+    size: int
+    mtime: float
+
+
+class StorageWriter:
+    """
+    Streaming writer for a new object whose key is only known once all the data
+    has been written (content addressing). The data is hashed with SHA-256 as it
+    is written. Nothing is visible under `key` before `commit`.
+    """
+
+    size: int
+
+    async def write(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    async def hexdigest(self) -> str:
+        """Flush pending data and return the SHA-256 of everything written."""
+        raise NotImplementedError
+
+    async def commit(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def abort(self) -> None:
+        """Drop everything written, the writer cannot be used anymore."""
+        raise NotImplementedError
+
+
+class StorageBackend:
+    """
+    Object storage used for the voice recordings. Keys are relative paths using
+    "/" as separator.
+    """
+
+    def open_writer(self) -> StorageWriter:
+        raise NotImplementedError
+
+    def put_file(self, src: str, key: str) -> None:
+        """Store the local file `src` under `key`, `src` is consumed."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def stat(self, key: str) -> StorageStat:
+        """Raise FileNotFoundError when there is no object at `key`."""
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        raise NotImplementedError
+
+    def get(self, key: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        size = self.stat(key).size
+        for start in range(0, size, chunk_size):
+            yield self.read_range(key, start, min(chunk_size, size - start))
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Path of the object on the local filesystem, if it has one."""
+        return None
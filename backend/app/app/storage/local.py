@@ -0,0 +1,136 @@
+import errno
+import hashlib
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.base import StorageBackend, StorageStat, StorageWriter
+
+# Bytes accumulated before handing a write to the threadpool. Large writes keep
+# the number of awaits and syscalls per upload small.
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class LocalWriter(StorageWriter):
+    """
+    Write into a temporary file of the storage root, hashing the data as it
+    goes. The temporary file is on the same filesystem as its destination so
+    `commit` is a single atomic rename.
+    """
+
+    def __init__(self, storage: "LocalStorage", buffer_size: int = WRITE_BUFFER_SIZE):
+        self.storage = storage
+        self.buffer_size = buffer_size
+        self.tmp_path = os.path.join(storage.root, f".{uuid.uuid4()}.part")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._buffer = bytearray()
+        self._fd: Optional[int] = os.open(
+            self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644
+        )
+
+    async def write(self, data: bytes) -> None:
+        self._buffer += data
+        if len(self._buffer) >= self.buffer_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        await run_in_threadpool(self._write_all, data)
+
+    def _write_all(self, data: bytes) -> None:
+        # hashlib releases the GIL on large buffers, so hashing here keeps the
+        # CPU work off the event loop as well
+        self.sha256.update(data)
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)  # type: ignore
+            view = view[written:]
+        self.size += len(data)
+
+    async def hexdigest(self) -> str:
+        await self.flush()
+        return self.sha256.hexdigest()
+
+    def _finish(self, path: str) -> None:
+        os.fsync(self._fd)  # type: ignore
+        os.close(self._fd)  # type: ignore
+        self._fd = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.tmp_path, path)
+
+    async def commit(self, key: str) -> None:
+        await self.flush()
+        await run_in_threadpool(self._finish, self.storage.path(key))
+
+    async def abort(self) -> None:
+        await run_in_threadpool(self._discard)
+
+    def _discard(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        # Voices uploaded before the blob store keep their absolute path
+        if os.path.isabs(key):
+            return key
+        return os.path.join(self.root, *key.split("/"))
+
+    def open_writer(self) -> LocalWriter:
+        return LocalWriter(self)
+
+    def put_file(self, src: str, key: str) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(src, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # src is on another filesystem, copy it next to its destination
+            # first so the blob still appears atomically
+            tmp_path = os.path.join(self.root, f".{uuid.uuid4()}.part")
+            try:
+                shutil.copyfile(src, tmp_path)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            os.remove(src)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def stat(self, key: str) -> StorageStat:
+        stat_result = os.stat(self.path(key))
+        return StorageStat(size=stat_result.st_size, mtime=stat_result.st_mtime)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        with open(self.path(key), "rb", buffering=0) as f:
+            return os.pread(f.fileno(), length, start)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self.path(key)
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import Any, Iterator, List
+
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.base import StorageBackend, StorageStat, StorageWriter
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: nocover
+    boto3 = None
+    TransferConfig = None
+    ClientError = None
+
+# S3 refuses multipart parts smaller than this, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3Writer(StorageWriter):
+    """
+    Stream an object into S3 with a multipart upload. Parts are sent while the
+    request body is still being received, at most `max_concurrency` at a time,
+    which also bounds the memory held per upload.
+
+    The upload goes to a staging key because the final (content addressed) key
+    is only known at the end. `commit` then does a server side copy. Objects
+    smaller than one part are sent with a single PUT at commit instead.
+    """
+
+    def __init__(self, storage: "S3Storage"):
+        self.storage = storage
+        self.staging_key = storage.object_key(f"tmp/{uuid.uuid4()}")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._buffer = bytearray()
+        self._tail_hashed = False
+        self._upload_id = None
+        self._parts: List["asyncio.Future[Any]"] = []
+        self._slots = asyncio.Semaphore(storage.max_concurrency)
+
+    async def write(self, data: bytes) -> None:
+        assert not self._tail_hashed, "write after hexdigest"
+        self._buffer += data
+        while len(self._buffer) >= self.storage.part_size:
+            part = bytes(self._buffer[: self.storage.part_size])
+            del self._buffer[: self.storage.part_size]
+            await self._send_part(part)
+
+    async def _send_part(self, data: bytes) -> None:
+        client = self.storage.client
+        await run_in_threadpool(self.sha256.update, data)
+        self.size += len(data)
+        if self._upload_id is None:
+            response = await run_in_threadpool(
+                client.create_multipart_upload,
+                Bucket=self.storage.bucket,
+                Key=self.staging_key,
+            )
+            self._upload_id = response["UploadId"]
+        await self._slots.acquire()
+        number = len(self._parts) + 1
+        self._parts.append(asyncio.ensure_future(self._upload_part(number, data)))
+
+    async def _upload_part(self, number: int, data: bytes) -> dict:
+        try:
+            response = await run_in_threadpool(
+                self.storage.client.upload_part,
+                Bucket=self.storage.bucket,
+                Key=self.staging_key,
+                UploadId=self._upload_id,
+                PartNumber=number,
+                Body=data,
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        finally:
+            self._slots.release()
+
+    async def hexdigest(self) -> str:
+        if not self._tail_hashed:
+            await run_in_threadpool(self.sha256.update, bytes(self._buffer))
+            self.size += len(self._buffer)
+            self._tail_hashed = True
+        return self.sha256.hexdigest()
+
+    async def commit(self, key: str) -> None:
+        await self.hexdigest()
+        client, bucket = self.storage.client, self.storage.bucket
+        tail = bytes(self._buffer)
+        self._buffer.clear()
+        if self._upload_id is None:
+            await run_in_threadpool(
+                client.put_object, Bucket=bucket, Key=self.storage.object_key(key), Body=tail
+            )
+            return
+        if tail:
+            await self._slots.acquire()
+            number = len(self._parts) + 1
+            self._parts.append(asyncio.ensure_future(self._upload_part(number, tail)))
+        parts = await asyncio.gather(*self._parts)
+        await run_in_threadpool(
+            client.complete_multipart_upload,
+            Bucket=bucket,
+            Key=self.staging_key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        self._upload_id = None
+        try:
+            await run_in_threadpool(
+                client.copy,
+                {"Bucket": bucket, "Key": self.staging_key},
+                bucket,
+                self.storage.object_key(key),
+                Config=self.storage.transfer_config,
+            )
+        finally:
+            await run_in_threadpool(
+                client.delete_object, Bucket=bucket, Key=self.staging_key
+            )
+
+    async def abort(self) -> None:
+        # cancelling does not stop a part the threadpool is sending, and one
+        # finishing after the abort would keep its storage
+        await asyncio.gather(*self._parts, return_exceptions=True)
+        self._parts = []
+        if self._upload_id is not None:
+            try:
+                await run_in_threadpool(
+                    self.storage.client.abort_multipart_upload,
+                    Bucket=self.storage.bucket,
+                    Key=self.staging_key,
+                    UploadId=self._upload_id,
+                )
+            except ClientError:
+                pass
+            self._upload_id = None
+
+
+class S3Storage(StorageBackend):
+    """
+    Storage on any S3 compatible service (AWS, MinIO, ...), shared by all the
+    API nodes.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        *,
+        prefix: str = "",
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        **client_kwargs: Any,
+    ):
+        assert boto3 is not None, "'boto3' must be installed to use the S3 storage"
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_concurrency = max_concurrency
+        self.client = boto3.client("s3", **client_kwargs)
+        self.transfer_config = TransferConfig(
+            multipart_chunksize=self.part_size, max_concurrency=max_concurrency
+        )
+
+    def object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def open_writer(self) -> S3Writer:
+        return S3Writer(self)
+
+    def put_file(self, src: str, key: str) -> None:
+        self.client.upload_file(
+            src, self.bucket, self.object_key(key), Config=self.transfer_config
+        )
+        os.remove(src)
+
+    def _head(self, key: str) -> dict:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(key)
+            raise
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._head(key)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def stat(self, key: str) -> StorageStat:
+        head = self._head(key)
+        return StorageStat(
+            size=head["ContentLength"], mtime=head["LastModified"].timestamp()
+        )
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self.object_key(key),
+            Range=f"bytes={start}-{start + length - 1}",
+        )
+        return response["Body"].read()
+
+    def get(self, key: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        return response["Body"].iter_chunks(chunk_size)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
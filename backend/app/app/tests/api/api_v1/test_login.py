@@ -26,3 +26,33 @@ def test_use_access_token(
     result = r.json()
     assert r.status_code == 200
     assert "email" in result
+
+
+def test_refresh_token_rotates(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    tokens = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data).json()
+    assert tokens["refresh_token"]
+    r = client.post(
+        f"{settings.API_V1_STR}/login/refresh-token",
+        json={"refresh_token": tokens["refresh_token"]},
+    )
+    assert r.status_code == 200
+    renewed = r.json()
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    r = client.post(f"{settings.API_V1_STR}/login/test-token", headers=headers)
+    assert r.status_code == 200
+    # the first refresh token was used, using it again ends the session
+    r = client.post(
+        f"{settings.API_V1_STR}/login/refresh-token",
+        json={"refresh_token": tokens["refresh_token"]},
+    )
+    assert r.status_code == 401
+    r = client.post(
+        f"{settings.API_V1_STR}/login/refresh-token",
+        json={"refresh_token": renewed["refresh_token"]},
+    )
+    assert r.status_code == 401
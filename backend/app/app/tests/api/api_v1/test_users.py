@@ -54,6 +54,7 @@ def test_get_existing_user(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = crud.user.create(db, obj_in=user_in)
+    db.commit()
     user_id = user.id
     r = client.get(
         f"{settings.API_V1_STR}/users/{user_id}", headers=superuser_token_headers,
@@ -73,6 +74,7 @@ def test_create_user_existing_username(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     crud.user.create(db, obj_in=user_in)
+    db.commit()
     data = {"email": username, "password": password}
     r = client.post(
         f"{settings.API_V1_STR}/users/", headers=superuser_token_headers, json=data,
@@ -106,6 +108,7 @@ def test_retrieve_users(
     password2 = random_lower_string()
     user_in2 = UserCreate(email=username2, password=password2)
     crud.user.create(db, obj_in=user_in2)
+    db.commit()
 
     r = client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers)
     all_users = r.json()
@@ -0,0 +1,35 @@
+from typing import Dict
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_db_pool_stats(
+    client: TestClient, superuser_token_headers: Dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/utils/db-pool/", headers=superuser_token_headers)
+    assert r.status_code == 200
+    stats = r.json()
+    assert {"sync", "async", "replicas", "replica_pools"} <= set(stats)
+    # the login of the fixture connected to the database
+    assert stats["sync"]["connects"] + stats["async"]["connects"] >= 1
+
+
+def test_db_pool_stats_normal_user(
+    client: TestClient, normal_user_token_headers: Dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/utils/db-pool/", headers=normal_user_token_headers)
+    assert r.status_code == 400
+
+
+def test_password_hashing_stats(
+    client: TestClient, superuser_token_headers: Dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/utils/password-hashing/", headers=superuser_token_headers)
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["max_pending"] == settings.PASSWORD_HASH_MAX_PENDING
+    assert stats["pending"] >= 0 and stats["queued"] >= 0
+    # the login of the fixture verified a password
+    assert stats["completed"] >= 1
@@ -0,0 +1,71 @@
+from typing import Generator, List
+
+import pytest
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.responses import JSONResponse
+
+from app.api import unit_of_work
+from app.api.unit_of_work import UnitOfWorkRoute
+from app.db.base import Base
+from app.db.session import after_commit, after_rollback
+from app.models.user import User
+
+
+@pytest.fixture
+def setup(tmp_path) -> Generator:  # type: ignore
+    # sessions are used from the threadpool and from the event loop
+    engine = create_engine(f"sqlite:///{tmp_path}/app.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    committed: List[str] = []
+    rolled_back: List[str] = []
+
+    def get_db(request: Request) -> Generator:
+        db = SessionLocal()
+        unit_of_work.register(request, db)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def add_user(db: Session, email: str) -> None:
+        db.add(User(email=email, hashed_password="x"))
+        db.flush()
+        after_commit(db, lambda: committed.append(email))
+        after_rollback(db, lambda: rolled_back.append(email))
+
+    router = APIRouter(route_class=UnitOfWorkRoute)
+
+    @router.post("/ok")
+    def ok(db: Session = Depends(get_db)) -> dict:
+        add_user(db, "ok@example.com")
+        add_user(db, "ok2@example.com")
+        return {}
+
+    @router.post("/fails")
+    def fails(db: Session = Depends(get_db)) -> dict:
+        add_user(db, "fails@example.com")
+        raise HTTPException(status_code=409)
+
+    @router.post("/error-response")
+    def error_response(db: Session = Depends(get_db)) -> JSONResponse:
+        add_user(db, "error@example.com")
+        return JSONResponse({}, status_code=400)
+
+    app = FastAPI()
+    app.include_router(router)
+    yield TestClient(app), SessionLocal, committed, rolled_back
+
+
+def test_one_commit_per_request(setup) -> None:  # type: ignore
+    client, SessionLocal, committed, rolled_back = setup
+    assert client.post("/ok").status_code == 200
+    assert client.post("/fails").status_code == 409
+    assert client.post("/error-response").status_code == 400
+    db = SessionLocal()
+    assert sorted(email for email, in db.query(User.email)) == ["ok2@example.com", "ok@example.com"]
+    assert committed == ["ok@example.com", "ok2@example.com"]
+    assert rolled_back == ["fails@example.com", "error@example.com"]
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Generator
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.access_graph import AccessGraph
+from app.db.base import Base
+from app.models.assistant_manager import AssistantManager
+from app.models.doctor_manager import DoctorManager
+from app.models.doctor_patient import DoctorPatient
+
+DOCTOR, OTHER_DOCTOR, PATIENT, MANAGER, ASSISTANT, STRANGER = 1, 2, 3, 4, 5, 6
+
+
+def user(id: int, is_superuser: bool = False) -> SimpleNamespace:
+    return SimpleNamespace(id=id, is_superuser=is_superuser)
+
+
+def voice(doctor_id: int = DOCTOR, patient_id: int = PATIENT) -> SimpleNamespace:
+    return SimpleNamespace(doctor_id=doctor_id, patient_id=patient_id)
+
+
+def seed(session: Session) -> None:
+    session.add_all(
+        [
+            DoctorManager(doctor_id=DOCTOR, manager_id=MANAGER),
+            DoctorPatient(doctor_id=DOCTOR, patient_id=PATIENT),
+            AssistantManager(assistant_id=ASSISTANT, manager_id=MANAGER),
+        ]
+    )
+    session.commit()
+
+
+@pytest.fixture
+def db() -> Generator:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = Session(bind=engine)
+    seed(session)
+    yield session
+    session.close()
+
+
+def test_load_and_access(db: Session) -> None:
+    graph = AccessGraph(ttl=60)
+    graph.ensure_loaded(db)
+    assert graph.can_access_voice(user(DOCTOR), voice())
+    assert graph.can_access_voice(user(PATIENT), voice())
+    assert graph.can_access_voice(user(MANAGER), voice())
+    assert graph.can_access_voice(user(ASSISTANT), voice())
+    assert graph.can_access_voice(user(STRANGER, is_superuser=True), voice())
+    assert not graph.can_access_voice(user(STRANGER), voice())
+    assert not graph.can_access_voice(user(ASSISTANT), voice(doctor_id=OTHER_DOCTOR))
+    assert graph.is_doctor_of_patient(DOCTOR, PATIENT)
+    assert not graph.is_doctor_of_patient(OTHER_DOCTOR, PATIENT)
+    assert graph.manages_assistant(MANAGER, ASSISTANT)
+
+
+def test_set_edge(db: Session) -> None:
+    graph = AccessGraph(ttl=60)
+    graph.load(db)
+    graph.set_edge("doctor_manager", OTHER_DOCTOR, MANAGER, True)
+    assert graph.can_access_voice(user(ASSISTANT), voice(doctor_id=OTHER_DOCTOR))
+    graph.set_edge("assistant_manager", ASSISTANT, MANAGER, False)
+    assert not graph.can_access_voice(user(ASSISTANT), voice())
+    assert graph.can_access_voice(user(MANAGER), voice())
+
+
+def test_refresh_edge_reads_the_database(db: Session) -> None:
+    graph = AccessGraph(ttl=60)
+    graph.load(db)
+    db.query(DoctorPatient).delete()
+    db.add(DoctorPatient(doctor_id=OTHER_DOCTOR, patient_id=PATIENT))
+    db.commit()
+    graph.refresh_edge(db, "doctor_patient", DOCTOR, PATIENT)
+    graph.refresh_edge(db, "doctor_patient", OTHER_DOCTOR, PATIENT)
+    assert not graph.is_doctor_of_patient(DOCTOR, PATIENT)
+    assert graph.is_doctor_of_patient(OTHER_DOCTOR, PATIENT)
+
+
+def test_changes_during_load_are_kept(db: Session) -> None:
+    graph = AccessGraph(ttl=60)
+    query = db.query
+
+    def query_then_revoke(*args):  # type: ignore
+        # a relationship removed by another request while the graph is read
+        graph.set_edge("doctor_manager", DOCTOR, MANAGER, False)
+        return query(*args)
+
+    db.query = query_then_revoke  # type: ignore
+    graph.load(db)
+    assert not graph.manages_doctor(MANAGER, DOCTOR)
+
+
+def test_ttl(db: Session) -> None:
+    graph = AccessGraph(ttl=-1)
+    graph.ensure_loaded(db)
+    db.add(DoctorManager(doctor_id=OTHER_DOCTOR, manager_id=MANAGER))
+    db.commit()
+    graph.ensure_loaded(db)
+    assert graph.manages_doctor(MANAGER, OTHER_DOCTOR)
+
+
+def test_concurrent_async_loads(tmp_path: Path) -> None:
+    # a file, the threadpool sessions see the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'graph.db'}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    session = session_factory()
+    seed(session)
+    session.close()
+    graph = AccessGraph(ttl=60)
+    loads = []
+    load = graph.load
+
+    def counted_load(db: Session) -> None:
+        loads.append(threading.current_thread())
+        load(db)
+
+    graph.load = counted_load  # type: ignore
+
+    async def two_requests() -> None:
+        # both find the graph cold, neither may block the event loop
+        await asyncio.wait_for(
+            asyncio.gather(graph.ensure_loaded_async(session_factory), graph.ensure_loaded_async(session_factory)),
+            timeout=10,
+        )
+
+    asyncio.run(two_requests())
+    # once, in the threadpool
+    assert len(loads) == 1 and loads[0] is not threading.main_thread()
+    assert graph.can_access_voice(user(ASSISTANT), voice())
+    asyncio.run(graph.ensure_loaded_async(session_factory))
+    assert len(loads) == 1
@@ -0,0 +1,26 @@
+from app.core.asr import Word, plan_chunks, words_to_text
+
+
+def test_plan_chunks_groups_segments_up_to_the_limit() -> None:
+    segments = [(0.5, 4.0), (5.0, 12.0), (13.0, 31.0), (40.0, 41.0)]
+    assert plan_chunks(segments, 30) == [(0.5, 12.0), (13.0, 41.0)]
+
+
+def test_plan_chunks_cuts_long_segments() -> None:
+    assert plan_chunks([(1.0, 70.0), (71.0, 72.0)], 30) == [
+        (1.0, 31.0),
+        (31.0, 61.0),
+        (61.0, 72.0),
+    ]
+    assert plan_chunks([], 30) == []
+
+
+def test_words_to_text() -> None:
+    words = [
+        Word("patient", 0.5, 0.9, 1.0),
+        Word("stable", 1.0, 1.4, 0.9),
+        Word("next", 4.0, 4.3, 1.0),
+        Word("visit", 4.4, 4.8, 0.8),
+    ]
+    assert words_to_text(words) == "patient stable\n\nnext visit"
+    assert words_to_text([]) == ""
@@ -0,0 +1,127 @@
+import struct
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from app.core.audio_metadata import AudioMetadata, AudioProbe, probe_file
+
+
+def stream(data: bytes, chunk_size: int = 1000) -> AudioMetadata:
+    probe = AudioProbe()
+    for i in range(0, len(data), chunk_size):
+        probe.feed(data[i : i + chunk_size])
+    return probe.result()
+
+
+def wav(seconds: float, rate: int = 16000, channels: int = 1, data_size=None) -> bytes:
+    samples = b"\0" * int(seconds * rate) * 2 * channels
+    header = b"RIFF" + struct.pack("<I", 36 + len(samples)) + b"WAVE"
+    header += b"fmt " + struct.pack(
+        "<IHHIIHH", 16, 1, channels, rate, rate * 2 * channels, 2 * channels, 16
+    )
+    size = len(samples) if data_size is None else data_size
+    return header + b"data" + struct.pack("<I", size) + samples
+
+
+def ogg_page(granule: int, packet: bytes, sequence: int) -> bytes:
+    lacing = [255] * (len(packet) // 255) + [len(packet) % 255]
+    return (
+        b"OggS\0\0"
+        + struct.pack("<qIIIB", granule, 1, sequence, 0, len(lacing))
+        + bytes(lacing)
+        + packet
+    )
+
+
+def box(kind: bytes, *children: bytes) -> bytes:
+    body = b"".join(children)
+    return struct.pack(">I", 8 + len(body)) + kind + body
+
+
+def ebml(element_id: int, body: bytes) -> bytes:
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    return id_bytes + bytes([0x80 | len(body)]) + body if len(body) < 127 else (
+        id_bytes + (0x4000 | len(body)).to_bytes(2, "big") + body
+    )
+
+
+def test_wav() -> None:
+    meta = stream(wav(2.5, rate=8000, channels=2))
+    assert meta.codec == "pcm_s16le"
+    assert meta.sample_rate == 8000
+    assert meta.channels == 2
+    assert meta.duration == pytest.approx(2.5)
+    assert meta.byte_size == len(wav(2.5, rate=8000, channels=2))
+
+
+def test_wav_streamed_without_size() -> None:
+    # a phone recorder that never went back to write the data size
+    meta = stream(wav(3, data_size=0xFFFFFFFF))
+    assert meta.duration == pytest.approx(3)
+
+
+def test_ogg_opus() -> None:
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, 312, 16000, 0, 0)
+    pages = [ogg_page(0, head, 0), ogg_page(0, b"OpusTags" + b"\0" * 8, 1)]
+    pages += [ogg_page(312 + 48000 * i, b"\0" * 400, i + 1) for i in range(1, 301)]
+    meta = stream(b"".join(pages))
+    assert meta.codec == "opus"
+    assert meta.channels == 1
+    assert meta.sample_rate == 16000
+    assert meta.duration == pytest.approx(300)
+
+
+def test_mp4_with_moov_after_media() -> None:
+    mdhd = box(b"mdhd", struct.pack(">B3xIIII", 0, 0, 0, 44100, 44100 * 90), b"\0" * 4)
+    hdlr = box(b"hdlr", b"\0" * 8, b"soun", b"\0" * 12)
+    entry = box(b"mp4a", b"\0" * 6, struct.pack(">H", 1), b"\0" * 8,
+                struct.pack(">HHHHI", 2, 16, 0, 0, 44100 << 16))
+    stsd = box(b"stsd", struct.pack(">II", 0, 1), entry)
+    trak = box(b"trak", box(b"mdia", mdhd, hdlr, box(b"minf", box(b"stbl", stsd))))
+    data = box(b"ftyp", b"M4A \0\0\0\0") + box(b"mdat", b"\0" * 500000) + box(b"moov", trak)
+    meta = stream(data, chunk_size=4096)
+    assert meta.codec == "aac"
+    assert meta.channels == 2
+    assert meta.sample_rate == 44100
+    assert meta.duration == pytest.approx(90)
+
+
+def test_webm() -> None:
+    header = ebml(0x1A45DFA3, ebml(0x4282, b"webm"))
+    info = ebml(0x1549A966, ebml(0x2AD7B1, (1000000).to_bytes(3, "big"))
+                + ebml(0x4489, struct.pack(">d", 12500.0)))
+    audio = ebml(0xE1, ebml(0xB5, struct.pack(">f", 48000.0)) + ebml(0x9F, b"\x01"))
+    track = ebml(0xAE, ebml(0x83, b"\x02") + ebml(0x86, b"A_OPUS") + audio)
+    segment = info + ebml(0x1654AE6B, track)
+    # live recordings have a segment of unknown size
+    data = header + b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff" + segment
+    meta = stream(data + b"\x1f\x43\xb6\x75\x01\xff\xff\xff\xff\xff\xff\xff" + b"\0" * 1000)
+    assert meta.codec == "opus"
+    assert meta.channels == 1
+    assert meta.sample_rate == 48000
+    assert meta.duration == pytest.approx(12.5)
+
+
+def test_unknown_and_truncated() -> None:
+    assert stream(b"not audio at all") == AudioMetadata(None, None, None, None, 16)
+    meta = stream(wav(1)[:30])
+    assert meta.duration is None
+    assert meta.byte_size == 30
+
+
+def test_probe_file_skips(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 2, 0, 48000, 0, 0)
+    pages = [ogg_page(0, head, 0)]
+    pages += [ogg_page(48000 * i, b"\0" * 60000, i) for i in range(1, 101)]
+    path = tmp_path / "voice.ogg"
+    path.write_bytes(b"".join(pages))
+
+    fed: List[int] = []
+    feed = AudioProbe.feed
+    monkeypatch.setattr(AudioProbe, "feed", lambda self, data: fed.append(len(data)) or feed(self, data))
+    meta = probe_file(str(path))
+    assert meta.duration == pytest.approx(100)
+    assert meta.channels == 2
+    assert meta.byte_size == path.stat().st_size
+    assert sum(fed) < path.stat().st_size / 10
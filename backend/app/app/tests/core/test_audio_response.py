@@ -0,0 +1,72 @@
+import asyncio
+from pathlib import Path
+from typing import Dict, List
+
+from starlette.datastructures import Headers
+
+from app.core.audio_response import AudioFileResponse, accel_redirect_uri, parse_range
+from app.storage import LocalStorage
+
+
+def test_parse_range() -> None:
+    assert parse_range("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range("bytes=0-5000", 1000) == [(0, 999)]
+    assert parse_range("bytes=10-20, 0-15, 500-600", 1000) == [(0, 20), (500, 600)]
+    assert parse_range("bytes=2000-", 1000) == []
+    assert parse_range("bytes=20-10", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+
+
+def fetch(response: AudioFileResponse) -> bytes:
+    messages: List[Dict] = []
+
+    async def send(message: Dict) -> None:
+        messages.append(message)
+
+    scope = {"type": "http", "extensions": {}}
+    asyncio.run(response(scope, None, send))  # type: ignore
+    return b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def make_response(path: Path, **headers: str) -> AudioFileResponse:
+    storage = LocalStorage(str(path.parent))
+    return AudioFileResponse(
+        storage, path.name, request_headers=Headers(headers), etag='"abc"'
+    )
+
+
+def test_audio_response_ranges(tmp_path: Path) -> None:
+    path = tmp_path / "voice"
+    path.write_bytes(b"RIFF" + bytes(range(96)))
+
+    full = make_response(path)
+    assert full.status_code == 200
+    assert full.headers["content-type"] == "audio/wav"
+    assert fetch(full) == path.read_bytes()
+
+    single = make_response(path, range="bytes=4-7")
+    assert single.status_code == 206
+    assert single.headers["content-range"] == "bytes 4-7/100"
+    assert fetch(single) == bytes(range(4))
+
+    multi = make_response(path, range="bytes=0-1,98-")
+    body = fetch(multi)
+    assert multi.status_code == 206
+    assert int(multi.headers["content-length"]) == len(body)
+    assert b"Content-Range: bytes 0-1/100\r\n\r\nRI\r\n" in body
+    assert b"Content-Range: bytes 98-99/100\r\n\r\n" + bytes([94, 95]) in body
+
+    assert make_response(path, range="bytes=200-").status_code == 416
+    assert make_response(path, **{"if-none-match": '"abc"'}).status_code == 304
+    stale = make_response(path, range="bytes=0-1", **{"if-range": '"old"'})
+    assert stale.status_code == 200
+
+
+def test_accel_redirect_uri(tmp_path: Path) -> None:
+    root = str(tmp_path / "voices")
+    assert accel_redirect_uri("/storage/", root, f"{root}/ab/cd/abcd") == "/storage/ab/cd/abcd"
+    # legacy voices keep their absolute path outside the storage
+    assert accel_redirect_uri("/storage/", root, "/srv/old/voice.wav") is None
+    assert accel_redirect_uri("/storage/", root, f"{root}-old/voice.wav") is None
@@ -0,0 +1,55 @@
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from app.core.blobstore import BlobStore
+from app.storage import LocalStorage
+
+
+def store_bytes(store: BlobStore, data: bytes) -> str:
+    async def put() -> str:
+        writer = store.open_writer()
+        await writer.write(data)
+        return await store.put(writer)
+
+    return asyncio.run(put())
+
+
+def test_put_is_content_addressed(tmp_path: Path) -> None:
+    store = BlobStore(LocalStorage(str(tmp_path)))
+    blob_id = store_bytes(store, b"dictation")
+    assert blob_id == hashlib.sha256(b"dictation").hexdigest()
+    assert store.key(blob_id) == f"{blob_id[:2]}/{blob_id[2:4]}/{blob_id}"
+    path = tmp_path / blob_id[:2] / blob_id[2:4] / blob_id
+    assert store.local_path(blob_id) == str(path)
+    assert path.read_bytes() == b"dictation"
+
+
+def test_put_deduplicates(tmp_path: Path) -> None:
+    store = BlobStore(LocalStorage(str(tmp_path)))
+    first = store_bytes(store, b"same recording")
+    second = store_bytes(store, b"same recording")
+    assert first == second
+    files = [f for _, _, names in os.walk(tmp_path) for f in names]
+    assert files == [first]
+
+
+def test_key_rejects_invalid_ids(tmp_path: Path) -> None:
+    store = BlobStore(LocalStorage(str(tmp_path)))
+    assert store.key("/app/storage/legacy_voice.wav") == "/app/storage/legacy_voice.wav"
+    with pytest.raises(ValueError):
+        store.key("../../etc/passwd")
+
+
+def test_delete_removes_derived_objects(tmp_path: Path) -> None:
+    store = BlobStore(LocalStorage(str(tmp_path)))
+    blob_id = store_bytes(store, b"dictation")
+    derived = tmp_path / store.derived_key(blob_id, "peaks.dat")
+    derived.parent.mkdir(parents=True)
+    derived.write_bytes(b"peaks")
+    store.delete(blob_id)
+    assert not store.exists(blob_id)
+    assert not derived.exists()
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine
+from sqlalchemy.orm import Session
+
+from app.core.export import ExportFormat, export_table
+
+metadata = MetaData()
+row = Table(
+    "row",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("title", String, nullable=True),
+    Column("date_creation", DateTime, nullable=False),
+)
+
+
+@pytest.fixture
+def session() -> Session:
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    engine.execute(
+        row.insert(),
+        [
+            {"id": i, "title": None if i % 4 == 0 else f'title, "{i}"', "date_creation": datetime(2020, 1, 1, 0, 0, i)}
+            for i in range(10, 0, -1)
+        ],
+    )
+    db = Session(bind=engine)
+    yield db
+    db.close()
+
+
+def test_export_ndjson(session: Session) -> None:
+    chunks = list(export_table(session, row, ExportFormat.ndjson, batch_size=3))
+    assert len(chunks) == 4
+    records = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [r["id"] for r in records] == list(range(1, 11))
+    assert records[0] == {"id": 1, "title": 'title, "1"', "date_creation": "2020-01-01T00:00:01"}
+    assert records[3]["title"] is None
+
+
+def test_export_csv(session: Session) -> None:
+    content = b"".join(export_table(session, row, ExportFormat.csv, batch_size=4)).decode()
+    records = list(csv.reader(io.StringIO(content)))
+    assert records[0] == ["id", "title", "date_creation"]
+    assert records[1] == ["1", 'title, "1"', "2020-01-01T00:00:01"]
+    assert records[4] == ["4", "", "2020-01-01T00:00:04"]
+    assert len(records) == 11
+
+
+def test_export_empty(session: Session) -> None:
+    session.execute(row.delete())
+    assert list(export_table(session, row, ExportFormat.ndjson)) == []
+    assert list(export_table(session, row, ExportFormat.csv)) == [b"id,title,date_creation\r\n"]
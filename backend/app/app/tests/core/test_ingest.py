@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import os
+import struct
+from pathlib import Path
+
+from starlette.requests import Request
+
+from app.core.ingest import StreamingFormParser, append_stream
+from app.storage import LocalStorage
+
+BOUNDARY = b"testboundary"
+
+
+def build_request(body: bytes, chunk_size: int = 7) -> Request:
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+    messages = iter(
+        {"type": "http.request", "body": c, "more_body": i < len(chunks) - 1}
+        for i, c in enumerate(chunks)
+    )
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [
+            (b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)
+        ],
+    }
+
+    async def receive() -> dict:
+        return next(messages)
+
+    return Request(scope, receive)
+
+
+def form_body(content: bytes) -> bytes:
+    return b"".join(
+        [
+            b"--" + BOUNDARY + b"\r\n",
+            b'Content-Disposition: form-data; name="doctor_id"\r\n\r\n12\r\n',
+            b"--" + BOUNDARY + b"\r\n",
+            b'Content-Disposition: form-data; name="voice_file"; '
+            b'filename="../../etc/voice.wav"\r\n',
+            b"Content-Type: audio/wav\r\n\r\n",
+            content,
+            b"\r\n--" + BOUNDARY + b"--\r\n",
+        ]
+    )
+
+
+def test_streaming_form_parser_commit(tmp_path: Path) -> None:
+    content = os.urandom(5000)
+    request = build_request(form_body(content))
+    storage = LocalStorage(str(tmp_path))
+    form = asyncio.run(StreamingFormParser(request, storage.open_writer, "voice_file").parse())
+    assert form.fields == {"doctor_id": "12"}
+    assert form.filename == "voice.wav"
+    assert form.content_type == "audio/wav"
+    assert asyncio.run(form.file.hexdigest()) == hashlib.sha256(content).hexdigest()
+    asyncio.run(form.file.commit("voices/final.wav"))
+    assert (tmp_path / "voices" / "final.wav").read_bytes() == content
+    assert form.file.size == len(content)
+    assert os.listdir(tmp_path) == ["voices"]
+
+
+def test_streaming_form_parser_probes_audio(tmp_path: Path) -> None:
+    samples = b"\0" * 32000
+    content = b"RIFF" + struct.pack("<I", 36 + len(samples)) + b"WAVE"
+    content += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, 16000, 32000, 2, 16)
+    content += b"data" + struct.pack("<I", len(samples)) + samples
+    request = build_request(form_body(content), chunk_size=997)
+    storage = LocalStorage(str(tmp_path))
+    parser = StreamingFormParser(request, storage.open_writer, "voice_file", probe_audio=True)
+    form = asyncio.run(parser.parse())
+    asyncio.run(form.abort())
+    assert form.metadata is not None
+    assert form.metadata.duration == 1.0
+    assert form.metadata.sample_rate == 16000
+    assert form.metadata.byte_size == len(content)
+
+
+def test_streaming_form_parser_abort(tmp_path: Path) -> None:
+    request = build_request(form_body(b"data"))
+    storage = LocalStorage(str(tmp_path))
+    form = asyncio.run(StreamingFormParser(request, storage.open_writer, "voice_file").parse())
+    asyncio.run(form.abort())
+    assert os.listdir(tmp_path) == []
+
+
+def raw_request(body: bytes) -> Request:
+    messages = iter([{"type": "http.request", "body": body, "more_body": False}])
+    scope = {"type": "http", "method": "PATCH", "path": "/", "headers": []}
+
+    async def receive() -> dict:
+        return next(messages)
+
+    return Request(scope, receive)
+
+
+def test_append_stream_resumes_at_offset(tmp_path: Path) -> None:
+    path = str(tmp_path / "upload")
+    written, overflow = asyncio.run(append_stream(raw_request(b"hello "), path, 0, 11))
+    assert (written, overflow) == (6, False)
+    written, overflow = asyncio.run(append_stream(raw_request(b"world!!"), path, 6, 5))
+    assert (written, overflow) == (5, True)
+    assert Path(path).read_bytes() == b"hello world"
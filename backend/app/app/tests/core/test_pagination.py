@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
+
+from app.core.pagination import Page, decode_cursor, encode_cursor, paginate
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "row"
+    id = Column(Integer, primary_key=True)
+    date_creation = Column(DateTime, nullable=False)
+
+
+@pytest.fixture
+def session() -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(bind=engine)
+    start = datetime(2020, 1, 1)
+    # several rows share a date_creation, the id breaks the tie
+    db.add_all(
+        Row(id=i, date_creation=start + timedelta(seconds=i // 3)) for i in range(1, 23)
+    )
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_cursor_round_trip() -> None:
+    position = (datetime(2021, 3, 4, 5, 6, 7, 8910), 42)
+    cursor = encode_cursor(position)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == position
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor((datetime(2021, 1, 1), 1))[:-3], "WzEsMl0"])
+def test_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_paginate_walks_every_row_once(session: Session) -> None:
+    seen = []
+    page = Page(limit=5)
+    while True:
+        rows, cursor = paginate(session.query(Row), Row, page)
+        assert len(rows) <= 5
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            break
+        page = Page(limit=5, after=decode_cursor(cursor))
+    assert seen == list(range(22, 0, -1))
+
+
+def test_paginate_exact_last_page(session: Session) -> None:
+    rows, cursor = paginate(session.query(Row), Row, Page(limit=22))
+    assert len(rows) == 22
+    assert cursor is None
+
+
+def test_paginate_is_stable_under_inserts(session: Session) -> None:
+    rows, cursor = paginate(session.query(Row), Row, Page(limit=10))
+    assert cursor is not None
+    session.add(Row(id=100, date_creation=datetime(2030, 1, 1)))
+    session.commit()
+    next_rows, _ = paginate(session.query(Row), Row, Page(limit=10, after=decode_cursor(cursor)))
+    assert next_rows[0].id == rows[-1].id - 1
@@ -0,0 +1,47 @@
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from app.core.peaks import DAT_HEADER, PeaksBuilder, read_level
+from app.storage import LocalStorage
+
+
+def test_levels_match_naive_min_max() -> None:
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-32768, 32767, size=10007, dtype=np.int16)
+    builder = PeaksBuilder(8000, [4, 16])
+    pcm = samples.astype("<i2").tobytes()
+    # odd sized chunks split samples in two
+    for i in range(0, len(pcm), 333):
+        builder.feed(pcm[i : i + 333])
+    data = builder.finish()
+
+    pos = 0
+    for level in (4, 16):
+        version, flags, rate, spp, length = DAT_HEADER.unpack_from(data, pos)
+        assert (version, flags, rate, spp) == (1, 1, 8000, level)
+        assert length == -(-len(samples) // level)
+        pairs = np.frombuffer(data, np.int8, 2 * length, pos + DAT_HEADER.size)
+        for i in (0, length // 2, length - 1):
+            block = samples[i * level : (i + 1) * level]
+            assert pairs[2 * i] == block.min() >> 8
+            assert pairs[2 * i + 1] == block.max() >> 8
+        pos += DAT_HEADER.size + 2 * length
+    assert pos == len(data)
+
+
+def test_read_level(tmp_path: Path) -> None:
+    builder = PeaksBuilder(8000, [64, 256, 1024])
+    builder.feed(struct.pack("<4096h", *range(-2048, 2048)))
+    (tmp_path / "peaks.dat").write_bytes(builder.finish())
+    storage = LocalStorage(str(tmp_path))
+
+    content, level, levels = read_level(storage, "peaks.dat")
+    assert (level, levels) == (1024, [64, 256, 1024])
+    assert len(content) == DAT_HEADER.size + 2 * 4
+    content, level, _ = read_level(storage, "peaks.dat", samples_per_pixel=100)
+    assert level == 256
+    assert DAT_HEADER.unpack_from(content)[3:] == (256, 16)
+    _, level, _ = read_level(storage, "peaks.dat", samples_per_pixel=10 ** 6)
+    assert level == 1024
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, exc
+
+from app.db.pool import Histogram, InstrumentedQueuePool, instrument
+
+
+def test_histogram() -> None:
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"0.1": 2, "1.0": 3, "+Inf": 4}
+    assert snapshot["count"] == 4
+    assert snapshot["sum"] == pytest.approx(2.65)
+
+
+def test_pool_metrics() -> None:
+    engine = create_engine(
+        "sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+    metrics = instrument(engine)
+    connection = engine.connect()
+    stats = metrics.stats()
+    assert (stats["in_use"], stats["idle"], stats["exhausted"]) == (1, 0, 0)
+    assert stats["checkout_wait_seconds"]["count"] == 1
+
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    stats = metrics.stats()
+    assert (stats["exhausted"], stats["timeouts"], stats["waiting"]) == (1, 1, 0)
+
+    # a checkout waiting for the connection to come back
+    waited = threading.Event()
+    thread = threading.Thread(target=lambda: (engine.connect().close(), waited.set()))
+    engine.pool._timeout = 5  # type: ignore
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not metrics.waiting and time.monotonic() < deadline:
+        time.sleep(0.001)
+    connection.close()
+    thread.join()
+    assert waited.is_set()
+    stats = metrics.stats()
+    assert (stats["exhausted"], stats["timeouts"], stats["in_use"], stats["idle"]) == (2, 1, 0, 1)
+    assert stats["checkout_wait_seconds"]["count"] == 2
+    assert stats["hold_seconds"]["count"] == 2
+    assert stats["connects"] == 1
+
+    engine.dispose()
+    engine.connect().close()
+    assert metrics.stats()["connects"] == 2
+    assert metrics.stats()["checkout_wait_seconds"]["count"] == 3
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.core.principal_cache import LocalPrincipalCache, Principal, RedisPrincipalCache
+
+
+def principal(id: int, role: str = "doctor") -> Principal:
+    return Principal(id=id, role=role, is_active=True, is_superuser=False)
+
+
+def test_local_get_set_invalidate() -> None:
+    cache = LocalPrincipalCache(ttl=60)
+    assert cache.get(1) is None
+    cache.set(principal(1))
+    assert cache.get(1) == principal(1)
+    cache.set(principal(1, role="manager"))
+    assert cache.get(1).role == "manager"  # type: ignore
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    cache.invalidate(1)
+
+
+def test_local_expiry() -> None:
+    cache = LocalPrincipalCache(ttl=-1)
+    cache.set(principal(1))
+    assert cache.get(1) is None
+
+
+def test_local_evicts_least_recently_used() -> None:
+    cache = LocalPrincipalCache(ttl=60, max_size=2)
+    cache.set(principal(1))
+    cache.set(principal(2))
+    cache.get(1)
+    cache.set(principal(3))
+    assert cache.get(2) is None
+    assert cache.get(1) == principal(1)
+    assert cache.get(3) == principal(3)
+
+
+def test_redis_unavailable_is_a_miss() -> None:
+    pytest.importorskip("redis")
+    cache = RedisPrincipalCache("redis://127.0.0.1:1/0", ttl=60)
+    cache.set(principal(1))
+    assert cache.get(1) is None
+    asyncio.run(cache.set_async(principal(1)))
+    assert asyncio.run(cache.get_async(1)) is None
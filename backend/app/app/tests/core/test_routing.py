@@ -0,0 +1,78 @@
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
+
+from app.db.routing import PRIMARY_COOKIE, PRIMARY_HEADER, ReadYourWritesMiddleware, ReplicaSet, reads_from_primary
+
+
+class FakeLagReplicaSet(ReplicaSet):
+    def __init__(self, lags: List[Optional[float]], max_lag: float = 5):
+        super().__init__([create_engine("sqlite://") for _ in lags], max_lag=max_lag, interval=1)
+        self.fake_lags = lags
+
+    def measure(self, engine: Engine) -> float:
+        lag = self.fake_lags[self.engines.index(engine)]
+        if lag is None:
+            raise ConnectionError
+        return lag
+
+
+def request(method: str = "GET", headers: Optional[Dict[str, str]] = None) -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": method, "headers": raw})
+
+
+def test_replicas_within_the_lag_bound_take_reads_in_turn() -> None:
+    replicas = FakeLagReplicaSet([0, 10, None, 1])
+    assert replicas.choose() is None
+    replicas.check()
+    assert replicas.healthy() == [0, 3]
+    assert [replicas.choose() for _ in range(4)] == [0, 3, 0, 3]
+    assert [r["healthy"] for r in replicas.stats()] == [True, False, False, True]
+
+
+def test_measurement_age_counts_as_lag() -> None:
+    replicas = FakeLagReplicaSet([0.0, 0.04], max_lag=0.05)
+    replicas.check()
+    assert replicas.healthy() == [0, 1]
+    time.sleep(0.02)
+    assert replicas.healthy() == [0]
+    time.sleep(0.04)
+    assert replicas.choose() is None
+
+
+def test_reads_from_primary() -> None:
+    assert not reads_from_primary(request())
+    assert reads_from_primary(request("POST"))
+    assert reads_from_primary(request("HEAD"))
+    assert reads_from_primary(request(headers={PRIMARY_HEADER: str(time.time() + 10)}))
+    assert reads_from_primary(request(headers={"Cookie": f"{PRIMARY_COOKIE}={time.time() + 10}"}))
+    assert not reads_from_primary(request(headers={PRIMARY_HEADER: str(time.time() - 1)}))
+    assert not reads_from_primary(request(headers={PRIMARY_HEADER: "soon"}))
+
+
+def test_writes_stick_to_the_primary() -> None:
+    app = Starlette()
+
+    @app.route("/", methods=["GET", "POST"])
+    def endpoint(request: Request) -> PlainTextResponse:
+        return PlainTextResponse("primary" if reads_from_primary(request) else "replica")
+
+    @app.route("/fail", methods=["POST"])
+    def fail(request: Request) -> PlainTextResponse:
+        return PlainTextResponse("", status_code=400)
+
+    client = TestClient(ReadYourWritesMiddleware(app, seconds=10))
+    assert client.get("/").text == "replica"
+    client.post("/fail")
+    assert client.get("/").text == "replica"
+    response = client.post("/")
+    assert float(response.headers[PRIMARY_HEADER]) > time.time()
+    assert client.get("/").text == "primary"
+    assert TestClient(app).get("/", headers={PRIMARY_HEADER: response.headers[PRIMARY_HEADER]}).text == "primary"
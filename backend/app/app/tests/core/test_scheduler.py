@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from app.core.scheduler import forecast, schedule, work_seconds
+from app.models.voice import Voice
+
+NOW = datetime(2020, 1, 1, 12)
+
+
+def voice(id: int, urgency: str = "routine", age_hours: float = 0, duration: float = 60, **values) -> Voice:  # type: ignore
+    v = Voice(id=id, urgency=urgency, date_creation=NOW - timedelta(hours=age_hours), duration=duration, **values)
+    schedule(v)
+    return v
+
+
+def test_schedule_orders_by_urgency_age_and_length() -> None:
+    stat = voice(1, "stat")
+    urgent = voice(2, "urgent")
+    old_routine = voice(3, age_hours=60)
+    routine = voice(4)
+    long_routine = voice(5, duration=3600)
+    order = sorted([routine, long_routine, old_routine, urgent, stat], key=lambda v: (v.start_by, v.id))
+    # the routine voice recorded 60 hours ago is due before the urgent one
+    assert [v.id for v in order] == [stat.id, old_routine.id, urgent.id, long_routine.id, routine.id]
+    assert stat.due_at == NOW + timedelta(hours=4)
+    assert stat.start_by == stat.due_at - timedelta(seconds=work_seconds(60))
+
+
+def test_forecast_spreads_by_load() -> None:
+    work = timedelta(seconds=work_seconds(60))
+    held = voice(1, claimed_by=10, claimed_at=NOW - work / 2, lease_expires_at=NOW + timedelta(minutes=5))
+    expired = voice(2, claimed_by=11, claimed_at=NOW - work, lease_expires_at=NOW - timedelta(minutes=1))
+    queued = [voice(3), voice(4), voice(5)]
+
+    forecasts = forecast([held, expired, *queued], [10, 11], NOW)
+    by_id = {f.voice_id: f for f in forecasts}
+    assert by_id[1].assistant_id == 10 and by_id[1].completion == NOW + work / 2
+    # the free assistant takes the next one, the busy one the one after
+    assert (by_id[2].assistant_id, by_id[2].start) == (11, NOW)
+    assert (by_id[3].assistant_id, by_id[3].start) == (10, NOW + work / 2)
+    assert (by_id[4].assistant_id, by_id[4].start) == (11, NOW + work)
+    assert by_id[5].completion == NOW + work * 2.5
+    assert not any(f.late for f in forecasts)
+
+    late = forecast([voice(6, "stat", age_hours=4)], [10], NOW)[0]
+    assert late.late
+    assert forecast([voice(7)], [], NOW)[0].completion is None
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Generator
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from passlib.context import CryptContext
+
+from app.api.deps import get_current_active_principal, get_current_principal
+from app.core.config import settings
+from app.core.principal_cache import Principal, principal_cache
+from app.core.security import (
+    ALGORITHM,
+    PasswordHasher,
+    PasswordHashingBusy,
+    create_access_token,
+    principal_claims,
+    pwd_context,
+)
+from app.schemas.token import TokenPayload
+
+
+@pytest.fixture(scope="module")
+def hasher() -> Generator:
+    hasher = PasswordHasher(processes=1, max_pending=4)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher: PasswordHasher) -> None:
+    hashed = hasher.hash("secret")
+    assert pwd_context.identify(hashed) == "bcrypt"
+    assert hasher.verify_and_update("secret", hashed) == (True, None)
+    assert hasher.verify_and_update("wrong", hashed) == (False, None)
+    stats = hasher.stats()
+    assert stats["completed"] == 3
+    assert stats["pending"] == 0
+
+
+def test_rehash_when_cost_changed(hasher: PasswordHasher) -> None:
+    cheap = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret")
+    valid, new_hash = asyncio.run(hasher.verify_and_update_async("secret", cheap))
+    assert valid
+    assert new_hash is not None and not pwd_context.needs_update(new_hash)
+    assert hasher.stats()["rehashed"] == 1
+
+
+def test_busy() -> None:
+    hasher = PasswordHasher(processes=1, max_pending=0)
+    with pytest.raises(PasswordHashingBusy):
+        hasher.hash("secret")
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_in_process() -> None:
+    hasher = PasswordHasher(processes=0, max_pending=0)
+    assert hasher.verify_and_update("secret", hasher.hash("secret")) == (True, None)
+
+
+def test_access_token_claims() -> None:
+    principal = Principal(id=7, role="manager", is_active=True, is_superuser=False, relationship_version=3)
+    token = create_access_token(principal.id, claims=principal_claims(principal))
+    payload = TokenPayload(**jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM]))
+    assert (payload.sub, payload.role, payload.su, payload.rv) == (7, "manager", False, 3)
+
+
+def test_stale_relationship_version() -> None:
+    current = Principal(id=7, role="manager", is_active=False, is_superuser=False, relationship_version=4)
+    principal_cache.set(current)
+    try:
+        stale = TokenPayload(sub=7, role="manager", su=False, rv=3)
+        assert asyncio.run(get_current_principal(db=None, token_data=stale)) == current  # type: ignore
+        # the flags are the current ones whatever the token claims
+        fresh = TokenPayload(sub=7, role="manager", su=True, rv=4)
+        principal = asyncio.run(get_current_principal(db=None, token_data=fresh))  # type: ignore
+        assert principal == current
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(get_current_active_principal(current_user=principal))
+        assert e.value.status_code == 400
+    finally:
+        principal_cache.invalidate(7)
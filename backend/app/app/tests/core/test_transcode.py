@@ -0,0 +1,50 @@
+import shutil
+import struct
+from pathlib import Path
+
+import pytest
+
+from app.core import transcode
+from app.core.config import settings
+
+needs_ffmpeg = pytest.mark.skipif(
+    not (shutil.which(settings.FFMPEG_BINARY) and shutil.which(settings.FFPROBE_BINARY)),
+    reason="ffmpeg is not installed",
+)
+
+
+def write_wav(path: Path, seconds: int = 1, rate: int = 16000) -> None:
+    samples = b"".join(
+        struct.pack("<h", (i * 37) % 2000 - 1000) for i in range(seconds * rate)
+    )
+    header = b"RIFF" + struct.pack("<I", 36 + len(samples)) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, rate, rate * 2, 2, 16)
+    header += b"data" + struct.pack("<I", len(samples))
+    path.write_bytes(header + samples)
+
+
+def test_is_target_format() -> None:
+    opus = {"format": {"format_name": "ogg"}, "stream": {"codec_name": "opus"}}
+    vorbis = {"format": {"format_name": "ogg"}, "stream": {"codec_name": "vorbis"}}
+    wav = {"format": {"format_name": "wav"}, "stream": {"codec_name": "pcm_s16le"}}
+    assert transcode.is_target_format(opus)
+    assert not transcode.is_target_format(vorbis)
+    assert not transcode.is_target_format(wav)
+
+
+@needs_ffmpeg
+def test_to_opus(tmp_path: Path) -> None:
+    src, dst = tmp_path / "in.wav", tmp_path / "out.ogg"
+    write_wav(src)
+    assert not transcode.is_target_format(transcode.probe(str(src)))
+    transcode.to_opus(str(src), str(dst))
+    assert transcode.is_target_format(transcode.probe(str(dst)))
+    assert dst.stat().st_size < src.stat().st_size
+
+
+@needs_ffmpeg
+def test_probe_rejects_garbage(tmp_path: Path) -> None:
+    src = tmp_path / "in.wav"
+    src.write_bytes(b"not a recording")
+    with pytest.raises(transcode.TranscodeError):
+        transcode.probe(str(src))
@@ -0,0 +1,60 @@
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from app.core.vad import VoiceActivityDetector
+
+RATE = 16000
+
+
+def synthetic_dictation(layout: List[Tuple[str, float]], seed: int = 0) -> np.ndarray:
+    """
+    Background noise with "speech": a harmonic tone broken into syllables by
+    short pauses, and a fricative (loud high band noise) in each word.
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    for kind, seconds in layout:
+        n = int(seconds * RATE)
+        noise = rng.normal(0, 60, n)
+        if kind == "speech":
+            t = np.arange(n) / RATE
+            voiced = 3000 * np.sin(2 * np.pi * 140 * t) + 1500 * np.sin(2 * np.pi * 280 * t)
+            syllables = (np.sin(2 * np.pi * 3 * t) > -0.6).astype(float)
+            fricative = rng.normal(0, 1500, n) * (np.sin(2 * np.pi * 0.5 * t) > 0.95)
+            noise += voiced * syllables + fricative
+        parts.append(noise)
+    return np.clip(np.concatenate(parts), -32768, 32767).astype("<i2")
+
+
+def detect(samples: np.ndarray, chunk: int = 12345) -> List[Tuple[float, float]]:
+    vad = VoiceActivityDetector(RATE)
+    pcm = samples.tobytes()
+    for i in range(0, len(pcm), chunk):
+        vad.feed(pcm[i : i + chunk])
+    return vad.finish()
+
+
+def test_detects_speech_between_silences() -> None:
+    samples = synthetic_dictation(
+        [("silence", 2), ("speech", 3), ("silence", 5), ("speech", 2), ("silence", 1)]
+    )
+    segments = detect(samples)
+    assert len(segments) == 2
+    (start1, end1), (start2, end2) = segments
+    assert start1 == pytest.approx(2, abs=0.2)
+    assert end1 == pytest.approx(5, abs=0.3)
+    assert start2 == pytest.approx(10, abs=0.2)
+    assert end2 == pytest.approx(12, abs=0.3)
+
+
+def test_silence_only() -> None:
+    assert detect(synthetic_dictation([("silence", 3)])) == []
+    assert detect(np.zeros(RATE, dtype="<i2")) == []
+    assert VoiceActivityDetector(RATE).finish() == []
+
+
+def test_segments_stay_within_the_recording() -> None:
+    segments = detect(synthetic_dictation([("speech", 1.01)]))
+    assert segments == [(0.0, 1.01)]
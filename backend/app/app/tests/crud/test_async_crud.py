@@ -0,0 +1,90 @@
+import asyncio
+import itertools
+from datetime import datetime, timedelta
+from typing import Generator
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import crud
+from app.core.pagination import Page
+from app.db.base import Base
+from app.models.assistant_manager import AssistantManager
+from app.models.doctor_manager import DoctorManager
+from app.models.note import Note
+from app.models.user import User
+from app.models.voice import Voice
+
+aiosqlite = pytest.importorskip("aiosqlite")
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+
+ROLES = ["doctor", "doctor", "patient", "patient", "manager", "assistant", "assistant"]
+
+
+@pytest.fixture
+def databases(tmp_path) -> Generator:  # type: ignore
+    """
+    A sync and an async session on the same SQLite file, with a few voices
+    and notes.
+    """
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    db = Session(bind=engine)
+    users = [User(email=f"{i}@example.com", hashed_password="x", role=role) for i, role in enumerate(ROLES)]
+    db.add_all(users)
+    db.flush()
+    doctors, patients = users[:2], users[2:4]
+    manager, assistants = users[4], users[5:]
+    db.add_all(
+        [
+            DoctorManager(doctor_id=doctors[0].id, manager_id=manager.id),
+            AssistantManager(assistant_id=assistants[0].id, manager_id=manager.id),
+        ]
+    )
+    start = datetime(2020, 1, 1)
+    for i, (doctor, patient) in enumerate(itertools.product(doctors, patients * 3)):
+        voice = Voice(path=str(i), doctor_id=doctor.id, patient_id=patient.id, date_creation=start + timedelta(i))
+        db.add(voice)
+        db.flush()
+        db.add(Note(voice_id=voice.id, assistant_id=assistants[i % 2].id, date_creation=voice.date_creation))
+    db.commit()
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async_session = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+    yield db, async_session, users
+    db.close()
+    asyncio.run(async_engine.dispose())
+
+
+def test_listings_match(databases) -> None:  # type: ignore
+    db, async_session, users = databases
+
+    async def pages(list_async, **kwargs):  # type: ignore
+        # every page of the async listing, 4 rows at a time
+        ids, page = [], Page(limit=4)
+        async with async_session() as adb:
+            while True:
+                rows, cursor = await list_async(adb, page=page, **kwargs)
+                ids += [row.id for row in rows]
+                if cursor is None:
+                    return ids
+                page = Page(limit=4, after=(rows[-1].date_creation, rows[-1].id))
+
+    for user in users:
+        voices, _ = crud.voice.get_multi_visible(db, user=user, page=Page(limit=100))
+        notes, _ = crud.note.get_multi_visible(db, user=user, page=Page(limit=100))
+        assert asyncio.run(pages(crud.voice_async.get_multi_visible, user=user)) == [v.id for v in voices]
+        assert asyncio.run(pages(crud.note_async.get_multi_visible, user=user)) == [n.id for n in notes]
+
+
+def test_get_note_with_voice(databases) -> None:  # type: ignore
+    db, async_session, users = databases
+
+    async def get() -> Note:
+        async with async_session() as adb:
+            return await crud.note_async.get_by_note_id(adb, id=1)
+
+    note = asyncio.run(get())
+    # loaded with the note, readable once the session is closed
+    assert note.voice.id == note.voice_id
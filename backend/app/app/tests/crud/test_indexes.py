@@ -0,0 +1,216 @@
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Generator, Iterator, List, Tuple
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.core.pagination import Page
+
+VOICES = 1_000_000
+DOCTORS = 1000
+PATIENTS = 20000
+MANAGERS = 50
+ASSISTANTS = 200
+
+# The tables that hold the bulk of the rows, a sequential scan of them is
+# what the indexes are there to avoid
+LARGE_TABLES = {"voice", "note", "user"}
+
+SEED = [
+    """
+    INSERT INTO "user" (email, hashed_password, role, is_active, is_superuser)
+    SELECT 'idx-' || role || '-' || g || '@example.com', 'x', role, true, false
+    FROM (VALUES ('doctor', %(doctors)s), ('patient', %(patients)s),
+                 ('manager', %(managers)s), ('assistant', %(assistants)s)) AS r (role, n),
+         generate_series(1, r.n) AS g
+    """,
+    """
+    CREATE TEMPORARY TABLE idx_users ON COMMIT DROP AS
+    SELECT role, array_agg(id ORDER BY id) AS ids FROM "user"
+    WHERE email LIKE 'idx-%%' GROUP BY role
+    """,
+    """
+    INSERT INTO doctormanager (doctor_id, manager_id)
+    SELECT d.ids[g], m.ids[1 + g %% %(managers)s]
+    FROM idx_users d, idx_users m, generate_series(1, %(doctors)s) AS g
+    WHERE d.role = 'doctor' AND m.role = 'manager'
+    """,
+    """
+    INSERT INTO assistantmanager (assistant_id, manager_id)
+    SELECT a.ids[g], m.ids[1 + g %% %(managers)s]
+    FROM idx_users a, idx_users m, generate_series(1, %(assistants)s) AS g
+    WHERE a.role = 'assistant' AND m.role = 'manager'
+    """,
+    """
+    INSERT INTO doctorpatient (doctor_id, patient_id)
+    SELECT d.ids[1 + g %% %(doctors)s], p.ids[g]
+    FROM idx_users d, idx_users p, generate_series(1, %(patients)s) AS g
+    WHERE d.role = 'doctor' AND p.role = 'patient'
+    """,
+    # urgency, due_at and start_by as app.core.scheduler.schedule sets them
+    # with the default settings and no duration known, one voice in 50 stat
+    """
+    INSERT INTO voice (path, note_created, processing_status, doctor_id, patient_id, date_creation,
+                       urgency, due_at, start_by)
+    SELECT md5(g::text), g %% 20 <> 0, 'ready', d.ids[1 + g %% %(doctors)s],
+           p.ids[1 + g %% %(patients)s], c.created, c.urgency, c.created + c.sla,
+           c.created + c.sla - interval '660 seconds'
+    FROM idx_users d, idx_users p, generate_series(1, %(voices)s) AS g,
+         LATERAL (SELECT timestamp '2015-01-01' + g * interval '2 minutes' AS created,
+                         CASE WHEN g %% 50 = 0 THEN 'stat' ELSE 'routine' END AS urgency,
+                         CASE WHEN g %% 50 = 0 THEN interval '4 hours' ELSE interval '72 hours' END AS sla) AS c
+    WHERE d.role = 'doctor' AND p.role = 'patient'
+    """,
+    """
+    INSERT INTO note (content_txt, validated, voice_id, assistant_id, modifier_id, date_creation, date_modification)
+    SELECT 'note', v.id %% 3 = 0, v.id, a.ids[1 + v.id %% %(assistants)s], a.ids[1 + v.id %% %(assistants)s],
+           v.date_creation, v.date_creation
+    FROM voice v, idx_users a
+    WHERE a.role = 'assistant' AND v.note_created
+    """,
+    "ANALYZE",
+]
+
+
+def _plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.fixture(scope="module")
+def big_db(db: Session) -> Generator:
+    """
+    A session on a transaction holding a million voices and their notes,
+    rolled back at the end.
+    """
+    connection = db.get_bind().connect()
+    transaction = connection.begin()
+    params = {
+        "voices": VOICES,
+        "doctors": DOCTORS,
+        "patients": PATIENTS,
+        "managers": MANAGERS,
+        "assistants": ASSISTANTS,
+    }
+    cursor = connection.connection.cursor()
+    for statement in SEED:
+        cursor.execute(statement, params)
+    session = Session(bind=connection)
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+def _explain(session: Session, call: Callable[[Session], Any]) -> List[Tuple[str, List[str]]]:
+    """
+    Run `call` and explain every statement it sent, returns each statement
+    with the large tables it scans sequentially.
+    """
+    connection = session.connection()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):  # type: ignore
+        statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        call(session)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+    found = []
+    cursor = connection.connection.cursor()
+    for statement, parameters in statements:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = cursor.fetchone()[0][0]["Plan"]
+        scanned = [
+            node["Relation Name"]
+            for node in _plan_nodes(plan)
+            if node["Node Type"] == "Seq Scan" and node["Relation Name"] in LARGE_TABLES
+        ]
+        found.append((statement, scanned))
+    return found
+
+
+def _ids(session: Session, role: str) -> List[int]:
+    return session.execute(
+        "SELECT ids FROM idx_users WHERE role = :role", {"role": role}
+    ).scalar()
+
+
+def principal(id: int, role: str) -> Any:
+    return SimpleNamespace(id=id, role=role, is_superuser=False)
+
+
+def _queries(session: Session) -> Dict[str, Callable[[Session], Any]]:
+    doctor = _ids(session, "doctor")[7]
+    patient = _ids(session, "patient")[11]
+    manager = _ids(session, "manager")[3]
+    assistant = _ids(session, "assistant")[5]
+    voice_id = session.execute("SELECT max(id) FROM voice").scalar()
+    note_id = session.execute("SELECT max(id) FROM note").scalar()
+    page = Page(limit=50)
+    deep = Page(limit=50, after=(datetime(2016, 1, 1), 0))
+    return {
+        "voice.get_all": lambda db: crud.voice.get_all(db, page=page),
+        "voice.get_all deep": lambda db: crud.voice.get_all(db, page=deep),
+        "voice.get_by_voice_id": lambda db: crud.voice.get_by_voice_id(db, id=voice_id),
+        "voice.get_multi_by_doctor_id": lambda db: crud.voice.get_multi_by_doctor_id(db, doctor_id=doctor, page=page),
+        "voice.get_multi_by_doctor_id pending": lambda db: crud.voice.get_multi_by_doctor_id(
+            db, doctor_id=doctor, page=page, note_created=False
+        ),
+        "voice.get_multi_by_doctor_id done deep": lambda db: crud.voice.get_multi_by_doctor_id(
+            db, doctor_id=doctor, page=deep, note_created=True
+        ),
+        "voice.get_multi_by_manager": lambda db: crud.voice.get_multi_by_manager(db, manager_id=manager, page=page),
+        "voice.get_multi_by_assistant": lambda db: crud.voice.get_multi_by_assistant(
+            db, assistant_id=assistant, page=page
+        ),
+        "voice.get_multi_by_patient": lambda db: crud.voice.get_multi_by_patient(db, patient_id=patient, page=page),
+        "voice.get_multi_by_patient of doctor": lambda db: crud.voice.get_multi_by_patient(
+            db, patient_id=patient, page=page, doctor_id=doctor
+        ),
+        "voice.get_multi_visible manager": lambda db: crud.voice.get_multi_visible(
+            db, user=principal(manager, "manager"), page=page
+        ),
+        "voice.get_multi_visible assistant": lambda db: crud.voice.get_multi_visible(
+            db, user=principal(assistant, "assistant"), page=page, note_created=False
+        ),
+        "voice.get_multi_visible patient": lambda db: crud.voice.get_multi_visible(
+            db, user=principal(patient, "patient"), page=page
+        ),
+        "voice.claim_next": lambda db: crud.voice.claim_next(db, user=principal(assistant, "assistant"), lease=600),
+        "voice.get_queue_by_manager": lambda db: crud.voice.get_queue_by_manager(db, manager_id=manager, limit=100),
+        "note.get_all": lambda db: crud.note.get_all(db, page=page),
+        "note.get_multi_visible doctor": lambda db: crud.note.get_multi_visible(
+            db, user=principal(doctor, "doctor"), page=page
+        ),
+        "note.get_multi_visible manager": lambda db: crud.note.get_multi_visible(
+            db, user=principal(manager, "manager"), page=page, validated=False
+        ),
+        "note.get_by_note_id": lambda db: crud.note.get_by_note_id(db, id=note_id),
+        "note.get_multi_by_doctor_id": lambda db: crud.note.get_multi_by_doctor_id(db, doctor_id=doctor, page=page),
+        "note.get_multi_by_manager": lambda db: crud.note.get_multi_by_manager(db, manager_id=manager, page=page),
+        "note.get_multi_by_assistant": lambda db: crud.note.get_multi_by_assistant(
+            db, assistant_id=assistant, page=page, validated=False
+        ),
+        "note.get_multi_by_patient": lambda db: crud.note.get_multi_by_patient(db, patient_id=patient, page=page),
+        "voice_segment.get_multi_by_voice": lambda db: crud.voice_segment.get_multi_by_voice(db, voice_id=voice_id),
+        "transcript.get_by_voice": lambda db: crud.transcript.get_by_voice(db, voice_id=voice_id),
+        "voice_upload.get_expired": lambda db: crud.voice_upload.get_expired(db, before=datetime(2000, 1, 1)),
+        "user.get_by_email": lambda db: crud.user.get_by_email(db, email="idx-doctor-8@example.com"),
+        "user.get_by_id": lambda db: crud.user.get_by_id(db, id=doctor),
+    }
+
+
+def test_crud_queries_use_indexes(big_db: Session) -> None:
+    failures = []
+    for name, call in _queries(big_db).items():
+        for statement, scanned in _explain(big_db, call):
+            if scanned:
+                failures.append(f"{name} scans {', '.join(scanned)}: {statement}")
+    assert not failures, "\n".join(failures)
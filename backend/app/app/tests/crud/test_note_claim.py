@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.crud.crud_note import NoteClaim
+from app.db.session import SessionLocal
+from app.models.note import Note
+from app.models.user import User
+from app.models.voice import Voice
+from app.schemas.note import NoteCreate
+from app.tests.utils.utils import random_email
+
+
+def test_concurrent_claims_create_one_note(db: Session) -> None:
+    doctor, patient, assistant = (
+        User(email=random_email(), hashed_password="x", role=role) for role in ("doctor", "patient", "assistant")
+    )
+    db.add_all([doctor, patient, assistant])
+    db.flush()
+    voice = Voice(path="claim", doctor_id=doctor.id, patient_id=patient.id, date_creation=datetime.now())
+    db.add(voice)
+    db.commit()
+    note_in = NoteCreate(voice_id=voice.id, assistant_id=assistant.id, content_txt="text")
+
+    def claim(_: int) -> NoteClaim:
+        session = SessionLocal()
+        try:
+            result = crud.note.claim(session, obj_in=note_in, date_creation=datetime.now())
+            session.commit()
+            return result
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(8) as pool:
+        claims = list(pool.map(claim, range(16)))
+    created = [c.note for c in claims if c.note is not None]
+    assert len(created) == 1
+    assert {c.existing_id for c in claims if c.note is None} == {created[0]["id"]}
+    db.expire_all()
+    assert db.query(Voice).get(voice.id).note_created
+    assert db.query(Note).filter(Note.voice_id == voice.id).count() == 1
+
+    missing = NoteCreate(voice_id=voice.id + 1_000_000, assistant_id=assistant.id)
+    assert crud.note.claim(db, obj_in=missing, date_creation=datetime.now()) == NoteClaim(None, None)
+    db.rollback()
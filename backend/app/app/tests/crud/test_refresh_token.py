@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from typing import Generator
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.db.base import Base
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+
+
+@pytest.fixture
+def db() -> Generator:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = Session(bind=engine)
+    session.add(User(id=1, email="doctor@example.com", hashed_password="x", role="doctor"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_rotate(db: Session) -> None:
+    token = crud.refresh_token.issue(db, user_id=1)
+    rotated = crud.refresh_token.rotate(db, token=token)
+    assert rotated is not None
+    user_id, new_token = rotated
+    assert user_id == 1 and new_token != token
+    assert crud.refresh_token.rotate(db, token=new_token) is not None
+
+
+def test_reuse_revokes_the_family(db: Session) -> None:
+    token = crud.refresh_token.issue(db, user_id=1)
+    other_session = crud.refresh_token.issue(db, user_id=1)
+    _, new_token = crud.refresh_token.rotate(db, token=token)  # type: ignore
+    assert crud.refresh_token.rotate(db, token=token) is None
+    assert crud.refresh_token.rotate(db, token=new_token) is None
+    assert crud.refresh_token.rotate(db, token=other_session) is not None
+
+
+def test_unknown_expired_and_revoked(db: Session) -> None:
+    assert crud.refresh_token.rotate(db, token="unknown") is None
+    token = crud.refresh_token.issue(db, user_id=1)
+    db.query(RefreshToken).update({RefreshToken.expires_at: datetime.utcnow() - timedelta(1)})
+    db.commit()
+    assert crud.refresh_token.rotate(db, token=token) is None
+    assert crud.refresh_token.remove_expired(db, before=datetime.utcnow()) == 1
+    token = crud.refresh_token.issue(db, user_id=1)
+    crud.refresh_token.revoke_user(db, user_id=1)
+    assert crud.refresh_token.rotate(db, token=token) is None
@@ -92,3 +92,14 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+def test_deactivating_user_makes_tokens_stale(db: Session) -> None:
+    user = crud.user.create(db, obj_in=UserCreate(email=random_email(), password=random_lower_string()))
+    version = user.relationship_version or 0
+    crud.user.update(db, db_obj=user, obj_in={"full_name": "Unchanged flags"})
+    db.refresh(user)
+    assert user.relationship_version == version
+    crud.user.update(db, db_obj=user, obj_in=UserUpdate(is_active=False))
+    db.refresh(user)
+    assert user.relationship_version == version + 1
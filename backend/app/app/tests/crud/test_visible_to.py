@@ -0,0 +1,90 @@
+import itertools
+from datetime import datetime, timedelta
+from typing import Generator
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.core.access_graph import AccessGraph
+from app.core.pagination import Page
+from app.db.base import Base
+from app.models.assistant_manager import AssistantManager
+from app.models.doctor_manager import DoctorManager
+from app.models.doctor_patient import DoctorPatient
+from app.models.note import Note
+from app.models.user import User
+from app.models.voice import Voice
+
+ROLES = ["doctor"] * 3 + ["patient"] * 3 + ["manager"] * 2 + ["assistant"] * 3
+
+
+@pytest.fixture
+def care_team() -> Generator:
+    """
+    A small care team on SQLite, every user with a voice of every
+    doctor-patient pair and a note per voice.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(bind=engine)
+    users = [User(email=f"{i}@example.com", hashed_password="x", role=role) for i, role in enumerate(ROLES)]
+    users.append(User(email="admin@example.com", hashed_password="x", role="admin", is_superuser=True))
+    db.add_all(users)
+    db.flush()
+    doctors, patients, managers, assistants = (
+        [u for u in users if u.role == role] for role in ("doctor", "patient", "manager", "assistant")
+    )
+    db.add_all(
+        [
+            DoctorManager(doctor_id=doctors[0].id, manager_id=managers[0].id),
+            DoctorManager(doctor_id=doctors[1].id, manager_id=managers[0].id),
+            DoctorManager(doctor_id=doctors[1].id, manager_id=managers[1].id),
+            AssistantManager(assistant_id=assistants[0].id, manager_id=managers[0].id),
+            AssistantManager(assistant_id=assistants[1].id, manager_id=managers[0].id),
+            AssistantManager(assistant_id=assistants[1].id, manager_id=managers[1].id),
+        ]
+        + [DoctorPatient(doctor_id=d.id, patient_id=p.id) for d, p in itertools.product(doctors, patients)]
+    )
+    start = datetime(2020, 1, 1)
+    for i, (doctor, patient) in enumerate(itertools.product(doctors, patients)):
+        voice = Voice(path=str(i), doctor_id=doctor.id, patient_id=patient.id, date_creation=start + timedelta(i))
+        db.add(voice)
+        db.flush()
+        assistant = assistants[i % len(assistants)]
+        db.add(Note(voice_id=voice.id, assistant_id=assistant.id, date_creation=voice.date_creation))
+    db.commit()
+    yield db, users
+    db.close()
+
+
+def test_voice_visible_to_matches_access_graph(care_team) -> None:  # type: ignore
+    db, users = care_team
+    graph = AccessGraph(ttl=60)
+    graph.load(db)
+    voices = db.query(Voice).all()
+    for user in users:
+        listed, _ = crud.voice.get_multi_visible(db, user=user, page=Page(limit=100))
+        expected = {v.id for v in voices if graph.can_access_voice(user, v)}
+        assert {v.id for v in listed} == expected, user.role
+        assert len(listed) == len(expected)
+
+
+def test_note_visible_to(care_team) -> None:  # type: ignore
+    db, users = care_team
+    graph = AccessGraph(ttl=60)
+    graph.load(db)
+    notes = db.query(Note).all()
+    for user in users:
+        listed, _ = crud.note.get_multi_visible(db, user=user, page=Page(limit=100))
+        if user.is_superuser:
+            expected = {n.id for n in notes}
+        else:
+            expected = {
+                n.id
+                for n in notes
+                if user.id in (n.assistant_id, n.voice.doctor_id)
+                or graph.manages_assistant(user.id, n.assistant_id)
+            }
+        assert {n.id for n in listed} == expected, user.role
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.core.principal_cache import Principal
+from app.core.scheduler import work_seconds
+from app.db.session import SessionLocal
+from app.models.assistant_manager import AssistantManager
+from app.models.doctor_manager import DoctorManager
+from app.models.user import User
+from app.models.voice import Voice
+from app.tests.utils.utils import random_email
+
+
+def test_concurrent_claims_lease_different_voices(db: Session) -> None:
+    doctor, manager = (User(email=random_email(), hashed_password="x", role=role) for role in ("doctor", "manager"))
+    assistants = [User(email=random_email(), hashed_password="x", role="assistant") for _ in range(16)]
+    db.add_all([doctor, manager, *assistants])
+    db.flush()
+    db.add(DoctorManager(doctor_id=doctor.id, manager_id=manager.id))
+    db.add_all(AssistantManager(assistant_id=a.id, manager_id=manager.id) for a in assistants)
+    start = datetime(2000, 1, 1)
+    voices = [
+        Voice(path=f"queue-{i}", doctor_id=doctor.id, patient_id=doctor.id, processing_status="ready",
+              date_creation=start + timedelta(seconds=i))
+        for i in range(10)
+    ]
+    db.add_all(voices)
+    db.commit()
+    principals = [Principal(a.id, "assistant", True, False) for a in assistants]
+
+    def claim(principal: Principal) -> Optional[int]:
+        session = SessionLocal()
+        try:
+            claimed = crud.voice.claim_next(session, user=principal, lease=600)
+            session.commit()
+            return claimed.id if claimed else None
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(8) as pool:
+        claimed = list(pool.map(claim, principals))
+    leased = [id for id in claimed if id is not None]
+    assert sorted(leased) == sorted(v.id for v in voices)
+    assert claimed.count(None) == 6
+
+    # claiming again returns the voice already held
+    holder = principals[claimed.index(voices[0].id)]
+    assert crud.voice.claim_next(db, user=holder, lease=600).id == voices[0].id
+    other = principals[claimed.index(voices[1].id)]
+    assert crud.voice.renew_lease(db, id=voices[0].id, user_id=other.id, lease=600) is None
+    assert crud.voice.release_lease(db, id=voices[0].id, user_id=holder.id) is not None
+    assert crud.voice.claim_next(db, user=principals[claimed.index(None)], lease=600).id == voices[0].id
+    db.rollback()
+
+
+def test_transcoded_duration_moves_voice_in_queue(db: Session) -> None:
+    doctor = User(email=random_email(), hashed_password="x", role="doctor")
+    db.add(doctor)
+    db.flush()
+    voice = Voice(path="before-transcode", doctor_id=doctor.id, patient_id=doctor.id, date_creation=datetime(2000, 1, 1))
+    db.add(voice)
+    db.flush()
+    # unknown at the upload, the default duration is assumed
+    assert voice.start_by == voice.due_at - timedelta(seconds=work_seconds(None))
+
+    assert crud.voice.replace_path(
+        db, id=voice.id, old_path="before-transcode", new_path="after-transcode", values={"duration": 3600.0}
+    )
+    db.refresh(voice)
+    assert voice.start_by == voice.due_at - timedelta(seconds=work_seconds(3600.0))
+    db.rollback()
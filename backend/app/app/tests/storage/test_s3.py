@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+from typing import Generator
+
+import pytest
+
+from app.core.blobstore import BlobStore
+from app.storage import S3Storage
+
+moto = pytest.importorskip("moto")
+mock_aws = getattr(moto, "mock_aws", None) or getattr(moto, "mock_s3")
+
+BUCKET = "voices"
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def storage() -> Generator:
+    with mock_aws():
+        s3 = S3Storage(
+            BUCKET, prefix="test/", part_size=PART_SIZE, region_name="us-east-1"
+        )
+        s3.client.create_bucket(Bucket=BUCKET)
+        yield s3
+
+
+def write(store: BlobStore, data: bytes, chunk_size: int = 1024 * 1024) -> str:
+    async def put() -> str:
+        writer = store.open_writer()
+        for i in range(0, len(data), chunk_size):
+            await writer.write(data[i : i + chunk_size])
+        return await store.put(writer)
+
+    return asyncio.run(put())
+
+
+def test_multipart_put_and_range_read(storage: S3Storage) -> None:
+    store = BlobStore(storage)
+    data = os.urandom(2 * PART_SIZE + 1234)
+    blob_id = write(store, data)
+    assert blob_id == hashlib.sha256(data).hexdigest()
+    key = store.key(blob_id)
+    assert storage.stat(key).size == len(data)
+    assert storage.read_range(key, PART_SIZE - 10, 20) == data[PART_SIZE - 10 : PART_SIZE + 10]
+    assert b"".join(storage.get(key)) == data
+    # the staging object is gone, only the blob is left
+    listed = storage.client.list_objects_v2(Bucket=BUCKET)["Contents"]
+    assert [o["Key"] for o in listed] == ["test/" + key]
+
+
+def test_small_put_deduplicate_and_delete(storage: S3Storage, tmp_path: Path) -> None:
+    store = BlobStore(storage)
+    blob_id = write(store, b"short dictation")
+    assert write(store, b"short dictation") == blob_id
+    src = tmp_path / "upload"
+    src.write_bytes(b"short dictation")
+    store.put_file(str(src), blob_id)
+    assert not src.exists()
+    with store.open_local(blob_id) as path:
+        assert Path(path).read_bytes() == b"short dictation"
+    store.delete(blob_id)
+    assert not store.exists(blob_id)
+    with pytest.raises(FileNotFoundError):
+        store.stat(blob_id)
+
+
+def test_abort_multipart_upload(storage: S3Storage) -> None:
+    async def abort() -> None:
+        writer = storage.open_writer()
+        await writer.write(os.urandom(2 * PART_SIZE))
+        await writer.abort()
+
+    asyncio.run(abort())
+    assert not storage.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+    assert not storage.client.list_objects_v2(Bucket=BUCKET).get("Contents")
@@ -27,6 +27,7 @@ def create_random_user(db: Session) -> User:
     password = random_lower_string()
     user_in = UserCreate(username=email, email=email, password=password)
     user = crud.user.create(db=db, obj_in=user_in)
+    db.commit()
     return user
 
 
@@ -46,5 +47,6 @@ def authentication_token_from_email(
     else:
         user_in_update = UserUpdate(password=password)
         user = crud.user.update(db, db_obj=user, obj_in=user_in_update)
+    db.commit()
 
     return user_authentication_headers(client=client, email=email, password=password)
@@ -1,7 +1,25 @@
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
 from raven import Client
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 
+from app import crud, schemas
+from app.core import asr, transcode
+from app.core.peaks import PeaksBuilder
+from app.core.vad import VoiceActivityDetector
+from app.core.audio_metadata import AudioProbe
+from app.core.blobstore import blobstore
 from app.core.celery_app import celery_app
 from app.core.config import settings
+from app.core.ingest import hash_file
+from app.db.session import SessionLocal
+from app.models.voice import Voice
 
 client_sentry = Client(settings.SENTRY_DSN)
 
@@ -9,3 +27,237 @@ client_sentry = Client(settings.SENTRY_DSN)
 @celery_app.task(acks_late=True)
 def test_celery(word: str) -> str:
     return f"test task return {word}"
+
+
+@celery_app.task(acks_late=True)
+def cleanup_voice_uploads() -> int:
+    """
+    Drop resumable uploads that were never finalized.
+    """
+    db = SessionLocal()
+    try:
+        before = datetime.now() - timedelta(hours=settings.VOICE_UPLOAD_EXPIRE_HOURS)
+        uploads = crud.voice_upload.get_expired(db, before=before)
+        for upload in uploads:
+            crud.voice_upload.remove(db, id=upload.id)
+            db.commit()
+            try:
+                os.remove(os.path.join(settings.VOICE_UPLOAD_DIR, upload.id))
+            except FileNotFoundError:
+                pass
+        return len(uploads)
+    finally:
+        db.close()
+
+
+@celery_app.task(acks_late=True)
+def cleanup_refresh_tokens() -> int:
+    """
+    Drop the refresh tokens that expired, used or not.
+    """
+    db = SessionLocal()
+    try:
+        count = crud.refresh_token.remove_expired(db, before=datetime.utcnow())
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def transcode_voice(db: Session, voice: Voice) -> bool:
+    """
+    Replace the recording of the voice by its Opus/Ogg transcode.
+
+    The transcode is stored as a new blob, the voice is then switched to it
+    only if it still points at the recording that was transcoded, and the
+    reference on the original is dropped in that same transaction. Running it
+    twice, or concurrently, leaves a single consistent result.
+    Commits. Returns whether the recording was replaced.
+    """
+    old_path = voice.path
+    with tempfile.TemporaryDirectory(prefix="voice-") as tmp:
+        with blobstore.open_local(old_path) as src:
+            if transcode.is_target_format(transcode.probe(src)):
+                return False
+            dst = os.path.join(tmp, "voice.ogg")
+            transcode.to_opus(src, dst)
+        probe = AudioProbe()
+        blob_id = hash_file(dst, probe)
+        values = probe.result()._asdict()
+        crud.blob.acquire(db, id=blob_id, size=values["byte_size"])
+        try:
+            blobstore.put_file(dst, blob_id)
+            replaced = crud.voice.replace_path(
+                db, id=voice.id, old_path=old_path, new_path=blob_id, values=values
+            )
+            if not replaced:
+                crud.blob.release(db, id=blob_id)
+            db.commit()
+        except BaseException:
+            # drops the reference, and the file if it was the only one
+            db.rollback()
+            raise
+    return replaced
+
+
+def compute_peaks(voice: Voice) -> None:
+    """
+    Store the waveform peaks of the recording next to its blob, kept as long
+    as the blob is.
+    """
+    key = blobstore.derived_key(voice.path, "peaks.dat")
+    if blobstore.storage.exists(key):
+        return
+    builder = PeaksBuilder(settings.VOICE_PEAKS_SAMPLE_RATE, settings.VOICE_PEAKS_LEVELS)
+    with blobstore.open_local(voice.path) as src:
+        for pcm in transcode.decode_pcm(src, settings.VOICE_PEAKS_SAMPLE_RATE):
+            builder.feed(pcm)
+    with tempfile.TemporaryDirectory(prefix="voice-") as tmp:
+        dst = os.path.join(tmp, "peaks.dat")
+        with open(dst, "wb") as f:
+            f.write(builder.finish())
+        blobstore.storage.put_file(dst, key)
+
+
+def detect_speech(db: Session, voice: Voice) -> None:
+    """
+    Store the speech segments of the recording and, with VOICE_VAD_TRIM, a
+    copy of it without the silences.
+    """
+    trimmed_key = blobstore.derived_key(voice.path, "trimmed.ogg")
+    want_trimmed = settings.VOICE_VAD_TRIM and not blobstore.storage.exists(trimmed_key)
+    if voice.speech_duration is not None and not want_trimmed:
+        return
+    with blobstore.open_local(voice.path) as src:
+        if voice.speech_duration is None:
+            detector = VoiceActivityDetector(settings.VOICE_VAD_SAMPLE_RATE)
+            for pcm in transcode.decode_pcm(src, settings.VOICE_VAD_SAMPLE_RATE):
+                detector.feed(pcm)
+            crud.voice_segment.replace_for_voice(db, voice_id=voice.id, segments=detector.finish())
+            db.commit()
+        segments = [
+            (segment.start_time, segment.end_time)
+            for segment in crud.voice_segment.get_multi_by_voice(db, voice_id=voice.id)
+        ]
+        if want_trimmed and segments:
+            with tempfile.TemporaryDirectory(prefix="voice-") as tmp:
+                dst = os.path.join(tmp, "trimmed.ogg")
+                transcode.trim_to_segments(src, dst, segments)
+                blobstore.storage.put_file(dst, trimmed_key)
+
+
+@celery_app.task(bind=True, acks_late=True, max_retries=5)
+def process_voice(self, voice_id: int) -> str:  # type: ignore
+    """
+    Post upload processing of a voice, queued once the voice is created:
+    transcode to Opus, waveform peaks, then speech detection. Each stage skips
+    work already done.
+
+    Errors that may go away (storage, database, missing ffmpeg, timeout) are
+    retried with an exponential backoff, a recording ffmpeg cannot read, or
+    any other error, is marked failed right away. A failed voice keeps its
+    original recording and stays in the work queue. Every stage is idempotent: a redelivered message
+    is harmless, and queueing a ready voice again only runs the stages added
+    since it was processed.
+    """
+    db = SessionLocal()
+    try:
+        voice = crud.voice.get(db, id=voice_id)
+        if not voice:
+            return "missing"
+        if voice.processing_status != "ready":
+            crud.voice.set_processing_status(db, id=voice.id, status="processing")
+            db.commit()
+        try:
+            transcode_voice(db, voice)
+            db.refresh(voice)
+            compute_peaks(voice)
+            detect_speech(db, voice)
+        except transcode.TranscodeError:
+            client_sentry.captureException()
+            crud.voice.set_processing_status(db, id=voice.id, status="failed")
+            db.commit()
+            return "failed"
+        except (OSError, subprocess.TimeoutExpired, SQLAlchemyError) as e:
+            db.rollback()
+            if self.request.retries >= self.max_retries:
+                client_sentry.captureException()
+                crud.voice.set_processing_status(db, id=voice.id, status="failed")
+                db.commit()
+                raise
+            raise self.retry(exc=e, countdown=30 * 2 ** self.request.retries)
+        except Exception:
+            # a bug, not left "processing" for good
+            db.rollback()
+            client_sentry.captureException()
+            crud.voice.set_processing_status(db, id=voice.id, status="failed")
+            db.commit()
+            raise
+        crud.voice.set_processing_status(db, id=voice.id, status="ready")
+        db.commit()
+        if settings.ASR_MODEL_PATH:
+            celery_app.send_task("app.worker.transcribe_voice", args=[voice.id])
+        return "ready"
+    finally:
+        db.close()
+
+
+_transcriber: Optional[asr.Transcriber] = None
+
+
+def get_transcriber() -> asr.Transcriber:
+    # the model is loaded once per worker, not per recording
+    global _transcriber
+    if _transcriber is None:
+        _transcriber = asr.Transcriber(settings.ASR_MODEL_PATH, settings.ASR_PROCESSES)  # type: ignore
+    return _transcriber
+
+
+@celery_app.task(bind=True, acks_late=True, max_retries=3)
+def transcribe_voice(self, voice_id: int) -> Optional[int]:  # type: ignore
+    """
+    Draft transcript of a processed voice, from its speech segments only.
+    Runs on the asr-queue, whose worker uses the solo pool (see
+    asr.Transcriber). Returns the transcript id.
+    """
+    db = SessionLocal()
+    try:
+        voice = crud.voice.get(db, id=voice_id)
+        if not voice:
+            return None
+        transcript = crud.transcript.get_by_voice(db, voice_id=voice.id)
+        if transcript:
+            return transcript.id
+        segments = [
+            (segment.start_time, segment.end_time)
+            for segment in crud.voice_segment.get_multi_by_voice(db, voice_id=voice.id)
+        ]
+        chunks = asr.plan_chunks(segments, settings.ASR_MAX_CHUNK_SECONDS)
+        transcriber = get_transcriber()
+        try:
+            with tempfile.TemporaryDirectory(prefix="voice-") as tmp:
+                pcm_path = os.path.join(tmp, "voice.pcm")
+                with blobstore.open_local(voice.path) as src, open(pcm_path, "wb") as pcm:
+                    for block in transcode.decode_pcm(src, asr.SAMPLE_RATE):
+                        pcm.write(block)
+                started = time.perf_counter()
+                words = transcriber.transcribe(pcm_path, chunks)
+                elapsed = time.perf_counter() - started
+        except transcode.TranscodeError:
+            client_sentry.captureException()
+            return None
+        except OSError as e:
+            raise self.retry(exc=e, countdown=60 * 2 ** self.request.retries)
+        speech = sum(end - start for start, end in chunks)
+        transcript_in = schemas.TranscriptCreate(
+            voice_id=voice.id,
+            text=asr.words_to_text(words),
+            words=[word._asdict() for word in words],
+            engine=transcriber.engine,
+            real_time_factor=elapsed * transcriber.processes / speech if speech else None,
+        )
+        transcript = crud.transcript.create(db, obj_in=transcript_in)
+        db.commit()
+        return transcript.id
+    finally:
+        db.close()
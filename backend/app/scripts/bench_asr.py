@@ -0,0 +1,64 @@
+"""
+Benchmark the offline speech to text of `app.core.asr`.
+
+Decodes a recording, finds its speech segments like the worker does, then
+transcribes it with 1, 2, ... processes. Reports the real time factor per
+core (processing time x processes / speech time, lower is better), which is
+what sizes the worker nodes: a node with C cores keeps up with
+C / RTF hours of dictated speech per hour.
+
+Needs the `vosk` package, a Vosk model directory and ffmpeg.
+
+Usage: python scripts/bench_asr.py --model /models/vosk-model-small-fr-0.22 \
+    --audio dictation.wav [--processes 1 2 4]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.core import asr, transcode
+from app.core.vad import VoiceActivityDetector
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", required=True, help="Vosk model directory")
+    parser.add_argument("--audio", required=True, help="recording to transcribe")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--max-chunk", type=float, default=30.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-asr-") as tmp:
+        pcm_path = os.path.join(tmp, "voice.pcm")
+        vad = VoiceActivityDetector(asr.SAMPLE_RATE)
+        with open(pcm_path, "wb") as pcm:
+            for block in transcode.decode_pcm(args.audio, asr.SAMPLE_RATE):
+                vad.feed(block)
+                pcm.write(block)
+        duration = os.path.getsize(pcm_path) / 2 / asr.SAMPLE_RATE
+        chunks = asr.plan_chunks(vad.finish(), args.max_chunk)
+        speech = sum(end - start for start, end in chunks)
+        print(f"audio {duration:.0f} s, speech {speech:.0f} s in {len(chunks)} chunks")
+        if not speech:
+            return
+
+        for processes in args.processes:
+            transcriber = asr.Transcriber(args.model, processes)
+            try:
+                # start the processes and load the model before timing
+                transcriber.transcribe(pcm_path, [(0.0, 0.1)] * processes * 2)
+                wall = time.perf_counter()
+                words = transcriber.transcribe(pcm_path, chunks)
+                wall = time.perf_counter() - wall
+            finally:
+                transcriber.close()
+            print(
+                f"{processes:>3} processes  wall {wall:>8.1f} s  "
+                f"{duration / wall:>6.1f}x real time  "
+                f"RTF per core {wall * processes / speech:>6.3f}  words {len(words)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark requests/s of one worker listing voices, sync session in the
+threadpool against AsyncSession on the event loop.
+
+Both routes run the same query (crud.voice.get_multi_visible and
+crud.voice_async.get_multi_visible) against the database of the settings,
+driven in process through ASGI by `--concurrency` clients. `--delay` adds a
+server side pg_sleep to every query, as a slow query or a loaded database
+would, which is where the threadpool runs out of threads.
+
+Needs a Postgres with voices, e.g. the one of docker-compose.
+
+Usage: python scripts/bench_async_db.py [--concurrency 10 100] [--delay 0 0.05]
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, Generator, List
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.api import deps
+from app.core.pagination import Page
+from app.core.principal_cache import Principal
+from app.db.session import async_engine
+
+bench = FastAPI()
+superuser = Principal(id=0, role=None, is_active=True, is_superuser=True)
+settings: Dict[str, float] = {"delay": 0.0}
+
+
+@bench.get("/sync")
+def list_sync(db: Session = Depends(deps.get_db)) -> Any:
+    if settings["delay"]:
+        db.execute(text("SELECT pg_sleep(:delay)"), settings)
+    voices, _ = crud.voice.get_multi_visible(db, user=superuser, page=Page(limit=50))
+    return [voice.id for voice in voices]
+
+
+@bench.get("/async")
+async def list_async(db: AsyncSession = Depends(deps.get_async_db)) -> Any:
+    if settings["delay"]:
+        await db.execute(text("SELECT pg_sleep(:delay)"), settings)
+    voices, _ = await crud.voice_async.get_multi_visible(db, user=superuser, page=Page(limit=50))
+    return [voice.id for voice in voices]
+
+
+async def call(path: str) -> int:
+    status = 0
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("bench", 80),
+        "path": path,
+        "query_string": b"",
+        "root_path": "",
+        "headers": [],
+    }
+
+    async def receive() -> Dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await bench(scope, receive, send)
+    return status
+
+
+async def run(path: str, concurrency: int, seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    latencies: List[float] = []
+
+    async def client() -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            assert await call(path) == 200
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(
+        f"{path:>7}  delay {settings['delay'] * 1000:>4.0f} ms  {concurrency:>4} clients  "
+        f"{len(latencies) / elapsed:>7.0f} req/s  p99 {p99:>7.1f} ms"
+    )
+
+
+async def main(concurrencies: List[int], delays: List[float], seconds: float) -> None:
+    # one event loop, the asyncpg connections of the pool belong to it
+    for delay in delays:
+        settings["delay"] = delay
+        for concurrency in concurrencies:
+            for path in ("/sync", "/async"):
+                await run(path, concurrency, seconds)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--delay", type=float, nargs="+", default=[0, 0.05], help="seconds")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.concurrency, args.delay, args.seconds))
@@ -0,0 +1,153 @@
+"""
+Benchmark /voices reads while logins pour in, as at the start of a morning.
+
+The API is driven in process through ASGI on a SQLite copy of a small care
+team. `--logins` clients log in back to back while `--readers` clients list
+their voices; the latency of the listings is reported for bcrypt run in the
+request threads (--processes 0, how logins were served before) and in the
+password hashing pool.
+
+Usage: python scripts/bench_login_storm.py [--processes 0 2] [--logins 50]
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Generator, List, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api import deps
+from app.core import security
+from app.db.base import Base
+from app.main import app
+from app.models.user import User
+from app.models.voice import Voice
+
+PASSWORD = "morning-rush"
+
+
+async def call(method: str, path: str, headers: Dict[str, str], body: bytes = b"") -> int:
+    status = 0
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "server": ("bench", 80),
+        "path": path.split("?")[0],
+        "query_string": path.partition("?")[2].encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    sent = False
+
+    async def receive() -> Dict:
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def setup(directory: str, users: int) -> Tuple[sessionmaker, List[str], List[str]]:
+    engine = create_engine(
+        f"sqlite:///{directory}/bench.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    hashed = security.pwd_context.hash(PASSWORD)
+    doctors = [
+        User(email=f"doctor{i}@example.com", hashed_password=hashed, role="doctor", is_active=True)
+        for i in range(users)
+    ]
+    db.add_all(doctors)
+    db.flush()
+    start = datetime(2020, 1, 1)
+    db.add_all(
+        Voice(path=f"{d.id}-{i}", doctor_id=d.id, patient_id=d.id, date_creation=start + timedelta(minutes=i))
+        for d in doctors
+        for i in range(100)
+    )
+    db.commit()
+    emails = [d.email for d in doctors]
+    tokens = [security.create_access_token(d.id) for d in doctors]
+    db.close()
+    return SessionLocal, emails, tokens
+
+
+async def run(emails: List[str], tokens: List[str], logins: int, readers: int, seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+
+    async def login(i: int) -> None:
+        headers = {"content-type": "application/x-www-form-urlencoded"}
+        body = f"username={emails[i % len(emails)]}&password={PASSWORD}".encode()
+        while time.perf_counter() < deadline:
+            status = await call("POST", "/api/v1/login/access-token", headers, body)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 503:
+                await asyncio.sleep(1)
+
+    async def read(i: int) -> None:
+        headers = {"authorization": f"Bearer {tokens[i % len(tokens)]}"}
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            assert await call("GET", "/api/v1/voices/?limit=50", headers) == 200
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(login(i) for i in range(logins)), *(read(i) for i in range(readers)))
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(
+        f"{security.password_hasher.processes:>3} processes  {logins:>4} logins  "
+        f"reads p50 {p50:>7.1f} ms  p99 {p99:>7.1f} ms  ({len(latencies)} reads)  "
+        f"logins by status {statuses}"
+    )
+    stats = security.password_hasher.stats()
+    if stats["completed"]:
+        print(f"     bcrypt {stats['seconds'] / stats['completed'] * 1000:.0f} ms per login, queue included")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--logins", type=int, default=50, help="clients logging in back to back")
+    parser.add_argument("--readers", type=int, default=20, help="clients listing their voices")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--max-pending", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="login-bench-") as directory:
+        SessionLocal, emails, tokens = setup(directory, args.readers)
+
+        def get_db() -> Generator:
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[deps.get_db] = get_db
+        for processes in args.processes:
+            # the login endpoint looks the hasher up on the module
+            security.password_hasher = security.PasswordHasher(processes, args.max_pending)
+            if processes:
+                security.password_hasher.start()
+            asyncio.run(run(emails, tokens, args.logins, args.readers, args.seconds))
+            security.password_hasher.shutdown()
@@ -0,0 +1,63 @@
+"""
+Benchmark the voice activity detection of `app.core.vad`.
+
+Runs the detector over a synthetic dictation (speech bursts and pauses over
+background noise) on one core and reports how many times faster than real
+time it is, and how close the detected speech time is to the generated one.
+Decoding is not included, ffmpeg decodes Opus at several hundred times real
+time.
+
+Usage: python scripts/bench_vad.py [--minutes 1 10 60] [--rate 16000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.core.vad import VoiceActivityDetector
+
+CHUNK = 1024 * 1024  # what the worker reads from ffmpeg
+
+
+def dictation(minutes: int, rate: int, seed: int = 0):  # type: ignore
+    rng = np.random.default_rng(seed)
+    parts, speech = [], 0.0
+    total = 0.0
+    while total < minutes * 60:
+        pause, words = rng.uniform(0.5, 4), rng.uniform(1, 8)
+        n, m = int(pause * rate), int(words * rate)
+        t = np.arange(m) / rate
+        voiced = 3000 * np.sin(2 * np.pi * rng.uniform(100, 220) * t)
+        syllables = np.sin(2 * np.pi * rng.uniform(2, 5) * t) > -0.6
+        parts += [rng.normal(0, 60, n), rng.normal(0, 60, m) + voiced * syllables]
+        speech += words
+        total += pause + words
+    samples = np.clip(np.concatenate(parts), -32768, 32767).astype("<i2")
+    return samples.tobytes(), speech
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=int, nargs="+", default=[1, 10, 60])
+    parser.add_argument("--rate", type=int, default=16000)
+    args = parser.parse_args()
+
+    for minutes in args.minutes:
+        pcm, speech = dictation(minutes, args.rate)
+        audio = len(pcm) / 2 / args.rate
+        cpu = time.process_time()
+        vad = VoiceActivityDetector(args.rate)
+        for i in range(0, len(pcm), CHUNK):
+            vad.feed(pcm[i : i + CHUNK])
+        segments = vad.finish()
+        cpu = time.process_time() - cpu
+        detected = sum(end - start for start, end in segments)
+        print(
+            f"{minutes:>4} min  {audio / cpu:>8.0f}x real time  cpu {cpu * 1000:>8.1f} ms  "
+            f"speech {speech:>7.0f} s  detected {detected:>7.0f} s  "
+            f"segments {len(segments):>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark the voice upload ingest path.
+
+Compares the previous implementation (Starlette spools the upload into a
+SpooledTemporaryFile, then it is copied into the storage directory with
+aiofiles 1 KB at a time) with the streaming ingest of `app.core.ingest`.
+
+Usage: python scripts/bench_voice_ingest.py [--sizes 1 50 500] [--dir /tmp/x]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from typing import AsyncIterator, Callable, Dict
+
+import aiofiles
+from starlette.requests import Request
+
+from app.core.ingest import StreamingFormParser
+from app.storage import LocalStorage
+
+BOUNDARY = b"----voicebenchboundary"
+RECEIVE_CHUNK = 64 * 1024  # what uvicorn typically hands to the app
+
+
+def multipart_body(size: int) -> Callable[[], AsyncIterator[Dict]]:
+    head = b"".join(
+        [
+            b"--" + BOUNDARY + b"\r\n",
+            b'Content-Disposition: form-data; name="doctor_id"\r\n\r\n1\r\n',
+            b"--" + BOUNDARY + b"\r\n",
+            b'Content-Disposition: form-data; name="patient_id"\r\n\r\n2\r\n',
+            b"--" + BOUNDARY + b"\r\n",
+            b'Content-Disposition: form-data; name="voice_file"; '
+            b'filename="dictation.wav"\r\n',
+            b"Content-Type: audio/wav\r\n\r\n",
+        ]
+    )
+    tail = b"\r\n--" + BOUNDARY + b"--\r\n"
+    block = os.urandom(RECEIVE_CHUNK)
+
+    async def messages() -> AsyncIterator[Dict]:
+        yield {"type": "http.request", "body": head, "more_body": True}
+        remaining = size
+        while remaining > 0:
+            n = min(remaining, RECEIVE_CHUNK)
+            remaining -= n
+            yield {"type": "http.request", "body": block[:n], "more_body": True}
+        yield {"type": "http.request", "body": tail, "more_body": False}
+
+    return messages
+
+
+def make_request(size: int) -> Request:
+    stream = multipart_body(size)().__aiter__()
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [
+            (
+                b"content-type",
+                b"multipart/form-data; boundary=" + BOUNDARY,
+            )
+        ],
+    }
+
+    async def receive() -> Dict:
+        return await stream.__anext__()
+
+    return Request(scope, receive)
+
+
+async def ingest_before(request: Request, directory: str) -> None:
+    form = await request.form()
+    voice_file = form["voice_file"]
+    path = os.path.join(directory, "before_" + voice_file.filename)
+    async with aiofiles.open(path, "wb") as out_file:
+        while True:
+            contents = await voice_file.read(1024)
+            if not contents:
+                break
+            await out_file.write(contents)
+    await voice_file.close()
+
+
+async def ingest_after(request: Request, directory: str) -> None:
+    storage = LocalStorage(directory)
+    form = await StreamingFormParser(request, storage.open_writer, "voice_file").parse()
+    await form.file.commit("after_" + str(form.filename))  # type: ignore
+
+
+def run(name: str, func: Callable, size: int, directory: str, repeat: int) -> None:
+    walls, cpus = [], []
+    for _ in range(repeat):
+        request = make_request(size)
+        wall, cpu = time.perf_counter(), time.process_time()
+        asyncio.run(func(request, directory))
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    wall, cpu = min(walls), min(cpus)
+    mb = size / 1024 / 1024
+    print(
+        f"{name:>6} {mb:>7.0f} MB  {mb / wall:>9.1f} MB/s  "
+        f"wall {wall * 1000:>9.1f} ms  cpu {cpu * 1000:>9.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="storage directory to write to")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="voice-bench-")
+    try:
+        for size_mb in args.sizes:
+            size = size_mb * 1024 * 1024
+            run("before", ingest_before, size, directory, args.repeat)
+            run("after", ingest_after, size, directory, args.repeat)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark concurrent playback of one stored recording in a single worker.
+
+Each simulated player seeks to random positions of a 200 MB file and reads a
+256 KB range through AudioFileResponse, as an <audio> element does while an
+assistant scrubs. Reports the throughput of the worker and how many players
+streaming at a given bitrate it can feed.
+
+Usage: python scripts/bench_voice_playback.py [--streams 1 10 100] [--zerocopy]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict
+
+from starlette.datastructures import Headers
+
+from app.core.audio_response import ZEROCOPY_EXTENSION, AudioFileResponse
+from app.storage import LocalStorage
+
+FILE_SIZE = 200 * 1024 * 1024
+RANGE_SIZE = 256 * 1024
+
+
+async def player(path: str, requests: int, zerocopy: bool) -> int:
+    sent = 0
+
+    async def send(message: Dict) -> None:
+        nonlocal sent
+        if message["type"] == ZEROCOPY_EXTENSION:
+            # what the server would hand to sendfile(2)
+            sent += os.sendfile(devnull, message["file"].fileno(), message["offset"], message["count"])
+        else:
+            sent += len(message.get("body", b""))
+
+    scope = {"type": "http", "extensions": {ZEROCOPY_EXTENSION: {}} if zerocopy else {}}
+    for _ in range(requests):
+        start = random.randrange(0, FILE_SIZE - RANGE_SIZE)
+        headers = Headers({"range": f"bytes={start}-{start + RANGE_SIZE - 1}"})
+        response = AudioFileResponse(
+            LocalStorage(os.path.dirname(path)),
+            os.path.basename(path),
+            request_headers=headers,
+            etag='"bench"',
+        )
+        await response(scope, None, send)  # type: ignore
+    return sent
+
+
+async def run(path: str, streams: int, requests: int, zerocopy: bool, bitrate: int) -> None:
+    wall, cpu = time.perf_counter(), time.process_time()
+    sent = sum(await asyncio.gather(*(player(path, requests, zerocopy) for _ in range(streams))))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    mb_s = sent / 1024 / 1024 / wall
+    print(
+        f"{streams:>5} streams  {streams * requests / wall:>8.0f} req/s  "
+        f"{mb_s:>8.1f} MB/s  cpu {cpu / wall * 100:>5.0f}%  "
+        f"~{mb_s * 1024 * 8 / bitrate:>8.0f} players at {bitrate} kbit/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--requests", type=int, default=50, help="range requests per stream")
+    parser.add_argument("--bitrate", type=int, default=128, help="kbit/s of one player")
+    parser.add_argument("--zerocopy", action="store_true", help="simulate a server with the zero-copy extension")
+    args = parser.parse_args()
+
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    with tempfile.NamedTemporaryFile(prefix="voice-bench-") as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(FILE_SIZE // len(block)):
+            f.write(block)
+        f.flush()
+        for streams in args.streams:
+            asyncio.run(run(f.name, streams, args.requests, args.zerocopy, args.bitrate))
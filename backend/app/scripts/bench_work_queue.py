@@ -0,0 +1,180 @@
+"""
+Benchmark the assistant work queue: throughput against the number of
+assistants, and whether any voice gets worked on twice.
+
+For each count of `--assistants` a fresh care team (a manager, its doctors
+and that many assistants) is created with `--voices` ready voices per
+assistant in the database of the settings. The API is driven in process
+through ASGI, every assistant loops on POST /queue/claim, works `--work`
+seconds and POSTs the note, until the queue answers 204. Double work is a
+voice claimed by two assistants or a note creation answered 409; both must
+stay at 0, and the voices per second should grow with the assistants as
+long as the database keeps up. The rows created are removed at the end.
+
+Needs a Postgres at the head migration, e.g. the one of docker-compose.
+
+Usage: python scripts/bench_work_queue.py [--assistants 1 10 50] [--voices 20] [--work 0.2]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select
+
+from app.core import security
+from app.db.session import SessionLocal, async_engine
+from app.main import app
+from app.models.assistant_manager import AssistantManager
+from app.models.doctor_manager import DoctorManager
+from app.models.note import Note
+from app.models.user import User
+from app.models.voice import Voice
+
+DOCTORS = 10
+
+
+async def call(method: str, path: str, headers: Dict[str, str], body: bytes = b"") -> Tuple[int, bytes]:
+    status = 0
+    content = b""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "server": ("bench", 80),
+        "path": path,
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    sent = False
+
+    async def receive() -> Dict:
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict) -> None:
+        nonlocal status, content
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            content += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return status, content
+
+
+def setup(assistants: int, voices: int) -> Tuple[List[int], List[int]]:
+    """
+    Returns the ids of the users and of the assistants.
+    """
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    manager = User(email=f"manager-{tag}@example.com", hashed_password="x", role="manager", is_active=True)
+    doctors = [
+        User(email=f"doctor{i}-{tag}@example.com", hashed_password="x", role="doctor", is_active=True)
+        for i in range(DOCTORS)
+    ]
+    team = [
+        User(email=f"assistant{i}-{tag}@example.com", hashed_password="x", role="assistant", is_active=True)
+        for i in range(assistants)
+    ]
+    db.add_all([manager, *doctors, *team])
+    db.flush()
+    db.add_all(DoctorManager(doctor_id=d.id, manager_id=manager.id) for d in doctors)
+    db.add_all(AssistantManager(assistant_id=a.id, manager_id=manager.id) for a in team)
+    start = datetime(2020, 1, 1)
+    db.add_all(
+        Voice(
+            path=f"bench-{tag}-{i}",
+            doctor_id=doctors[i % DOCTORS].id,
+            patient_id=doctors[i % DOCTORS].id,
+            processing_status="ready",
+            date_creation=start + timedelta(seconds=i),
+        )
+        for i in range(voices)
+    )
+    db.commit()
+    assistant_ids = [a.id for a in team]
+    user_ids = [manager.id, *(d.id for d in doctors), *assistant_ids]
+    db.close()
+    return user_ids, assistant_ids
+
+
+def teardown(user_ids: List[int]) -> None:
+    db = SessionLocal()
+    voice_ids = select(Voice.id).where(Voice.doctor_id.in_(user_ids))
+    db.query(Note).filter(Note.voice_id.in_(voice_ids)).delete(synchronize_session=False)
+    db.query(Voice).filter(Voice.doctor_id.in_(user_ids)).delete(synchronize_session=False)
+    db.query(DoctorManager).filter(DoctorManager.manager_id.in_(user_ids)).delete(synchronize_session=False)
+    db.query(AssistantManager).filter(AssistantManager.manager_id.in_(user_ids)).delete(synchronize_session=False)
+    db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+async def run(assistants: int, voices: int, work: float) -> float:
+    user_ids, assistant_ids = setup(assistants, voices * assistants)
+    claimed: Counter = Counter()
+    statuses: Counter = Counter()
+
+    async def assistant(assistant_id: int) -> None:
+        headers = {"authorization": f"Bearer {security.create_access_token(assistant_id)}"}
+        while True:
+            status, content = await call("POST", "/api/v1/queue/claim", headers)
+            if status == 204:
+                return
+            assert status == 200, (status, content)
+            voice_id = json.loads(content)["id"]
+            claimed[voice_id] += 1
+            await asyncio.sleep(work)
+            body = json.dumps({"voice_id": voice_id, "assistant_id": assistant_id, "content_txt": "note"})
+            status, _ = await call(
+                "POST", "/api/v1/notes/", {**headers, "content-type": "application/json"}, body.encode()
+            )
+            statuses[status] += 1
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(assistant(a) for a in assistant_ids))
+        elapsed = time.perf_counter() - started
+    finally:
+        teardown(user_ids)
+    twice = sum(1 for count in claimed.values() if count > 1)
+    throughput = statuses[200] / elapsed
+    print(
+        f"{assistants:>4} assistants  {statuses[200]:>6} notes in {elapsed:>6.1f} s  "
+        f"{throughput:>7.1f} voices/s  claimed twice {twice}  409 {statuses[409]}  "
+        f"by status {dict(statuses)}"
+    )
+    return throughput
+
+
+async def main(counts: List[int], voices: int, work: float) -> None:
+    # one event loop, the asyncpg connections of the pool belong to it
+    base = None
+    for assistants in counts:
+        throughput = await run(assistants, voices, work)
+        if base is None:
+            base = throughput / assistants
+        else:
+            print(f"{'':>4} scaling {throughput / (base * assistants):>6.0%} of linear")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--assistants", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--voices", type=int, default=20, help="per assistant")
+    parser.add_argument("--work", type=float, default=0.2, help="seconds per voice")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.assistants, args.voices, args.work))
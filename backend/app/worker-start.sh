@@ -3,4 +3,10 @@ set -e
 
 python /app/app/celeryworker_pre_start.py
 
-celery worker -A app.worker -l info -Q main-queue -c 1
+# Speech to text parallelizes within a task (app.core.asr), its worker runs
+# tasks in the main process so that it can start a process pool
+if [ -n "$ASR_MODEL_PATH" ] ; then
+    celery worker -A app.worker -l info -Q asr-queue -P solo -n asr@%h &
+fi
+
+celery worker -A app.worker -l info -Q main-queue,audio-queue -c 1